@@ -0,0 +1,150 @@
+# activity_index.py
+import os
+import numpy as np
+
+# One row per source frame
+ACTIVITY_DTYPE = np.dtype([
+    ("flags", np.uint8),  # ANALYZED and DETECTED bits
+    ("regions", np.uint16),  # Motion regions found
+    ("motion", np.float32),  # Fraction of the frame covered by motion regions
+    ("classes", np.uint8, (3,)),  # COCO IDs of the most confident classes detected, 0 for none
+])
+
+ANALYZED = 1  # Motion detection ran on the frame
+DETECTED = 2  # Object detection ran on the frame
+
+def default_index_dir():
+    """Activity index directory, overridable with VIDEO_ANALYSIS_ACTIVITY_DIR"""
+    return os.environ.get("VIDEO_ANALYSIS_ACTIVITY_DIR",
+                          os.path.join(os.path.expanduser("~"), ".cache", "video-analysis-tool", "activity"))
+
+def index_path(directory, video):
+    """Index file for a video, named by its content hash (see result_cache.video_key)"""
+    return os.path.join(directory, f"{video}.npy")
+
+class ActivityIndex:
+    """A compact per-frame activity record of a video file, kept in a memory-mapped .npy file.
+
+    Motion and detection results are written as frames are analyzed, and
+    later reviews read the whole timeline back without decoding the file:
+    events() finds the active stretches, next_event() jumps between them and
+    strip() bins the timeline for drawing. Several processes may write
+    disjoint frame ranges of the same index.
+    """
+    def __init__(self, path, num_frames=None):
+        self.path = path
+        if os.path.exists(path):
+            self.frames = np.load(path, mmap_mode="r+")
+            if self.frames.dtype != ACTIVITY_DTYPE or (num_frames is not None and len(self.frames) != num_frames):
+                # Written by another version or for a different frame count: start over
+                del self.frames
+                os.remove(path)
+        if not os.path.exists(path):
+            if num_frames is None:
+                raise FileNotFoundError(f"No activity index at {path}")
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.frames = np.lib.format.open_memmap(path, mode="w+", dtype=ACTIVITY_DTYPE, shape=(num_frames,))
+
+    def __len__(self):
+        return len(self.frames)
+
+    def record_motion(self, frame_index, regions, frame_area):
+        """Store the motion regions found in a frame"""
+        if not 0 <= frame_index < len(self.frames):
+            return  # Frame counts reported by containers are not always exact
+        row = self.frames[frame_index]
+        row["flags"] |= ANALYZED
+        row["regions"] = min(len(regions), 65535)
+        row["motion"] = min(sum(w * h for _, _, w, h in regions) / frame_area, 1.0) if frame_area else 0.0
+
+    def record_objects(self, frame_index, detections):
+        """Store the most confident classes of a frame's detections"""
+        if not 0 <= frame_index < len(self.frames):
+            return
+        classes = []
+        for class_id in detections.class_ids[np.argsort(-detections.scores, kind="stable")].tolist():
+            if class_id not in classes:
+                classes.append(class_id)
+        row = self.frames[frame_index]
+        row["flags"] |= DETECTED
+        row["classes"] = (classes + [0, 0, 0])[:3]
+
+    def flush(self):
+        self.frames.flush()
+
+    def active(self, min_motion=0.002):
+        """Boolean array of frames with motion covering at least min_motion of the frame, or objects"""
+        return (self.frames["motion"] >= min_motion) | (self.frames["classes"][:, 0] > 0)
+
+    def events(self, min_motion=0.002, max_gap=30, min_length=1):
+        """(start, end) frame ranges of activity, merging active frames at most max_gap frames apart.
+
+        Gaps left by sampling or by frames detected only every few frames are
+        bridged the same way.
+        """
+        indices = np.flatnonzero(self.active(min_motion))
+        if not len(indices):
+            return []
+        breaks = np.flatnonzero(np.diff(indices) > max_gap)
+        starts = indices[np.concatenate(([0], breaks + 1))]
+        ends = indices[np.concatenate((breaks, [len(indices) - 1]))] + 1
+        return [(int(start), int(end)) for start, end in zip(starts, ends) if end - start >= min_length]
+
+    def next_event(self, frame_index, **options):
+        """Start of the first event after frame_index, or None"""
+        for start, _ in self.events(**options):
+            if start > frame_index:
+                return start
+        return None
+
+    def previous_event(self, frame_index, **options):
+        """Start of the last event starting before frame_index, or None"""
+        previous = None
+        for start, _ in self.events(**options):
+            if start >= frame_index:
+                break
+            previous = start
+        return previous
+
+    def event_at(self, frame_index, **options):
+        """The (start, end) event containing frame_index, or None"""
+        for start, end in self.events(**options):
+            if start <= frame_index < end:
+                return start, end
+        return None
+
+    def skip_quiet(self, frame_index, min_motion=0.002, max_gap=30):
+        """First frame at or after frame_index worth reviewing, skipping stretches known to be quiet.
+
+        That is frame_index itself unless an earlier pass found it inactive and
+        outside any event, otherwise the start of the next event or, when no
+        event lies ahead, of the next stretch of more than max_gap frames that
+        was never analyzed. None if there is nothing left but quiet frames.
+        """
+        row = self.frames[frame_index]
+        if not row["flags"] & ANALYZED or row["motion"] >= min_motion or row["classes"][0]:
+            return frame_index
+        for start, end in self.events(min_motion, max_gap):
+            if end > frame_index:
+                return max(start, frame_index)
+        # Shorter gaps between analyzed frames are left by sampling
+        analyzed = np.flatnonzero(self.frames["flags"][frame_index:] & ANALYZED) + frame_index
+        gaps = np.flatnonzero(np.diff(np.append(analyzed, len(self.frames))) > max_gap)
+        return int(analyzed[gaps[0]]) + 1 if len(gaps) else None
+
+    def analyzed(self):
+        """Fraction of the frames that have been analyzed"""
+        return float(np.count_nonzero(self.frames["flags"] & ANALYZED)) / max(len(self.frames), 1)
+
+    def strip(self, width):
+        """Bin the timeline into width columns: (peak motion, any objects, any analyzed) arrays"""
+        num_frames = len(self.frames)
+        edges = np.linspace(0, num_frames, width + 1).astype(np.int64)
+        starts = np.minimum(edges[:-1], max(num_frames - 1, 0))
+        if num_frames == 0:
+            return np.zeros(width, np.float32), np.zeros(width, bool), np.zeros(width, bool)
+        # reduceat takes each bin from its start to the next start; empty bins repeat a neighbour
+        motion = np.maximum.reduceat(self.frames["motion"], starts)
+        objects = np.maximum.reduceat(self.frames["classes"][:, 0], starts) > 0
+        analyzed = (np.bitwise_or.reduceat(self.frames["flags"], starts) & ANALYZED) > 0
+        return motion, objects, analyzed
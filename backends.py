@@ -0,0 +1,179 @@
+# backends.py
+import os
+import cv2
+import numpy as np
+
+# Every backend is a callable mapping an RGB uint8 batch (N, H, W, 3) to the SSD output arrays:
+# "detection_boxes" (N, K, 4) as normalized (y_min, x_min, y_max, x_max), "detection_classes"
+# (N, K) COCO IDs and "detection_scores" (N, K), the format ObjectDetector post-processes.
+# Backends that run images one at a time set batched = False and are given a list of N
+# images of their own sizes instead, so nothing is padded to the largest image.
+
+OUTPUT_KEYS = ("detection_boxes", "detection_classes", "detection_scores")
+
+def stack_outputs(outputs):
+    """Stack per-image output dicts into batch arrays, zero-padding to the largest detection count"""
+    count = max(max(len(output["detection_scores"]) for output in outputs), 1)
+    stacked = {}
+    for key in OUTPUT_KEYS:
+        first = outputs[0][key]
+        values = np.zeros((len(outputs), count) + first.shape[1:], dtype=first.dtype)
+        for i, output in enumerate(outputs):
+            values[i, :len(output[key])] = output[key]
+        stacked[key] = values
+    return stacked
+
+class SavedModel:
+    """Wraps a TF SavedModel detector to take and return NumPy arrays.
+
+    The TF Hub SSD MobileNet v2 signature takes exactly one image, a [1, H, W, 3]
+    uint8 tensor, so a batch is run one image at a time and the outputs are
+    stacked (padded to the largest detection count).
+    """
+    batched = False
+
+    def __init__(self, path, num_threads=None):
+        # TensorFlow is imported here so nothing else pays for it
+        import tensorflow as tf
+        import tensorflow_hub as hub
+        self.tf = tf
+        self.model = hub.load(path)
+
+    def __call__(self, batch):
+        outputs = []
+        for image in batch:
+            detections = self.model(self.tf.convert_to_tensor(image[np.newaxis]))
+            outputs.append({key: detections[key].numpy()[0] for key in OUTPUT_KEYS})
+        return stack_outputs(outputs)
+
+class TFLiteModel:
+    """Runs a TFLite SSD detector, such as the int8-quantized SSD MobileNet v2, on num_threads threads.
+
+    The interpreter takes one image of a fixed size, so each image of a batch
+    is resized to the model input and run in turn. Quantized models get uint8
+    (or int8) input directly and float models input scaled to [-1, 1].
+    TFLite detection models number classes from 0, so class_offset is added
+    to get COCO IDs. Uses tflite_runtime when installed, else TensorFlow.
+    """
+    batched = False
+
+    def __init__(self, path, num_threads=None, class_offset=1):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+        self.interpreter = Interpreter(model_path=path, num_threads=num_threads or os.cpu_count())
+        self.interpreter.allocate_tensors()
+        self.class_offset = class_offset
+
+        details = self.interpreter.get_input_details()[0]
+        self.input_index = details["index"]
+        _, self.input_height, self.input_width, _ = details["shape"]
+        self.input_dtype = details["dtype"]
+        self.input_scale, self.input_zero_point = details["quantization"]
+        self.outputs = self._find_outputs()
+
+    def _find_outputs(self):
+        """Output details in (boxes, classes, scores) order.
+
+        Boxes are the only 3-D output and the count the only 1-D one; the
+        other two follow the detection post-processing op's order, classes
+        before scores.
+        """
+        outputs = self.interpreter.get_output_details()
+        boxes = [output for output in outputs if len(output["shape"]) == 3]
+        pairs = [output for output in outputs if len(output["shape"]) == 2]
+        if len(boxes) != 1 or len(pairs) != 2:
+            raise ValueError("Not an SSD detection model: expected boxes, classes, scores and count outputs")
+        return boxes + pairs
+
+    def _input(self, image):
+        image = cv2.resize(image, (self.input_width, self.input_height))
+        if self.input_dtype == np.float32:
+            image = (image.astype(np.float32) - 127.5) / 127.5
+        elif self.input_dtype == np.int8:
+            # Full-integer models: quantize with the input's own parameters
+            image = np.clip(np.round(image / 255.0 / self.input_scale + self.input_zero_point), -128, 127)
+            image = image.astype(np.int8)
+        return image[np.newaxis]
+
+    def _output(self, output):
+        values = self.interpreter.get_tensor(output["index"])[0]
+        scale, zero_point = output["quantization"]
+        if values.dtype != np.float32 and scale:
+            values = (values.astype(np.float32) - zero_point) * scale
+        return values
+
+    def __call__(self, batch):
+        boxes, classes, scores = [], [], []
+        for image in batch:
+            self.interpreter.set_tensor(self.input_index, self._input(image))
+            self.interpreter.invoke()
+            image_boxes, image_classes, image_scores = (self._output(output) for output in self.outputs)
+            boxes.append(image_boxes)
+            classes.append(image_classes + self.class_offset)
+            scores.append(image_scores)
+        return {"detection_boxes": np.stack(boxes), "detection_classes": np.stack(classes),
+                "detection_scores": np.stack(scores)}
+
+class OpenCVDnnModel:
+    """Runs an SSD detector with OpenCV's dnn module from a local model file.
+
+    Takes anything cv2.dnn.readNet reads whose output is the DetectionOutput
+    layout (batch, class, score, x_min, y_min, x_max, y_max), such as a
+    TensorFlow frozen graph; its .pbtxt text graph is picked up from next to
+    the model file unless config is given. The whole batch runs as one blob
+    of input_size images. num_threads sets OpenCV's thread count, which is
+    process-wide.
+    """
+    batched = True
+
+    def __init__(self, path, num_threads=None, config=None, input_size=(300, 300)):
+        if config is None:
+            candidate = os.path.splitext(path)[0] + ".pbtxt"
+            config = candidate if os.path.exists(candidate) else ""
+        if num_threads:
+            cv2.setNumThreads(num_threads)
+        try:
+            self.net = cv2.dnn.readNet(path, config)
+        except cv2.error as e:
+            raise ValueError(f"OpenCV could not read the model {path}: {e}") from e
+        self.input_size = input_size
+
+    def __call__(self, batch):
+        # The batch is RGB already, which is what the TensorFlow graphs expect
+        blob = cv2.dnn.blobFromImages(list(batch), 1.0, self.input_size, swapRB=False, crop=False)
+        self.net.setInput(blob)
+        rows = self.net.forward().reshape(-1, 7)
+
+        # Rows of all images come together; pad each image's results to the same count
+        per_image = [rows[rows[:, 0] == i] for i in range(len(batch))]
+        count = max(max(len(image_rows) for image_rows in per_image), 1)
+        boxes = np.zeros((len(batch), count, 4), dtype=np.float32)
+        classes = np.zeros((len(batch), count), dtype=np.float32)
+        scores = np.zeros((len(batch), count), dtype=np.float32)
+        for i, image_rows in enumerate(per_image):
+            n = len(image_rows)
+            boxes[i, :n] = image_rows[:, [4, 3, 6, 5]]
+            classes[i, :n] = image_rows[:, 1]
+            scores[i, :n] = image_rows[:, 2]
+        return {"detection_boxes": np.clip(boxes, 0.0, 1.0), "detection_classes": classes,
+                "detection_scores": scores}
+
+# Backend names as given on the command line and in VIDEO_ANALYSIS_BACKEND
+BACKENDS = {
+    "tf": SavedModel,
+    "tflite": TFLiteModel,
+    "opencv": OpenCVDnnModel,
+}
+
+DEFAULT_BACKEND = "tf"
+
+def load_backend(name, path, num_threads=None):
+    """Load a model with the named backend; path is a SavedModel directory for "tf", else a model file"""
+    if name not in BACKENDS:
+        raise KeyError(f"Unknown backend: {name} (choose from {', '.join(BACKENDS)})")
+    if name != "tf" and not os.path.isfile(path):
+        raise FileNotFoundError(f"The {name} backend needs a local model file, got {path}")
+    return BACKENDS[name](path, num_threads=num_threads)
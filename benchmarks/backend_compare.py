@@ -0,0 +1,216 @@
+# benchmarks/backend_compare.py
+"""Latency, throughput and accuracy of the inference backends on a labelled clip set.
+
+Labels are JSON lines in the format written by `main.py analyze`, one per
+labelled frame: {"source": "clip.mp4", "frame": 12, "objects": [{"class":
+"person", "box": [x, y, w, h]}, ...]}, with sources relative to the labels
+file. A reference run can be corrected by hand into such a file. Each
+backend detects every labelled frame at the UI's 480 px detection width and
+reports median and 95th percentile latency for single frames, throughput in
+batches, and mAP at an IoU of 0.5. From the repository root:
+
+    python -m benchmarks.backend_compare --labels clips/labels.jsonl \\
+        --backend tf --backend tflite=models/ssd_mobilenet_v2_int8.tflite \\
+        --backend opencv=models/frozen_inference_graph.pb --threads 4
+
+--synthetic runs the stub model on a generated clip instead, to try the
+harness without models or labels.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import cv2
+import numpy as np
+
+from benchmarks.stub_model import make_stub_detector
+from benchmarks.synthetic import generate_clip, write_clip
+from model_registry import DEFAULT_MODEL_ID
+from tracker import iou
+
+DETECTION_WIDTH = 480
+
+def load_labels(path):
+    """Read ground truth as {(source, frame): [(class, box), ...]}"""
+    base = os.path.dirname(os.path.abspath(path))
+    labels = {}
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "objects" not in record:
+                continue
+            source = os.path.join(base, record["source"])
+            labels[(source, record["frame"])] = [(obj["class"], tuple(obj["box"])) for obj in record["objects"]]
+    return labels
+
+def read_frames(labels):
+    """Decode the labelled frames, in (source, frame) order"""
+    frames = []
+    by_source = defaultdict(set)
+    for source, frame_index in labels:
+        by_source[source].add(frame_index)
+    for source, wanted in sorted(by_source.items()):
+        vid = cv2.VideoCapture(source)
+        if not vid.isOpened():
+            raise IOError(f"Could not open {source}")
+        index = 0
+        try:
+            while index <= max(wanted):
+                if index in wanted:
+                    ret, frame = vid.read()
+                    if not ret:
+                        break
+                    frames.append(((source, index), frame))
+                elif not vid.grab():
+                    break
+                index += 1
+        finally:
+            vid.release()
+    return frames
+
+def average_precision(predictions, ground_truth, class_name, iou_threshold=0.5):
+    """All-point interpolated AP of one class.
+
+    predictions is {key: Detections-like list of (class, score, box)} and
+    ground_truth {key: [(class, box)]}; each ground truth box matches at most
+    one prediction, taken in order of confidence.
+    """
+    truth = {key: [box for name, box in objects if name == class_name] for key, objects in ground_truth.items()}
+    total = sum(len(boxes) for boxes in truth.values())
+    if total == 0:
+        return None
+    scored = sorted(((score, key, box) for key, objects in predictions.items()
+                     for name, score, box in objects if name == class_name), key=lambda item: -item[0])
+
+    matched = {key: [False] * len(boxes) for key, boxes in truth.items()}
+    hits = []
+    for _, key, box in scored:
+        best, best_iou = None, iou_threshold
+        for i, truth_box in enumerate(truth.get(key, [])):
+            overlap = iou(box, truth_box)
+            if not matched[key][i] and overlap >= best_iou:
+                best, best_iou = i, overlap
+        if best is not None:
+            matched[key][best] = True
+        hits.append(best is not None)
+    if not hits:
+        return 0.0
+
+    true_positives = np.cumsum(hits)
+    recall = true_positives / total
+    precision = true_positives / np.arange(1, len(hits) + 1)
+    # Precision made monotonic from the right, integrated over the recall steps
+    precision = np.maximum.accumulate(precision[::-1])[::-1]
+    steps = np.diff(np.concatenate(([0.0], recall)))
+    return float(np.sum(steps * precision))
+
+def mean_average_precision(predictions, ground_truth, iou_threshold=0.5):
+    classes = {name for objects in ground_truth.values() for name, _ in objects}
+    scores = [average_precision(predictions, ground_truth, name, iou_threshold) for name in sorted(classes)]
+    scores = [score for score in scores if score is not None]
+    return sum(scores) / len(scores) if scores else 0.0
+
+def shrink(frame):
+    """The frame at the detection width, and the scale applied"""
+    h, w = frame.shape[:2]
+    scale = DETECTION_WIDTH / w if w > DETECTION_WIDTH else 1.0
+    return (cv2.resize(frame, (0, 0), fx=scale, fy=scale) if scale != 1.0 else frame), scale
+
+def evaluate(detector, frames, labels, batch_size, iou_threshold):
+    """Time a detector over the frames and score its detections against the labels"""
+    small = [(key,) + shrink(frame) for key, frame in frames]
+
+    # Latency: one frame at a time, as the UI detects; these results are scored
+    predictions = {}
+    latencies = []
+    for key, frame, scale in small:
+        start = time.perf_counter()
+        detections = detector.detect_batch([frame])[0]
+        latencies.append(time.perf_counter() - start)
+        detections = detections.scaled(scale)
+        predictions[key] = list(zip(detections.labels(), detections.scores.tolist(),
+                                    [tuple(box) for box in detections.boxes.tolist()]))
+
+    # Throughput: batches, as headless runs detect
+    start = time.perf_counter()
+    for i in range(0, len(small), batch_size):
+        detector.detect_batch([frame for _, frame, _ in small[i:i + batch_size]])
+    elapsed = time.perf_counter() - start
+
+    return {
+        "latency_p50_ms": float(np.percentile(latencies, 50)) * 1000,
+        "latency_p95_ms": float(np.percentile(latencies, 95)) * 1000,
+        "fps": len(small) / elapsed if elapsed > 0 else 0.0,
+        "map": mean_average_precision(predictions, labels, iou_threshold),
+    }
+
+def make_detector(spec, threads, confidence):
+    """Build a detector from a --backend spec: NAME or NAME=MODEL, or "stub" for the stub model"""
+    name, _, model = spec.partition("=")
+    if name == "stub":
+        detector = make_stub_detector()
+    else:
+        from object_detector import create_detector
+        detector = create_detector(model_id=model or DEFAULT_MODEL_ID, backend=name, num_threads=threads)
+        detector.warmup()
+    detector.confidence_threshold = confidence
+    return detector
+
+def synthetic_labels(directory, num_frames=60):
+    """Write a synthetic clip and its labels (every shape a "person"), returning the labels path"""
+    clip_path = os.path.join(directory, "synthetic.avi")
+    write_clip(clip_path, 1280, 720, num_frames)
+    labels_path = os.path.join(directory, "labels.jsonl")
+    with open(labels_path, "w") as f:
+        for i, (_, boxes) in enumerate(generate_clip(1280, 720, num_frames)):
+            objects = [{"class": "person", "box": list(box)} for box in boxes]
+            f.write(json.dumps({"source": "synthetic.avi", "frame": i, "objects": objects}) + "\n")
+    return labels_path
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare inference backends on a labelled clip set")
+    parser.add_argument("--labels", default=None, help="Ground truth JSONL (see the module docstring)")
+    parser.add_argument("--synthetic", action="store_true",
+                        help="Use a generated clip and the stub model instead of --labels and --backend")
+    parser.add_argument("--backend", action="append", default=[], metavar="NAME[=MODEL]",
+                        help="Backend to compare (tf, tflite, opencv, or stub), with its model; may be repeated")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="Inference threads for the tflite and opencv backends (default: one per core)")
+    parser.add_argument("--batch-size", type=int, default=8, help="Frames per batch for throughput (default: 8)")
+    parser.add_argument("--confidence", type=float, default=0.05,
+                        help="Confidence threshold, low so the precision-recall curve is complete (default: 0.05)")
+    parser.add_argument("--iou", type=float, default=0.5, help="IoU for a detection to match a label (default: 0.5)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.synthetic:
+            args.labels = synthetic_labels(tmp)
+            args.backend = args.backend or ["stub"]
+        if not args.labels or not args.backend:
+            parser.error("--labels and at least one --backend are needed, or --synthetic")
+
+        labels = load_labels(args.labels)
+        frames = read_frames(labels)
+        print(f"{len(frames)} labelled frames, {sum(len(objects) for objects in labels.values())} objects")
+        print(f"{'backend':<40}{'p50 ms':>9}{'p95 ms':>9}{'fps':>9}{'mAP@' + str(args.iou):>10}{'speedup':>9}")
+        baseline = None
+        for spec in args.backend:
+            try:
+                detector = make_detector(spec, args.threads, args.confidence)
+            except (KeyError, FileNotFoundError, ValueError, ImportError) as e:
+                print(f"{spec:<40}error: {e}")
+                continue
+            result = evaluate(detector, frames, labels, args.batch_size, args.iou)
+            baseline = baseline or result["fps"]
+            print(f"{spec:<40}{result['latency_p50_ms']:>9.1f}{result['latency_p95_ms']:>9.1f}"
+                  f"{result['fps']:>9.1f}{result['map']:>10.3f}{result['fps'] / baseline:>8.1f}x")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
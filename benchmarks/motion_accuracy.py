@@ -0,0 +1,93 @@
+# benchmarks/motion_accuracy.py
+"""Accuracy versus speed of the motion detector's processing options.
+
+Runs each configuration over synthetic clips whose moving shapes are known,
+and reports FPS, recall (shapes matched by a motion region), precision
+(regions matching a shape) and the mean IoU of the matches. From the
+repository root:
+
+    python -m benchmarks.motion_accuracy
+    python -m benchmarks.motion_accuracy --resolution 1080p --frames 150
+"""
+import argparse
+import sys
+import time
+
+from benchmarks.synthetic import RESOLUTIONS, generate_clip
+from motion_detector import COLOR, GRAY, MotionDetector
+from tracker import iou
+
+# Name -> MotionDetector options; the first entry is the full-resolution reference
+CONFIGS = {
+    "full color": {},
+    "full gray": {"color_mode": GRAY},
+    "1/2 color": {"process_scale": 0.5},
+    "1/2 gray": {"process_scale": 0.5, "color_mode": GRAY},
+    "1/2 gray + open": {"process_scale": 0.5, "color_mode": GRAY, "morph_kernel": 3},
+    "1/4 color": {"process_scale": 0.25, "color_mode": COLOR},
+    "1/4 gray": {"process_scale": 0.25, "color_mode": GRAY},
+    "1/4 gray + open": {"process_scale": 0.25, "color_mode": GRAY, "morph_kernel": 3},
+    "full color + static": {"static_threshold": 8},
+    "1/2 gray + static": {"process_scale": 0.5, "color_mode": GRAY, "static_threshold": 8},
+}
+
+def evaluate(options, width, height, num_frames, seeds, warmup, match_iou):
+    """Run one configuration, returning fps, recall, precision and mean IoU"""
+    elapsed = 0.0
+    frames = 0
+    truths = matched_truths = regions_total = matched_regions = 0
+    iou_total = 0.0
+
+    for seed in seeds:
+        detector = MotionDetector(**options)
+        for i, (frame, boxes) in enumerate(generate_clip(width, height, num_frames, seed=seed)):
+            start = time.perf_counter()
+            _, _, regions = detector.detect(frame)
+            elapsed += time.perf_counter() - start
+            frames += 1
+
+            # Give the background model time to settle before scoring
+            if i < warmup:
+                continue
+
+            truths += len(boxes)
+            regions_total += len(regions)
+            for box in boxes:
+                best = max((iou(box, region) for region in regions), default=0.0)
+                if best >= match_iou:
+                    matched_truths += 1
+                    iou_total += best
+            matched_regions += sum(1 for region in regions if any(iou(box, region) >= match_iou for box in boxes))
+
+    return {
+        "fps": frames / elapsed,
+        "recall": matched_truths / truths if truths else 0.0,
+        "precision": matched_regions / regions_total if regions_total else 0.0,
+        "mean_iou": iou_total / matched_truths if matched_truths else 0.0,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare motion detection accuracy and speed across processing options")
+    parser.add_argument("--resolution", choices=sorted(RESOLUTIONS), default="1080p",
+                        help="Synthetic clip resolution (default: 1080p)")
+    parser.add_argument("--frames", type=int, default=120, help="Frames per clip (default: 120)")
+    parser.add_argument("--seeds", type=int, default=3, help="Number of different clips (default: 3)")
+    parser.add_argument("--warmup", type=int, default=20, help="Frames ignored while the background settles (default: 20)")
+    parser.add_argument("--match-iou", type=float, default=0.3,
+                        help="IoU for a region to count as matching a shape (default: 0.3)")
+    args = parser.parse_args(argv)
+
+    width, height = RESOLUTIONS[args.resolution]
+    print(f"{args.resolution}, {args.frames} frames x {args.seeds} clips")
+    print(f"{'config':<18}{'fps':>8}{'speedup':>9}{'recall':>8}{'precision':>11}{'mean IoU':>10}")
+    reference_fps = None
+    for name, options in CONFIGS.items():
+        result = evaluate(options, width, height, args.frames, range(args.seeds), args.warmup, args.match_iou)
+        if reference_fps is None:
+            reference_fps = result["fps"]
+        print(f"{name:<18}{result['fps']:>8.1f}{result['fps'] / reference_fps:>8.1f}x"
+              f"{result['recall']:>8.2f}{result['precision']:>11.2f}{result['mean_iou']:>10.2f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
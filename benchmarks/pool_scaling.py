@@ -0,0 +1,62 @@
+# benchmarks/pool_scaling.py
+"""Detection throughput with 0 (in-process) to N detector worker processes.
+
+The stub model burns a fixed amount of CPU per frame, so throughput should
+grow roughly linearly with workers up to the number of cores. From the
+repository root:
+
+    python -m benchmarks.pool_scaling --workers 1 2 4 --busy-ms 20
+"""
+import argparse
+import functools
+import os
+import sys
+import time
+
+import cv2
+
+from benchmarks.stub_model import make_stub_detector
+from benchmarks.synthetic import clip_frames
+from detection_pool import DetectionPool
+
+def run_in_process(frames, busy_ms):
+    detector = make_stub_detector(busy_ms)
+    start = time.perf_counter()
+    for frame in frames:
+        detector.detect_batch([frame])
+    return time.perf_counter() - start
+
+def run_pool(frames, busy_ms, workers):
+    pool = DetectionPool(workers, functools.partial(make_stub_detector, busy_ms)).start()
+    try:
+        start = time.perf_counter()
+        # Keep every slot busy, collecting results in order as they are needed
+        for i, frame in enumerate(frames):
+            if pool.in_flight() >= pool.num_slots:
+                pool.get()
+            pool.submit(frame, i, block=True)
+        while pool.in_flight():
+            pool.get()
+        return time.perf_counter() - start
+    finally:
+        pool.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure detection throughput against the number of worker processes")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Pool sizes to try (default: 1 2 4)")
+    parser.add_argument("--busy-ms", type=float, default=20.0, help="Simulated inference CPU time per frame (default: 20)")
+    parser.add_argument("--frames", type=int, default=200, help="Frames to detect (default: 200)")
+    args = parser.parse_args(argv)
+
+    frames = [cv2.resize(frame, (480, 270)) for frame in clip_frames(1280, 720, args.frames)]
+    print(f"{os.cpu_count()} CPUs, {args.busy_ms:.0f} ms per frame")
+    print(f"{'workers':<10}{'fps':>8}{'speedup':>9}")
+    baseline = args.frames / run_in_process(frames, args.busy_ms)
+    print(f"{'in-proc':<10}{baseline:>8.1f}{1.0:>8.1f}x")
+    for workers in args.workers:
+        fps = args.frames / run_pool(frames, args.busy_ms, workers)
+        print(f"{workers:<10}{fps:>8.1f}{fps / baseline:>8.1f}x")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
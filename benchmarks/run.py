@@ -0,0 +1,277 @@
+# benchmarks/run.py
+"""Benchmark suite for the analysis pipeline.
+
+Runs each stage on deterministic synthetic clips and reports frames per
+second (the best of --repeat runs) and allocated KB per frame (peak traced
+allocation, via tracemalloc). Right before each timed run, a fixed reference
+workload of plain OpenCV calls is timed too, and speed is compared as the
+ratio of the two bests, so the speed and current load of the machine
+cancel out. Ratios and allocations are compared against
+benchmarks/baselines.json and any regression beyond the tolerance fails the
+run. Allocations include fixed setup costs spread over the frames, so a run
+is only compared against baselines recorded with the same --frames. From
+the repository root:
+
+    python -m benchmarks.run                    # run and compare
+    python -m benchmarks.run --filter motion    # only matching benchmarks
+    python -m benchmarks.run --update-baseline  # record new baselines
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from benchmarks.stub_model import make_stub_detector
+from benchmarks.synthetic import RESOLUTIONS, clip_frames, write_clip
+from masks import FrameMask
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+REPEAT = 5  # Timed runs of each benchmark, of which the fastest counts (--repeat)
+REFERENCE_FRAMES = []  # Frames of the reference workload, set up by main()
+
+class AllocationTracker:
+    """Sums the peak traced allocation of each interval between calls to mark()"""
+    def __init__(self):
+        self.total = 0
+
+    def start(self):
+        tracemalloc.start()
+        self.base = tracemalloc.get_traced_memory()[0]
+
+    def mark(self):
+        current, peak = tracemalloc.get_traced_memory()
+        self.total += max(peak - self.base, 0)
+        tracemalloc.reset_peak()
+        self.base = current
+
+    def stop(self):
+        tracemalloc.stop()
+
+def reference_step(state, frame):
+    """Fixed OpenCV work that never changes with the code: blur, gray conversion and a thresholded
+    difference of 720p frames. Timed next to every benchmark run as the yardstick for the machine."""
+    gray = cv2.cvtColor(cv2.GaussianBlur(frame, (5, 5), 0), cv2.COLOR_BGR2GRAY)
+    if state:
+        cv2.threshold(cv2.absdiff(gray, state[0]), 25, 255, cv2.THRESH_BINARY)
+    state[:] = [gray]
+
+def best_time(setup, run):
+    """Fastest of REPEAT timed calls of run(setup()), and fastest pass of the reference frames timed
+    right before each; the slower ones were disturbed by other work"""
+    times = []
+    reference_times = []
+    for _ in range(REPEAT):
+        reference_state = []
+        start = time.perf_counter()
+        for frame in REFERENCE_FRAMES:
+            reference_step(reference_state, frame)
+        reference_times.append(time.perf_counter() - start)
+
+        state = setup()
+        start = time.perf_counter()
+        run(state)
+        times.append(time.perf_counter() - start)
+    return min(times), min(reference_times)
+
+def measure_per_frame(setup, step, frames):
+    """Time step(state, frame) over the frames, then repeat under tracemalloc for allocations"""
+    def run(state):
+        for frame in frames:
+            step(state, frame)
+    elapsed, reference = best_time(setup, run)
+
+    state = setup()
+    tracker = AllocationTracker()
+    tracker.start()
+    for frame in frames:
+        step(state, frame)
+        tracker.mark()
+    tracker.stop()
+
+    return {"fps": len(frames) / elapsed, "alloc_kb": tracker.total / len(frames) / 1024,
+            "relative": reference / elapsed * len(frames) / len(REFERENCE_FRAMES)}
+
+def bench_motion(resolution, num_frames, num_objects=3, warmup=0, mask=None, **options):
+    from motion_detector import MotionDetector
+    frames = clip_frames(*RESOLUTIONS[resolution], num_frames, num_objects)
+
+    def setup():
+        # Settle the background model on the clip first, if requested
+        detector = MotionDetector(**options)
+        detector.set_mask(mask)
+        for i in range(warmup):
+            detector.detect(frames[i % len(frames)])
+        return detector
+    return measure_per_frame(setup, lambda detector, frame: detector.detect(frame), frames)
+
+def bench_detector(resolution, num_frames, batch_size=1):
+    """ObjectDetector pre- and post-processing around the stub model, at the UI's 480 px detection size"""
+    width, height = RESOLUTIONS[resolution]
+    scale = 480.0 / width
+    frames = [cv2.resize(frame, (0, 0), fx=scale, fy=scale) for frame in clip_frames(width, height, num_frames)]
+    batches = [frames[i:i + batch_size] for i in range(0, len(frames), batch_size)]
+    result = measure_per_frame(make_stub_detector, lambda detector, batch: detector.detect_batch(batch), batches)
+    result["fps"] *= batch_size
+    result["relative"] *= batch_size
+    result["alloc_kb"] /= batch_size
+    return result
+
+def bench_tiled(resolution, num_frames, **options):
+    """ObjectDetector.detect_tiles around the stub model: cropping, batching and merging across tiles"""
+    width, height = RESOLUTIONS[resolution]
+    frames = list(clip_frames(width, height, num_frames))
+    return measure_per_frame(make_stub_detector, lambda detector, frame: detector.detect_tiles(frame, **options),
+                             frames)
+
+def bench_display(resolution, num_frames):
+    """The conversion done by VideoAnalysisUI.display_frame, up to the PIL image, with its cached size, buffer and image"""
+    from ui import fit_size, prepare_display_image
+    width, height = RESOLUTIONS[resolution]
+    frames = clip_frames(width, height, num_frames)
+    overlays = [(100, 100, 200, 150, (0, 0, 255), "person #1: 87%"), (400, 200, 80, 60, (0, 255, 0), None)]
+    size = fit_size(width, height, 800, 500)
+    buffer = np.empty((size[1], size[0], 3), dtype=np.uint8)
+    image = Image.new("RGB", size)
+
+    def step(_, frame):
+        image.frombytes(prepare_display_image(frame, 800, 500, overlays, size=size, out=buffer))
+    return measure_per_frame(lambda: None, step, frames)
+
+class _RecordSink:
+    """Output file for the headless pipeline that counts records and marks allocation intervals"""
+    def __init__(self, tracker=None):
+        self.tracker = tracker
+
+    def write(self, text):
+        if self.tracker is not None:
+            self.tracker.mark()
+
+def bench_pipeline(resolution, num_frames, **options):
+    """The full headless pipeline (decode, motion, detection with the stub model, JSONL output).
+
+    fps counts source frames, so with sample_every it includes the frames stepped over.
+    """
+    from headless import HeadlessAnalyzer
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_clip(os.path.join(tmp, "clip.avi"), *RESOLUTIONS[resolution], num_frames)
+
+        def analyzer():
+            return HeadlessAnalyzer(mode="both", skip_frames=5, track=True, object_detector=make_stub_detector(),
+                                    **options)
+
+        summaries = []
+        elapsed, reference = best_time(analyzer,
+                                       lambda instance: summaries.append(instance.analyze(path, _RecordSink())))
+        summary = summaries[-1]
+
+        tracker = AllocationTracker()
+        instance = analyzer()
+        tracker.start()
+        instance.analyze(path, _RecordSink(tracker))
+        tracker.stop()
+
+    return {"fps": summary["frames"] / elapsed, "alloc_kb": tracker.total / summary["frames"] / 1024,
+            "relative": reference / elapsed * summary["frames"] / len(REFERENCE_FRAMES)}
+
+# Benchmark name -> function taking the number of frames
+BENCHMARKS = {
+    "motion_360p": lambda n: bench_motion("360p", n),
+    "motion_720p": lambda n: bench_motion("720p", n),
+    "motion_1080p": lambda n: bench_motion("1080p", n),
+    "motion_1080p_gray_quarter": lambda n: bench_motion("1080p", n, process_scale=0.25, color_mode="gray"),
+    "motion_1080p_static_scene": lambda n: bench_motion("1080p", n, num_objects=0, warmup=100,
+                                                          static_threshold=8),
+    # The lower half of the frame, minus a timestamp-sized corner
+    "motion_1080p_masked": lambda n: bench_motion("1080p", n, mask=FrameMask(
+        [[(0, 540), (1920, 540), (1920, 1080), (0, 1080)]], [[(1520, 1000), (1920, 1000), (1920, 1080), (1520, 1080)]])),
+    "detector_prepost_720p": lambda n: bench_detector("720p", n),
+    "detector_prepost_720p_batch4": lambda n: bench_detector("720p", n, batch_size=4),
+    "detector_tiled_1080p": lambda n: bench_tiled("1080p", n),
+    "display_720p": lambda n: bench_display("720p", n),
+    "display_1080p": lambda n: bench_display("1080p", n),
+    "pipeline_720p": lambda n: bench_pipeline("720p", n),
+    "pipeline_720p_sample10": lambda n: bench_pipeline("720p", n, sample_every=10),
+}
+
+def compare(name, result, baseline, tolerance):
+    """Return regression messages for one benchmark"""
+    failures = []
+    if result["relative"] < baseline["relative"] * (1 - tolerance):
+        failures.append(f"{name}: {result['relative']:.3f}x the reference speed is below baseline "
+                        f"{baseline['relative']:.3f}x ({result['fps']:.1f} fps)")
+    # A little slack so tiny allocations don't flap
+    if result["alloc_kb"] > baseline["alloc_kb"] * (1 + tolerance) + 16:
+        failures.append(f"{name}: {result['alloc_kb']:.1f} KB/frame is above baseline {baseline['alloc_kb']:.1f} KB/frame")
+    return failures
+
+def main(argv=None):
+    global REPEAT, REFERENCE_FRAMES
+    parser = argparse.ArgumentParser(description="Run the pipeline benchmarks and compare against baselines")
+    parser.add_argument("--filter", default="", help="Only run benchmarks whose name contains this")
+    parser.add_argument("--frames", type=int, default=60, help="Frames per benchmark (default: 60)")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline file (default: benchmarks/baselines.json)")
+    parser.add_argument("--tolerance", type=float, default=0.5,
+                        help="Allowed fractional regression before failing (default: 0.5)")
+    parser.add_argument("--repeat", type=int, default=REPEAT,
+                        help="Timed runs per benchmark, of which the fastest counts (default: 5)")
+    parser.add_argument("--update-baseline", action="store_true", help="Store these results as the new baselines")
+    parser.add_argument("--json", default=None, help="Also write the results to this JSON file")
+    args = parser.parse_args(argv)
+    REPEAT = args.repeat
+    REFERENCE_FRAMES = clip_frames(*RESOLUTIONS["720p"], args.frames)
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baselines = json.load(f)
+
+    # KB/frame includes setup spread over the run, so only the same frame count compares
+    if not args.update_baseline:
+        mismatched = sorted(name for name, baseline in baselines.items()
+                            if name in BENCHMARKS and args.filter in name and baseline.get("frames") != args.frames)
+        if mismatched:
+            parser.error(f"the baselines of {', '.join(mismatched)} were recorded with --frames "
+                         f"{baselines[mismatched[0]].get('frames')}, not {args.frames}; use the same count or "
+                         f"record new baselines with --update-baseline")
+
+    results = {}
+    failures = []
+    print(f"{'benchmark':<32}{'fps':>10}{'KB/frame':>12}{'x reference':>13}{'baseline':>10}")
+    for name, bench in BENCHMARKS.items():
+        if args.filter not in name:
+            continue
+        result = bench(args.frames)
+        results[name] = {key: round(value, 4 if key == "relative" else 2) for key, value in result.items()}
+        results[name]["frames"] = args.frames
+        baseline = baselines.get(name)
+        baseline_relative = f"{baseline['relative']:.3f}" if baseline else "-"
+        print(f"{name:<32}{result['fps']:>10.1f}{result['alloc_kb']:>12.1f}{result['relative']:>13.3f}"
+              f"{baseline_relative:>10}")
+        if baseline and not args.update_baseline:
+            failures.extend(compare(name, result, baseline, args.tolerance))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.update_baseline:
+        baselines.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baselines written to {args.baseline}")
+        return 0
+
+    for failure in failures:
+        print(f"REGRESSION: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+# benchmarks/startup.py
+"""Cold-start benchmark for the motion-only path.
+
+Each run starts a fresh interpreter that imports the application, runs one
+motion detection and reports its wall time, peak RSS and whether TensorFlow
+was imported. Run from the repository root:
+
+    python -m benchmarks.startup --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Executed in a fresh interpreter for every run
+CHILD_CODE = r"""
+import json, resource, sys, time
+start = time.perf_counter()
+import numpy as np
+import main
+from motion_detector import MotionDetector
+
+if WITH_UI:
+    import tkinter as tk
+    root = tk.Tk()
+    app = main.VideoAnalysisApp(root)
+    root.update()
+
+detector = MotionDetector()
+detector.detect(np.zeros((480, 640, 3), dtype=np.uint8))
+elapsed = time.perf_counter() - start
+
+if WITH_UI:
+    root.destroy()
+
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+rss_mb = rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+heavy = [name for name in ("tensorflow", "tensorflow_hub", "object_detector") if name in sys.modules]
+print(json.dumps({"import_seconds": elapsed, "rss_mb": rss_mb, "heavy_modules": heavy}))
+"""
+
+def run_once(with_ui=False):
+    """Start a fresh interpreter and return its measurements plus total process time"""
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", f"WITH_UI = {with_ui}\n" + CHILD_CODE],
+                            cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result["process_seconds"] = time.perf_counter() - start
+    return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold-start time and RSS of the motion-only path")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreter runs (default: 5)")
+    parser.add_argument("--ui", action="store_true", help="Also create the Tk window (needs a display)")
+    parser.add_argument("--max-seconds", type=float, default=3.0,
+                        help="Fail if the median process time exceeds this (default: 3.0)")
+    parser.add_argument("--max-rss-mb", type=float, default=300.0,
+                        help="Fail if the peak RSS exceeds this (default: 300)")
+    args = parser.parse_args(argv)
+
+    results = [run_once(args.ui) for _ in range(args.runs)]
+    process_seconds = statistics.median(r["process_seconds"] for r in results)
+    import_seconds = statistics.median(r["import_seconds"] for r in results)
+    rss_mb = max(r["rss_mb"] for r in results)
+    heavy = sorted({name for r in results for name in r["heavy_modules"]})
+
+    print(f"cold start (median of {args.runs}): {process_seconds:.3f}s process, "
+          f"{import_seconds:.3f}s import + first detect")
+    print(f"peak RSS: {rss_mb:.1f} MB")
+
+    failures = []
+    if heavy:
+        failures.append(f"motion-only path imported {', '.join(heavy)}")
+    if process_seconds > args.max_seconds:
+        failures.append(f"cold start {process_seconds:.3f}s exceeds {args.max_seconds:.3f}s")
+    if rss_mb > args.max_rss_mb:
+        failures.append(f"RSS {rss_mb:.1f} MB exceeds {args.max_rss_mb:.1f} MB")
+
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,38 @@
+# benchmarks/stub_model.py
+"""A stand-in for the SSD MobileNet model that needs no TensorFlow or network."""
+import time
+import numpy as np
+
+class StubModel:
+    """Returns fixed SSD-shaped outputs (100 detections per image) without running a network.
+
+    A few detections score above the default threshold, so post-processing
+    does the same work as with real results. busy_ms keeps the CPU (and the
+    GIL) busy for that long per image, to stand in for inference cost.
+    """
+    def __init__(self, max_detections=100, seed=0, busy_ms=0.0):
+        self.busy_ms = busy_ms
+        rng = np.random.default_rng(seed)
+        y_min, x_min = rng.uniform(0, 0.7, (2, max_detections))
+        heights, widths = rng.uniform(0.05, 0.3, (2, max_detections))
+        self.boxes = np.stack([y_min, x_min, y_min + heights, x_min + widths], axis=1).astype(np.float32)
+        self.classes = rng.integers(1, 91, max_detections).astype(np.float32)
+        self.scores = np.sort(rng.uniform(0, 0.6, max_detections).astype(np.float32))[::-1].copy()
+        self.scores[:5] = np.linspace(0.95, 0.55, 5)
+
+    def __call__(self, batch):
+        n = batch.shape[0]
+        # Measured in CPU time, so time-slicing with other processes doesn't count
+        deadline = time.process_time() + n * self.busy_ms / 1000.0
+        while time.process_time() < deadline:
+            pass
+        return {
+            "detection_boxes": np.broadcast_to(self.boxes, (n,) + self.boxes.shape),
+            "detection_classes": np.broadcast_to(self.classes, (n,) + self.classes.shape),
+            "detection_scores": np.broadcast_to(self.scores, (n,) + self.scores.shape),
+        }
+
+def make_stub_detector(busy_ms=0.0):
+    """An ObjectDetector running the stub model"""
+    from object_detector import ObjectDetector
+    return ObjectDetector(model=StubModel(busy_ms=busy_ms), warmup=False)
@@ -0,0 +1,68 @@
+# benchmarks/synthetic.py
+"""Deterministic synthetic clips: moving shapes over a noisy static background."""
+import cv2
+import numpy as np
+
+RESOLUTIONS = {
+    "360p": (640, 360),
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+}
+
+def generate_clip(width, height, num_frames, num_objects=3, seed=0):
+    """Yield (frame, boxes) pairs, where boxes are the (x, y, w, h) of every moving shape.
+
+    The same arguments always produce the same frames.
+    """
+    rng = np.random.default_rng(seed)
+
+    # Static textured background; per-frame sensor noise is added on top
+    background = cv2.GaussianBlur(rng.integers(0, 256, (height, width, 3), dtype=np.uint8), (0, 0), 3)
+    noise = rng.integers(-6, 7, (8, height, width, 3), dtype=np.int16)
+
+    # Shapes bounce around the frame with a fixed size, color and velocity
+    scale = min(width, height) / 360.0
+    objects = []
+    for _ in range(num_objects):
+        w, h = (rng.integers(30, 70, 2) * scale).astype(int)
+        objects.append({
+            "pos": np.array([rng.uniform(0, width - w), rng.uniform(0, height - h)]),
+            "vel": rng.uniform(-4, 4, 2) * scale,
+            "size": (int(w), int(h)),
+            "color": tuple(int(c) for c in rng.integers(0, 256, 3)),
+            "circle": bool(rng.integers(0, 2)),
+        })
+
+    for i in range(num_frames):
+        frame = np.clip(background + noise[i % len(noise)], 0, 255).astype(np.uint8)
+        boxes = []
+        for obj in objects:
+            w, h = obj["size"]
+            obj["pos"] += obj["vel"]
+            for axis, limit in ((0, width - w), (1, height - h)):
+                if not 0 <= obj["pos"][axis] <= limit:
+                    obj["vel"][axis] = -obj["vel"][axis]
+                    obj["pos"][axis] = min(max(obj["pos"][axis], 0), limit)
+            x, y = int(obj["pos"][0]), int(obj["pos"][1])
+            if obj["circle"]:
+                cv2.ellipse(frame, (x + w // 2, y + h // 2), (w // 2, h // 2), 0, 0, 360, obj["color"], -1)
+            else:
+                cv2.rectangle(frame, (x, y), (x + w - 1, y + h - 1), obj["color"], -1)
+            boxes.append((x, y, w, h))
+        yield frame, boxes
+
+def clip_frames(width, height, num_frames, num_objects=3, seed=0):
+    """All frames of a clip as a list"""
+    return [frame for frame, _ in generate_clip(width, height, num_frames, num_objects, seed)]
+
+def write_clip(path, width, height, num_frames, fps=30, seed=0):
+    """Write a clip to a video file (MJPG AVI, decodable by any OpenCV build)"""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (width, height))
+    if not writer.isOpened():
+        raise IOError(f"Could not open video writer for {path}")
+    try:
+        for frame, _ in generate_clip(width, height, num_frames, seed=seed):
+            writer.write(frame)
+    finally:
+        writer.release()
+    return path
@@ -0,0 +1,151 @@
+# camera_grabber.py
+import threading
+import time
+import cv2
+import numpy as np
+
+class CameraGrabber:
+    """Reads a camera on its own thread, keeping only the newest frame.
+
+    Drivers queue frames while analysis is busy, and many backends ignore
+    CAP_PROP_BUFFERSIZE, so reading on demand returns frames that are already
+    old. The grabber thread reads the device as fast as it delivers and keeps
+    the latest frame with the time it arrived; frames nobody asked for are
+    overwritten and counted in stale_frames. read() and grab() stand in for a
+    VideoCapture's, waiting up to timeout seconds for a frame newer than the
+    last one returned. When the device fails it is reopened, waiting twice
+    as long after each failed attempt, up to max_backoff seconds.
+    """
+    def __init__(self, source, open_capture=cv2.VideoCapture, timeout=1.0, min_backoff=0.1, max_backoff=5.0):
+        self.source = source
+        self.open_capture = open_capture
+        self.timeout = timeout
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.metrics = None  # Optional Metrics for the device frame rate and counters
+        self.timestamp = None  # perf_counter() time the frame last returned by read() or grab() arrived
+        self.connected = False
+        self.stale_frames = 0
+        self.reconnects = 0
+
+        self._vid = None
+        self._frame = None  # Newest frame
+        self._spare = None  # The frame it replaced, read into next
+        self._frame_time = None
+        self._sequence = 0  # Frames delivered by the device
+        self._consumed = 0  # Sequence number of the last frame handed out
+        self._condition = threading.Condition()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def open(self):
+        """Open the device, returning whether it worked"""
+        vid = self.open_capture(self.source)
+        if not vid.isOpened():
+            vid.release()
+            return False
+        vid.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Helps where honoured; the thread drains the rest
+        self._vid = vid
+        self.connected = True
+        return True
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def isOpened(self):
+        return self._thread is not None or (self._vid is not None and self._vid.isOpened())
+
+    def get(self, prop):
+        vid = self._vid
+        return vid.get(prop) if vid is not None else 0.0
+
+    def set(self, prop, value):
+        vid = self._vid
+        return vid.set(prop, value) if vid is not None else False
+
+    def read(self, image=None):
+        """Copy the newest frame into image (when it fits), like VideoCapture.read()"""
+        with self._condition:
+            if not self._wait():
+                return False, None
+            frame = self._frame
+            if image is not None and image.shape == frame.shape and image.dtype == frame.dtype:
+                np.copyto(image, frame)
+                return True, image
+            return True, frame.copy()
+
+    def grab(self):
+        """Skip the newest frame without copying it"""
+        with self._condition:
+            return self._wait()
+
+    def release(self):
+        """Stop the thread; the device is released by the thread once its current read returns"""
+        self._stopping.set()
+        with self._condition:
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(2.0)
+            self._thread = None
+        elif self._vid is not None:
+            self._vid.release()
+            self._vid = None
+
+    def _wait(self):
+        """Wait for an unread frame and mark it read (with the condition held)"""
+        if not self._condition.wait_for(lambda: self._sequence > self._consumed or self._stopping.is_set(),
+                                        self.timeout):
+            return False
+        if self._stopping.is_set():
+            return False
+        self._consumed = self._sequence
+        self.timestamp = self._frame_time
+        return True
+
+    def _run(self):
+        backoff = self.min_backoff
+        had_device = self._vid is not None
+        try:
+            while not self._stopping.is_set():
+                if self._vid is None:
+                    if not self.open():
+                        # Still gone: try again later, waiting longer each time
+                        self._stopping.wait(backoff)
+                        backoff = min(backoff * 2, self.max_backoff)
+                        continue
+                    if had_device:
+                        self.reconnects += 1
+                        if self.metrics is not None:
+                            self.metrics.increment("camera_reconnects")
+                    had_device = True
+
+                ret, frame = self._vid.read(self._spare) if self._spare is not None else self._vid.read()
+                arrived = time.perf_counter()
+                if not ret:
+                    self._vid.release()
+                    self._vid = None
+                    self.connected = False
+                    self._stopping.wait(backoff)
+                    backoff = min(backoff * 2, self.max_backoff)
+                    continue
+                backoff = self.min_backoff
+
+                with self._condition:
+                    if self._sequence > self._consumed:
+                        self.stale_frames += 1
+                        if self.metrics is not None:
+                            self.metrics.increment("camera_stale_frames")
+                    # Readers copy under the lock, so the replaced frame is free to be read into
+                    self._spare, self._frame = self._frame, frame
+                    self._frame_time = arrived
+                    self._sequence += 1
+                    self._condition.notify_all()
+                if self.metrics is not None:
+                    self.metrics.tick("camera")
+        finally:
+            if self._vid is not None:
+                self._vid.release()
+                self._vid = None
+            self.connected = False
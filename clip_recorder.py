@@ -0,0 +1,257 @@
+# clip_recorder.py
+import collections
+import os
+import queue
+import threading
+import time
+import cv2
+import numpy as np
+
+def default_clip_dir():
+    """Clip directory, overridable with VIDEO_ANALYSIS_CLIP_DIR"""
+    return os.environ.get("VIDEO_ANALYSIS_CLIP_DIR",
+                          os.path.join(os.path.expanduser("~"), "video-analysis-clips"))
+
+class ClipWriter:
+    """Background thread encoding clips with cv2.VideoWriter.
+
+    Commands go through a bounded queue and never block the caller: a frame
+    that does not fit is dropped and counted in dropped_frames. A clip whose
+    open does not fit is dropped whole, its frames counted as they come, and a
+    close that does not fit leaves the clip to be finished by the next open or
+    by the end of the thread. finish() ends the thread once it has written
+    what is queued, without waiting for it. Frames handed over must not be
+    modified afterwards.
+    """
+    def __init__(self, fourcc="mp4v", max_queue=256, on_clip=None):
+        self.fourcc = cv2.VideoWriter_fourcc(*fourcc)
+        self.on_clip = on_clip  # Called from the writer thread with (path, frames) for each finished clip
+        self.metrics = None  # Optional Metrics for clip counters
+        self.dropped_frames = 0
+        self.dropped_clips = 0
+        self.error = None  # Last error opening a clip, if any
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._skipping = False  # The clip being written was dropped
+        self._finishing = threading.Event()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def open(self, path, fps, size):
+        self._skipping = not self._put(("open", path, fps, size))
+        if self._skipping:
+            self.dropped_clips += 1
+            if self.metrics is not None:
+                self.metrics.increment("clips_dropped")
+        return not self._skipping
+
+    def write(self, frame):
+        if not self._skipping and self._put(("frame", frame)):
+            return True
+        self.dropped_frames += 1
+        if self.metrics is not None:
+            self.metrics.increment("clip_dropped_frames")
+        return False
+
+    def close(self):
+        if not self._skipping:
+            self._put(("close",))
+        self._skipping = False
+
+    def finish(self):
+        """Let the thread end once the clips queued so far are written, without waiting for it"""
+        self._finishing.set()
+        self._put(None)  # Wakes an idle thread; a busy one sees the flag once the queue is empty
+
+    def join(self, timeout=None):
+        """Wait up to timeout for the thread to end after finish(); returns whether it has"""
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                return False
+            self._thread = None
+        return True
+
+    def stop(self, timeout=None):
+        """Finish the clips queued so far and wait up to timeout for the thread to end"""
+        self.finish()
+        return self.join(timeout)
+
+    def _put(self, command):
+        try:
+            self._queue.put_nowait(command)
+            return True
+        except queue.Full:
+            return False
+
+    def _run(self):
+        writer = None
+        path = None
+        frames = 0
+        while True:
+            try:
+                command = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                if not self._finishing.is_set():
+                    continue
+                command = None
+            if command is None or command[0] in ("open", "close"):
+                if writer is not None:
+                    writer.release()
+                    writer = None
+                    if self.metrics is not None:
+                        self.metrics.increment("clips_written")
+                    if self.on_clip is not None:
+                        self.on_clip(path, frames)
+                if command is None:
+                    return
+            if command[0] == "open":
+                _, path, fps, size = command
+                frames = 0
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                writer = cv2.VideoWriter(path, self.fourcc, fps, size)
+                if not writer.isOpened():
+                    self.error = f"Could not open {path} for writing"
+                    writer = None
+            elif command[0] == "frame" and writer is not None:
+                write_start = time.perf_counter()
+                writer.write(command[1])
+                frames += 1
+                if self.metrics is not None:
+                    self.metrics.observe("clip_write", time.perf_counter() - write_start)
+
+class ClipRecorder:
+    """Saves clips around the moments something happens, from a pre-roll ring of recent frames.
+
+    Every frame passed to add() is copied into a ring holding the last
+    pre_roll seconds (and at most max_bytes). When a frame is triggered (by
+    motion or an object class of interest) a clip is opened with the ring's
+    contents, and frames keep going to it until post_roll seconds pass
+    without a trigger. Encoding happens on a ClipWriter thread, so add()
+    only ever costs a frame copy. Timestamps are in seconds of source time;
+    a timestamp going backwards (a file looping) ends the clip and empties
+    the ring.
+    """
+    def __init__(self, directory, fps, pre_roll=3.0, post_roll=3.0, prefix="clip", fourcc="mp4v",
+                 extension=".mp4", max_bytes=512 << 20, on_clip=None):
+        self.directory = directory
+        self.fps = fps if fps and fps > 0 else 30.0  # Frame rate written to the clips
+        self.pre_roll = pre_roll
+        self.post_roll = post_roll
+        self.prefix = prefix
+        self.extension = extension
+        self.max_bytes = max_bytes
+        self.writer = ClipWriter(fourcc, on_clip=on_clip)
+
+        self.frames_seen = 0
+        self.frames_recorded = 0  # Frames sent to clips, pre-roll included
+        self.clips = 0
+        self.recording = False
+        self._shape = None  # Frame shape of the open clip
+        self._ring = collections.deque()  # [timestamp, frame, sent to a clip] entries, oldest first
+        self._ring_bytes = 0
+        self._spare = None  # An evicted frame that was never sent to a clip, reused for the next copy
+        self._last_trigger = None
+        self._last_timestamp = None
+
+    @property
+    def metrics(self):
+        return self.writer.metrics
+
+    @metrics.setter
+    def metrics(self, metrics):
+        self.writer.metrics = metrics
+
+    @property
+    def dropped_frames(self):
+        """Frames the writer thread could not keep up with, whole dropped clips included"""
+        return self.writer.dropped_frames
+
+    def start(self):
+        self.writer.start()
+        return self
+
+    def add(self, frame, timestamp, triggered):
+        """Record a frame; the caller keeps ownership of frame, which is copied"""
+        if self._last_timestamp is not None and timestamp < self._last_timestamp:
+            self.reset()
+        if self.recording and frame.shape != self._shape:
+            self.end_clip()  # A clip keeps one frame size
+        self._last_timestamp = timestamp
+        self.frames_seen += 1
+
+        entry = [timestamp, self._copy(frame), False]
+        self._ring.append(entry)
+        self._ring_bytes += entry[1].nbytes
+        self._trim(timestamp)
+
+        if triggered:
+            self._last_trigger = timestamp
+            if not self.recording:
+                self._open(frame.shape, timestamp)
+        elif self.recording and timestamp - self._last_trigger > self.post_roll:
+            self.end_clip()
+
+        if self.recording and not entry[2]:
+            self._send(entry)
+
+    def end_clip(self):
+        if self.recording:
+            self.writer.close()
+            self.recording = False
+
+    def reset(self):
+        """End any clip and forget the pre-roll, e.g. after a seek"""
+        self.end_clip()
+        self._ring.clear()
+        self._ring_bytes = 0
+        self._last_trigger = None
+        self._last_timestamp = None
+
+    def close(self):
+        """End any clip and let the writer thread finish the queued clips in the background"""
+        self.end_clip()
+        self.writer.finish()
+
+    def join(self, timeout=None):
+        """Wait up to timeout for the queued clips to be written after close(); returns whether they are"""
+        return self.writer.join(timeout)
+
+    def savings(self):
+        """Fraction of the frames seen that were not recorded"""
+        return 1.0 - self.frames_recorded / self.frames_seen if self.frames_seen else 0.0
+
+    def _copy(self, frame):
+        spare, self._spare = self._spare, None
+        if spare is not None and spare.shape == frame.shape and spare.dtype == frame.dtype:
+            np.copyto(spare, frame)
+            return spare
+        return frame.copy()
+
+    def _trim(self, timestamp):
+        """Evict frames older than the pre-roll, or over the memory cap; the newest always stays"""
+        ring = self._ring
+        while len(ring) > 1 and (timestamp - ring[0][0] > self.pre_roll or self._ring_bytes > self.max_bytes):
+            _, frame, sent = ring.popleft()
+            self._ring_bytes -= frame.nbytes
+            if not sent:
+                self._spare = frame  # Not shared with the writer thread, so it can be overwritten
+
+    def _open(self, shape, timestamp):
+        self.clips += 1
+        name = f"{self.prefix}_{time.strftime('%Y%m%d_%H%M%S')}_{self.clips:03d}_{timestamp:.1f}s{self.extension}"
+        self.writer.open(os.path.join(self.directory, name), self.fps, (shape[1], shape[0]))
+        self.recording = True
+        self._shape = shape
+        # The pre-roll goes first, up to the triggering frame
+        for entry in self._ring:
+            if not entry[2] and entry[1].shape == shape:
+                self._send(entry)
+
+    def _send(self, entry):
+        entry[2] = True
+        if self.writer.write(entry[1]):
+            self.frames_recorded += 1
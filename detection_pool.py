@@ -0,0 +1,233 @@
+# detection_pool.py
+import multiprocessing as mp
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+import numpy as np
+
+def _worker(factory, tasks, results):
+    """Detector process: load a detector, then detect frames read from shared memory slots"""
+    start_time = time.perf_counter()
+    try:
+        detector = factory()
+    except Exception as e:
+        results.put(("error", f"{type(e).__name__}: {e}"))
+        return
+    results.put(("ready", time.perf_counter() - start_time, getattr(detector, "warmup_time", 0.0),
+                 getattr(detector, "model_path", None)))
+
+    # Attached slots by index, re-attached when the pool replaces a slot with a bigger one
+    slots = {}
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            seq, slot, name, shape, regions, max_size, merge_overlap = task
+            if slot not in slots or slots[slot].name != name:
+                if slot in slots:
+                    slots[slot].close()
+                slots[slot] = shared_memory.SharedMemory(name=name)
+            frame = np.ndarray(shape, dtype=np.uint8, buffer=slots[slot].buf)
+
+            inference_start = time.perf_counter()
+            try:
+                if regions is not None:
+                    detections = detector.detect_regions(frame, regions, max_size, merge_overlap)
+                else:
+                    detections = detector.detect_batch([frame])[0]
+            except Exception as e:
+                results.put(("result", seq, None, 0.0, f"{type(e).__name__}: {e}"))
+                continue
+            finally:
+                del frame  # Drop the view so the slot can be closed
+            results.put(("result", seq, (detections.boxes, detections.scores, detections.class_ids),
+                         time.perf_counter() - inference_start, None))
+    finally:
+        for shm in slots.values():
+            shm.close()
+
+class DetectionPool:
+    """Runs object detection in worker processes, each with its own detector.
+
+    Frames are copied into shared memory slots rather than pickled, so only the
+    slot name and shape cross the process boundary, and detection results come
+    back as small arrays. Each submitted frame is tagged with a sequence number;
+    get() returns results in submission order, while poll() returns whatever is
+    ready in order and drops results that arrive after a newer one was returned.
+
+    factory must be picklable (a module-level function or functools.partial of
+    one), since workers are started with the spawn method.
+    """
+    def __init__(self, num_workers=2, factory=None, num_slots=None, max_size=480):
+        if factory is None:
+            from object_detector import create_detector
+            factory = create_detector
+        self.num_workers = num_workers
+        self.factory = factory
+        self.num_slots = num_slots or 2 * num_workers  # Frames that can be in flight at once
+        self.max_size = max_size  # Longest side of motion-region crops in the workers
+        self.metrics = None  # Optional Metrics for inference timing
+
+        # Set once every worker has loaded its detector
+        self.load_time = 0.0
+        self.warmup_time = 0.0
+        self.model_path = None
+
+        self.late_results = 0  # Results dropped by poll() because a newer one was already returned
+
+        context = mp.get_context("spawn")  # Forking a process that holds Tk or TensorFlow is unsafe
+        self._tasks = context.Queue()
+        self._results = context.Queue()
+        self._processes = [context.Process(target=_worker, args=(factory, self._tasks, self._results), daemon=True)
+                           for _ in range(num_workers)]
+
+        self._slots = [None] * self.num_slots  # SharedMemory per slot, created at first use
+        self._free_slots = list(range(self.num_slots))
+        self._in_flight = {}  # seq -> (slot, frame_index, context)
+        self._done = {}  # seq -> (frame_index, detections, context, error)
+        self._next_seq = 0  # Sequence number of the next submission
+        self._next_result = 0  # Sequence number of the next result to return
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self):
+        """Start the workers and wait until each has loaded its detector"""
+        if self._started:
+            return self
+        self._started = True
+        for process in self._processes:
+            process.start()
+
+        start_time = time.perf_counter()
+        ready = 0
+        while ready < self.num_workers:
+            try:
+                message = self._results.get(timeout=1.0)
+            except queue.Empty:
+                if not all(process.is_alive() for process in self._processes):
+                    self.close()
+                    raise RuntimeError("A detection worker exited while loading its model")
+                continue
+            if message[0] == "error":
+                self.close()
+                raise RuntimeError(f"Detection worker failed to load the model: {message[1]}")
+            _, load_time, warmup_time, model_path = message
+            self.warmup_time = max(self.warmup_time, warmup_time)
+            self.model_path = model_path
+            ready += 1
+        self.load_time = time.perf_counter() - start_time
+        return self
+
+    def in_flight(self):
+        """Number of submitted frames whose results have not been returned yet"""
+        with self._lock:
+            return self._next_seq - self._next_result
+
+    def submit(self, frame, frame_index, regions=None, context=None, block=False, merge_overlap=None):
+        """Copy a frame into a free slot and queue it for detection.
+
+        regions limits detection to those (x, y, w, h) crops, as in
+        ObjectDetector.detect_regions, which merges overlapping regions' objects
+        with merge_overlap (e.g. for tiles). context is returned with the result.
+        Returns False without queueing if every slot is busy and block is False;
+        with block, waits for results (kept for get()) until a slot frees up.
+        """
+        with self._lock:
+            while not self._free_slots:
+                if not block:
+                    return False
+                self._collect(timeout=1.0)
+            slot = self._free_slots.pop()
+            seq = self._next_seq
+            self._next_seq += 1
+
+            # Slots grow to fit the largest frame seen
+            shm = self._slots[slot]
+            if shm is None or shm.size < frame.nbytes:
+                if shm is not None:
+                    shm.close()
+                    shm.unlink()
+                shm = self._slots[slot] = shared_memory.SharedMemory(create=True, size=frame.nbytes)
+            np.ndarray(frame.shape, dtype=np.uint8, buffer=shm.buf)[:] = frame
+
+            self._in_flight[seq] = (slot, frame_index, context)
+        self._tasks.put((seq, slot, shm.name, frame.shape, regions, self.max_size, merge_overlap))
+        return True
+
+    def _collect(self, timeout=0.0):
+        """Move finished results from the workers into _done, freeing their slots. Needs _lock."""
+        from object_detector import Detections
+        try:
+            message = self._results.get(timeout=timeout) if timeout else self._results.get_nowait()
+        except queue.Empty:
+            return
+        while True:
+            _, seq, arrays, seconds, error = message
+            slot, frame_index, context = self._in_flight.pop(seq)
+            self._free_slots.append(slot)
+            if seq < self._next_result:
+                self.late_results += 1  # poll() already moved past it
+            else:
+                detections = Detections(*arrays) if arrays is not None else None
+                self._done[seq] = (frame_index, detections, context, error)
+                if self.metrics is not None and error is None:
+                    self.metrics.observe("inference", seconds)
+                    self.metrics.tick("detection")
+            try:
+                message = self._results.get_nowait()
+            except queue.Empty:
+                return
+
+    def _result(self, seq):
+        """Pop a finished result, raising the worker's error if detection failed"""
+        frame_index, detections, context, error = self._done.pop(seq)
+        self._next_result = seq + 1
+        if error is not None:
+            raise RuntimeError(f"Detection failed on frame {frame_index}: {error}")
+        return frame_index, detections, context
+
+    def get(self, timeout=None):
+        """Return (frame_index, detections, context) for the oldest submitted frame, waiting for it"""
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        with self._lock:
+            if self._next_result >= self._next_seq:
+                raise ValueError("No frames have been submitted")
+            while self._next_result not in self._done:
+                remaining = 1.0 if deadline is None else deadline - time.perf_counter()
+                if remaining <= 0:
+                    raise TimeoutError("Detection is still running")
+                if not all(process.is_alive() for process in self._processes):
+                    raise RuntimeError("A detection worker exited unexpectedly")
+                self._collect(timeout=min(remaining, 1.0))
+            return self._result(self._next_result)
+
+    def poll(self, timeout=0.0):
+        """Return the results that are ready, in order, as (frame_index, detections, context) tuples.
+
+        Waits up to timeout for the first one. Frames still running when a newer
+        result is returned are dropped, so live callers never go back in time.
+        """
+        with self._lock:
+            self._collect(timeout=timeout if not self._done else 0.0)
+            results = []
+            for seq in sorted(self._done):
+                results.append(self._result(seq))
+            return results
+
+    def close(self):
+        """Stop the workers and free the shared memory"""
+        for _ in self._processes:
+            self._tasks.put(None)
+        for process in self._processes:
+            if process.pid is not None:
+                process.join(timeout=5.0)
+                if process.is_alive():
+                    process.terminate()
+        with self._lock:
+            for shm in self._slots:
+                if shm is not None:
+                    shm.close()
+                    shm.unlink()
+            self._slots = [None] * self.num_slots
@@ -0,0 +1,79 @@
+# frame_buffer.py
+import threading
+import numpy as np
+
+class FrameRef:
+    """A reference-counted handle to one frame slot.
+
+    Whoever holds a reference may read frame; the slot is only reused for a new
+    frame after every holder has called release().
+    """
+    __slots__ = ("buffer", "slot", "frame")
+
+    def __init__(self, buffer, slot, frame):
+        self.buffer = buffer
+        self.slot = slot  # None for a frame allocated outside the ring
+        self.frame = frame
+
+    def retain(self):
+        if self.slot is not None:
+            self.buffer._retain(self.slot)
+        return self
+
+    def release(self):
+        if self.slot is not None:
+            self.buffer._release(self.slot)
+
+class FrameRingBuffer:
+    """Preallocated frame slots shared by the capture, analysis and display threads.
+
+    The capture thread decodes straight into a free slot, and consumers retain
+    the slot for as long as they read it, so frames are never copied between
+    threads and never overwritten while in use.
+    """
+    def __init__(self, num_slots, shape, dtype=np.uint8):
+        self.shape = tuple(shape)
+        self.frames = np.zeros((num_slots,) + self.shape, dtype=dtype)
+        self.ref_counts = [0] * num_slots
+        self.next_slot = 0
+        self.overflows = 0  # Frames allocated outside the ring because every slot was busy
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Return a FrameRef for a free slot, holding one reference for the caller"""
+        with self._lock:
+            num_slots = len(self.ref_counts)
+            for i in range(num_slots):
+                slot = (self.next_slot + i) % num_slots
+                if self.ref_counts[slot] == 0:
+                    self.ref_counts[slot] = 1
+                    self.next_slot = (slot + 1) % num_slots
+                    return FrameRef(self, slot, self.frames[slot])
+            self.overflows += 1
+
+        # Every slot is still in use: fall back to a standalone frame
+        return FrameRef(self, None, np.empty(self.shape, dtype=self.frames.dtype))
+
+    def read(self, vid):
+        """Decode the next frame from a VideoCapture (or FrameSampler) into a slot.
+
+        Returns a FrameRef, or None if no frame could be read.
+        """
+        ref = self.acquire()
+        ret, frame = vid.read(ref.frame)
+        if not ret:
+            ref.release()
+            return None
+        if frame is not ref.frame:
+            # The source changed size; hand over the frame OpenCV allocated instead
+            ref.release()
+            ref = FrameRef(self, None, frame)
+        return ref
+
+    def _retain(self, slot):
+        with self._lock:
+            self.ref_counts[slot] += 1
+
+    def _release(self, slot):
+        with self._lock:
+            self.ref_counts[slot] -= 1
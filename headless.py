@@ -0,0 +1,755 @@
+# headless.py
+import argparse
+import functools
+import json
+import os
+import sqlite3
+import sys
+import time
+import cv2
+from activity_index import ActivityIndex, index_path
+from backends import BACKENDS, DEFAULT_BACKEND
+from detection_pool import DetectionPool
+from motion_detector import COLOR, GRAY, MotionDetector, merge_regions
+from model_registry import DEFAULT_MODEL_ID
+from tracker import ObjectTracker
+from pacing import FramePacer, POLICIES, MAX_THROUGHPUT
+from result_cache import ResultCache, detection_config, motion_config, video_key
+from sampling import FrameSampler, find_keyframes
+from metrics import Metrics, MetricsDumper, MetricsServer
+from masks import FrameMask
+
+# Command line mode names mapped to the analysis types used by the UI
+ANALYSIS_MODES = {
+    "motion": "Motion Detection",
+    "objects": "Object Recognition",
+    "both": "Both",
+}
+
+class HeadlessAnalyzer:
+    """Runs motion and object detection over video files without any Tk objects"""
+    def __init__(self, mode="both", skip_frames=0, detection_width=480, confidence_threshold=None,
+                 batch_size=8, model_id=DEFAULT_MODEL_ID, offline=False, motion_gated=False,
+                 region_padding=32, track=False, allowed_classes=None, class_thresholds=None,
+                 pacing=MAX_THROUGHPUT, fixed_fps=15.0, metrics=None, object_detector=None,
+                 motion_scale=1.0, motion_color=COLOR, motion_morph=0, static_threshold=0, workers=0,
+                 detector_factory=None, stream_id=None, sample_every=1, keyframes_only=False,
+                 cache_path=None, cache_size=1024, activity_dir=None, tiles=False, tile_overlap=0.2, roi=None,
+                 backend=DEFAULT_BACKEND, backend_threads=None, mask=None):
+        self.analysis_type = ANALYSIS_MODES[mode]
+        self.skip_frames = skip_frames  # Frames skipped between object detections
+        self.sample_every = sample_every  # Only analyze every Nth frame, the others are never converted
+        self.keyframes_only = keyframes_only  # Only analyze the keyframes of files
+        self.batch_size = batch_size  # Frames sent to the object detector in one forward pass
+        self.detection_width = detection_width  # Frames wider than this are shrunk for detection
+        self.motion_gated = motion_gated  # Only detect objects in crops around motion regions
+        self.region_padding = region_padding
+        # Tiled detection: full-resolution tiles of detection_width pixels over the region of interest
+        # (x, y, w, h, the whole frame by default), with objects merged across tile seams
+        self.tiles = tiles
+        self.tile_overlap = tile_overlap
+        self.roi = roi
+        self.merge_overlap = 0.6 if tiles else None
+        self.tile_grid = None  # (frame shape and offset, tile regions) of the last frame size seen
+        # Polygon mask (see FrameMask): only its area reaches motion and object detection
+        self.mask = mask if mask else None
+        self.tracker = ObjectTracker() if track else None  # Predicts boxes between detection frames
+        self.pacing = pacing  # Frame pacing policy, as fast as possible by default
+        self.fixed_fps = fixed_fps
+        self.dropped_frames = 0
+        self.metrics = metrics or Metrics()
+        self.stream_id = stream_id  # Added to every record when several sources run at once
+        self.running = True  # Cleared to stop analyze() early, e.g. for a camera
+        self.last_record = None
+        self.records_written = 0
+        self.skipped_records = set()  # Pending detection frames with nothing to detect in
+
+        # Background modelling resolution and color mode, see MotionDetector
+        self.motion_options = {"process_scale": motion_scale, "color_mode": motion_color, "morph_kernel": motion_morph,
+                               "static_threshold": static_threshold}
+        self.motion_detector = None
+        if self.analysis_type in ["Motion Detection", "Both"] or motion_gated:
+            self.motion_detector = MotionDetector(**self.motion_options)
+            self.motion_detector.set_mask(self.mask)
+
+        # Per-frame results of earlier runs (cache_size in MB), keyed by file content and everything
+        # the results depend on; motion also depends on which frames the background model saw
+        self.cache = None
+        self.video = None  # Content hash of the file being analyzed, None when not caching
+        if cache_path:
+            self.cache = ResultCache(cache_path, cache_size * 1024 * 1024)
+            self.cache.metrics = self.metrics
+        # Per-frame activity timelines of analyzed files, see ActivityIndex
+        self.activity_dir = activity_dir
+        self.activity = None  # Index of the file being analyzed
+        self.motion_config = motion_config(self.motion_options, sample_every, keyframes_only, self.mask)
+        self.objects_config = detection_config(model_id, detection_width, confidence_threshold, allowed_classes,
+                                               class_thresholds, self.motion_config if motion_gated else None,
+                                               region_padding, self.tiling(), backend, self.mask)
+
+        # A ready-made detector (e.g. with a stub model) can be passed in
+        self.object_detector = object_detector
+        self.pool = None  # Detector processes, when workers > 0
+        self.detects_objects = object_detector is not None or self.analysis_type in ["Object Recognition", "Both"]
+        if self.detects_objects and self.object_detector is None:
+            if detector_factory is None:
+                # Imported here so motion-only runs never load TensorFlow
+                from object_detector import create_detector
+                detector_factory = functools.partial(create_detector, model_id=model_id, offline=offline,
+                                                     confidence_threshold=confidence_threshold,
+                                                     class_thresholds=class_thresholds,
+                                                     allowed_classes=allowed_classes, backend=backend,
+                                                     num_threads=backend_threads)
+            if workers > 0:
+                # Each worker process loads its own detector
+                self.pool = DetectionPool(workers, detector_factory, num_slots=max(2 * workers, batch_size),
+                                          max_size=detection_width)
+                self.pool.metrics = self.metrics
+                self.pool.start()
+            else:
+                self.object_detector = detector_factory()
+
+    def tiling(self):
+        """Tile grid settings for the cache configuration, None without tiles"""
+        if not self.tiles:
+            return None
+        return {"tile_size": self.detection_width, "overlap": self.tile_overlap,
+                "roi": list(self.roi) if self.roi is not None else None}
+
+    def tile_regions(self, frame_shape, offset=(0, 0)):
+        """Tiles covering the region of interest of frames of this shape, cut from the frame at offset"""
+        if self.tile_grid is None or self.tile_grid[0] != (frame_shape, offset):
+            from object_detector import tile_regions
+            roi = self.roi
+            if roi is not None:
+                roi = (roi[0] - offset[0], roi[1] - offset[1], roi[2], roi[3])
+            self.tile_grid = ((frame_shape, offset),
+                              tile_regions(frame_shape, self.detection_width, self.tile_overlap, roi))
+        return self.tile_grid[1]
+
+    def detect_objects(self, frames):
+        """Run object detection on a batch of frames, returning boxes in frame coordinates"""
+        small_frames = []
+        scales = []
+        for frame in frames:
+            h, w = frame.shape[:2]
+            scale = self.detection_width / w if w > self.detection_width else 1.0
+            small_frames.append(cv2.resize(frame, (0, 0), fx=scale, fy=scale) if scale != 1.0 else frame)
+            scales.append(scale)
+
+        with self.metrics.time("inference"):
+            results = self.object_detector.detect_batch(small_frames)
+
+        # Scale back bounding boxes to original size if needed
+        return [detections.scaled(scale) for detections, scale in zip(results, scales)]
+
+    def flush(self, pending, out):
+        """Detect objects for the batched frames, then write the pending records in order"""
+        # Whole frames are detected together in one batch; boxes are shifted back from masked areas
+        batch = [(record, frame, offset) for record, frame, regions, offset in pending
+                 if frame is not None and regions is None]
+        if batch:
+            results = self.detect_objects([frame for _, frame, _ in batch])
+            for (record, _, offset), detected_objects in zip(batch, results):
+                self.set_objects(record, detected_objects.scaled(1.0, *offset))
+
+        # Motion-gated and tiled frames batch their own crops
+        for record, frame, regions, offset in pending:
+            if regions is not None:
+                with self.metrics.time("inference"):
+                    detected_objects = self.object_detector.detect_regions(frame, regions, self.detection_width,
+                                                                           self.merge_overlap)
+                self.set_objects(record, detected_objects.scaled(1.0, *offset))
+
+        for record, _, _, _ in pending:
+            self.write_record(record, out)
+        pending.clear()
+
+    def submit(self, frame, regions, record, offset=(0, 0)):
+        """Hand a frame to the detector processes; the results are picked up by flush_pool()"""
+        scale = 1.0
+        if regions is None:
+            h, w = frame.shape[:2]
+            if w > self.detection_width:
+                scale = self.detection_width / w
+                with self.metrics.time("resize"):
+                    frame = cv2.resize(frame, (0, 0), fx=scale, fy=scale)
+        self.pool.submit(frame, record["frame"], regions, context=(scale, offset), block=True,
+                         merge_overlap=self.merge_overlap)
+
+    def flush_pool(self, pending, out, keep=0):
+        """Write pending records in order, waiting for pooled detections until at most keep are in flight"""
+        in_flight = sum(1 for _, submitted, _, _ in pending if submitted)
+        while pending and (in_flight > keep or not pending[0][1]):
+            record, submitted, _, _ = pending.pop(0)
+            if submitted:
+                _, detections, (scale, offset) = self.pool.get()
+                self.set_objects(record, detections.scaled(scale, *offset))
+                in_flight -= 1
+            self.write_record(record, out)
+
+    def set_objects(self, record, detections):
+        """Add a frame's detections to its record, and to the cache"""
+        record["objects"] = self.format_objects(detections)
+        if self.activity is not None:
+            self.activity.record_objects(record["frame"], detections)
+        if self.video is not None:
+            self.cache.put_detections(self.video, self.objects_config, record["frame"], detections)
+
+    def skip_detection(self, record):
+        """Report no objects on a detection frame that had nothing to detect in"""
+        record["objects"] = []
+        self.skipped_records.add(id(record))
+
+    def write_record(self, record, out):
+        # Feed detections to the tracker in frame order and report tracks on every frame;
+        # frames skipped without running the detector leave the tracks coasting
+        skipped = id(record) in self.skipped_records
+        self.skipped_records.discard(id(record))
+        if self.tracker is not None:
+            timestamp = record["time_ms"] / 1000.0
+            if "objects" in record and not skipped:
+                self.tracker.update(
+                    [{"class": obj["class"], "confidence": obj["confidence"], "box": obj["box"]}
+                     for obj in record["objects"]],
+                    record["frame"], timestamp)
+            record["tracks"] = [
+                {"id": obj['track_id'], "class": obj['class'],
+                 "confidence": round(obj['confidence'], 4), "box": list(obj['box'])}
+                for obj in self.tracker.predict(record["frame"])
+            ]
+        out.write(json.dumps(record) + "\n")
+        self.last_record = record
+        self.records_written += 1
+
+    def close(self):
+        """Stop the detector processes, if any, and commit the cache"""
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
+
+    def format_objects(self, detections):
+        return [
+            {"class": obj['class'], "confidence": round(obj['confidence'], 4), "box": list(obj['box'])}
+            for obj in detections.to_list()
+        ]
+
+    def seek(self, vid, frame_index):
+        """Move a capture to a frame index, returning the index it ended up at"""
+        vid.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+        position = int(vid.get(cv2.CAP_PROP_POS_FRAMES))
+        if position > frame_index:
+            raise IOError(f"Could not seek to frame {frame_index}")
+        # Some backends stop at the keyframe before the target; step forward to it
+        while position < frame_index and vid.grab():
+            position += 1
+        return position
+
+    def analyze(self, source, out, start_frame=0, end_frame=None, warmup_frames=0):
+        """Process every frame of a video file once, writing one JSON line per frame to out.
+
+        A source made of digits is opened as that camera index and read until
+        running is cleared. start_frame and end_frame limit the output to a range
+        of frames, and the background model first learns from the warmup_frames
+        frames before the range. With sample_every or keyframes_only, only the
+        sampled frames are analyzed and get a record. Returns a summary dict with
+        the frame count and throughput.
+        """
+        live = source.isdigit()
+        if self.keyframes_only and live:
+            raise IOError(f"Keyframe sampling needs a video file, not camera {source}")
+        keyframes = find_keyframes(source) if self.keyframes_only else None
+        file_key = video_key(source) if (self.cache is not None or self.activity_dir) and not live else None
+        self.video = file_key if self.cache is not None else None
+        vid = cv2.VideoCapture(int(source) if live else source)
+        if not vid.isOpened():
+            raise IOError(f"Could not open video source: {source}")
+
+        self.activity = None
+        total_frames = int(vid.get(cv2.CAP_PROP_FRAME_COUNT))
+        if self.activity_dir and file_key is not None and total_frames > 0:
+            self.activity = ActivityIndex(index_path(self.activity_dir, file_key), total_frames)
+        frame_area = vid.get(cv2.CAP_PROP_FRAME_WIDTH) * vid.get(cv2.CAP_PROP_FRAME_HEIGHT)
+
+        # Each file gets a fresh background model
+        if self.motion_detector is not None:
+            self.motion_detector = MotionDetector(**self.motion_options)
+            self.motion_detector.metrics = self.metrics
+            self.motion_detector.set_mask(self.mask)
+
+        if self.tracker is not None:
+            self.tracker.reset()
+
+        # Cached motion is only used from a complete earlier run: a background model that skipped cached
+        # frames would not be warmed up for the ones it has to compute
+        motion_cached = (self.video is not None and self.motion_detector is not None
+                         and self.cache.is_complete(self.video, "motion", self.motion_config))
+        finished = False  # Whether the end of the file (or range) was reached
+
+        start_time = time.perf_counter()
+        frame_count = 0
+        analyzed_frames = 0
+        # Records waiting for their batch of detections, with the frame (or masked area) to detect or None
+        # (with a pool, True once the frame has been submitted to it), its regions and its offset in the frame
+        pending = []
+        batched_frames = 0
+        try:
+            if start_frame > 0:
+                frame_count = self.seek(vid, max(start_frame - warmup_frames, 0))
+            sampler = FrameSampler(vid, self.sample_every, keyframes, position=frame_count, seekable=not live)
+            sampler.metrics = self.metrics
+
+            # Frames before the range only feed the background model
+            target = sampler.next_target()
+            while target is not None and target < start_frame:
+                ret, frame = sampler.read()
+                if not ret:
+                    break
+                if self.motion_detector is not None:
+                    self.motion_detector.detect(frame)
+                target = sampler.next_target()
+
+            pacer = FramePacer(self.pacing, source_fps=vid.get(cv2.CAP_PROP_FPS), fixed_fps=self.fixed_fps,
+                               live=live)
+            while self.running:
+                target = sampler.next_target()
+                if target is None or (end_frame is not None and target >= end_frame):
+                    # Nothing left to analyze: the rest of the range counts as covered
+                    sampler.position = max(sampler.position, min(end_frame or total_frames, total_frames))
+                    finished = True
+                    break
+
+                # Object detection runs on every (skip_frames + 1)th analyzed frame, like the UI
+                detect_this = self.detects_objects and sampler.sample_number(target) % (self.skip_frames + 1) == 0
+                cached_motion = cached_objects = None
+                gated_idle = False  # Motion-gated and known from the cache to have nothing moving
+                if self.video is not None:
+                    if motion_cached:
+                        cached_motion = self.cache.get_motion(self.video, self.motion_config, target)
+                    if detect_this and self.motion_gated and cached_motion is not None and not cached_motion[1]:
+                        gated_idle = True
+                    elif detect_this:
+                        cached_objects = self.cache.get_detections(self.video, self.objects_config, target)
+
+                # A frame whose results are all cached is stepped over without converting it
+                needs_frame = ((self.motion_detector is not None and cached_motion is None)
+                               or (detect_this and cached_objects is None and not gated_idle))
+                with self.metrics.time("capture"):
+                    if needs_frame:
+                        ret, frame = sampler.read()
+                    else:
+                        ret, frame = sampler.grab(), None
+                if not ret:
+                    finished = True
+                    break
+                self.metrics.tick("capture")
+                frame_count = sampler.frame_index
+                analyzed_frames += 1
+
+                record = {
+                    "source": source,
+                    "frame": frame_count,
+                    "time_ms": round(vid.get(cv2.CAP_PROP_POS_MSEC), 3),
+                }
+                if self.stream_id is not None:
+                    record["stream"] = self.stream_id
+
+                motion_regions = []
+                if self.motion_detector is not None:
+                    if cached_motion is not None:
+                        motion_detected, motion_regions = cached_motion
+                    else:
+                        motion_detected, _, motion_regions = self.motion_detector.detect(frame)
+                        if self.video is not None:
+                            self.cache.put_motion(self.video, self.motion_config, frame_count, motion_detected,
+                                                  motion_regions)
+                    if self.activity is not None:
+                        self.activity.record_motion(frame_count, motion_regions, frame_area)
+                    if self.analysis_type in ["Motion Detection", "Both"]:
+                        record["motion"] = motion_detected
+                        record["motion_regions"] = [list(region) for region in motion_regions]
+
+                # Only the masked area of the frame is detected in, and boxes are offset back
+                area, offset = frame, (0, 0)
+                if detect_this and cached_objects is None and not gated_idle and self.mask is not None:
+                    area, offset = self.mask.apply(frame)
+                if detect_this:
+                    if gated_idle:
+                        # Motion-gated with nothing moving, as the uncached run finds below
+                        self.skip_detection(record)
+                        pending.append((record, None, None, None))
+                    elif cached_objects is not None:
+                        record["objects"] = self.format_objects(cached_objects)
+                        if self.activity is not None:
+                            self.activity.record_objects(frame_count, cached_objects)
+                        pending.append((record, None, None, None))
+                    elif area is None:
+                        # Nothing of the frame is inside the mask
+                        self.skip_detection(record)
+                        pending.append((record, None, None, None))
+                    elif self.tiles:
+                        pending.append((record, area, self.tile_regions(area.shape, offset), offset))
+                        batched_frames += 1
+                    elif not self.motion_gated:
+                        pending.append((record, area, None, offset))
+                        batched_frames += 1
+                    elif motion_regions:
+                        regions = merge_regions([(x - offset[0], y - offset[1], w, h) for x, y, w, h in motion_regions],
+                                                self.region_padding, area.shape)
+                        pending.append((record, area, regions, offset))
+                        batched_frames += 1
+                    else:
+                        # Motion-gated with nothing moving: no detection for this frame
+                        self.skip_detection(record)
+                        pending.append((record, None, None, None))
+                else:
+                    pending.append((record, None, None, None))
+
+                if self.pool is not None:
+                    # Detector processes work on earlier frames while this one decodes;
+                    # only wait for the oldest once every slot is in use
+                    record, frame, regions, offset = pending[-1]
+                    if frame is not None:
+                        self.submit(frame, regions, record, offset)
+                        pending[-1] = (record, True, regions, offset)
+                    self.flush_pool(pending, out, keep=self.pool.num_slots - 1)
+                elif batched_frames >= self.batch_size or (batched_frames == 0 and pending):
+                    self.flush(pending, out)
+                    batched_frames = 0
+
+                # Frames dropped by the pacing policy are skipped without converting them
+                dropped = pacer.frame_done(sampler.step)
+                if dropped:
+                    self.metrics.increment("pacing_dropped_frames", dropped)
+                    sampler.drop(dropped)
+
+            if self.pool is not None:
+                self.flush_pool(pending, out)
+            else:
+                self.flush(pending, out)
+            frame_count = sampler.position
+            if end_frame is not None:
+                frame_count = min(frame_count, end_frame)
+
+            # A whole file with every sampled frame through the background model can be served from now on
+            if (self.video is not None and self.motion_detector is not None and not motion_cached and finished
+                    and start_frame == 0 and end_frame is None and pacer.dropped_frames == 0):
+                self.cache.mark_complete(self.video, "motion", self.motion_config, analyzed_frames)
+        finally:
+            vid.release()
+            if self.activity is not None:
+                self.activity.flush()
+
+        elapsed = time.perf_counter() - start_time
+
+        # Per-track dwell times and per-class counts close the file's records
+        if self.tracker is not None:
+            summary = {"source": source, "track_summary": self.tracker.summary()}
+            if self.stream_id is not None:
+                summary["stream"] = self.stream_id
+            out.write(json.dumps(summary) + "\n")
+
+        self.dropped_frames += pacer.dropped_frames
+        frames = max(frame_count - start_frame, 0)
+        summary = {
+            "source": source,
+            "frames": frames,
+            "analyzed_frames": analyzed_frames,
+            "dropped_frames": pacer.dropped_frames,
+            "seconds": elapsed,
+            "fps": frames / elapsed if elapsed > 0 else 0.0,
+        }
+        if self.activity is not None:
+            summary["activity_index"] = self.activity.path
+        return summary
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="main.py analyze",
+                                     description="Analyze video files without the UI and write per-frame results as JSONL")
+    parser.add_argument("inputs", nargs="+", help="Video files to analyze")
+    parser.add_argument("--mode", choices=sorted(ANALYSIS_MODES), default="both",
+                        help="Analysis to run (default: both)")
+    parser.add_argument("--out", default="-", help="Output JSONL file, '-' for stdout (default)")
+    parser.add_argument("--skip-frames", type=int, default=0,
+                        help="Frames to skip between object detections (default: 0)")
+    parser.add_argument("--sample-every", type=int, default=1,
+                        help="Only analyze every Nth frame, stepping over the others without converting "
+                             "them, for coarse scans (default: 1, every frame)")
+    parser.add_argument("--keyframes", action="store_true",
+                        help="Only analyze the keyframes of each file, for the coarsest and cheapest scan")
+    parser.add_argument("--detection-width", type=int, default=480,
+                        help="Maximum frame width sent to the object detector (default: 480)")
+    parser.add_argument("--pacing", choices=POLICIES, default=MAX_THROUGHPUT,
+                        help="Frame pacing: realtime drops frames to keep up with the source clock, "
+                             "max never waits, fixed runs at --fps (default: max)")
+    parser.add_argument("--fps", type=float, default=15.0,
+                        help="Frame rate for --pacing fixed (default: 15)")
+    parser.add_argument("--batch-size", type=int, default=8,
+                        help="Frames per object detection forward pass (default: 8)")
+    parser.add_argument("--motion-gated", action="store_true",
+                        help="Only detect objects in padded crops around motion regions")
+    parser.add_argument("--region-padding", type=int, default=32,
+                        help="Pixels of context added around motion regions when gated (default: 32)")
+    parser.add_argument("--tiles", action="store_true",
+                        help="Detect objects in overlapping full-resolution tiles of --detection-width pixels "
+                             "instead of a shrunk frame, finding small and distant objects in high-resolution video")
+    parser.add_argument("--tile-overlap", type=float, default=0.2,
+                        help="Fraction of a tile shared with its neighbours (default: 0.2)")
+    parser.add_argument("--roi", default=None, metavar="X,Y,W,H",
+                        help="Only tile this rectangle of the frame, in pixels (default: the whole frame)")
+    parser.add_argument("--mask", default=None, metavar="FILE",
+                        help="Polygon mask JSON, as saved by the UI, limiting motion and object detection to its "
+                             "region of interest minus its exclusions, for every input")
+    parser.add_argument("--motion-scale", type=float, default=1.0,
+                        help="Scale frames by this factor before motion detection, e.g. 0.25 (default: 1)")
+    parser.add_argument("--motion-color", choices=(COLOR, GRAY), default=COLOR,
+                        help="Model the background in color or grayscale (default: color)")
+    parser.add_argument("--motion-morph", type=int, default=0,
+                        help="Kernel size of a morphological opening on the motion mask, 0 to disable (default: 0)")
+    parser.add_argument("--static-threshold", type=float, default=0,
+                        help="Skip motion detection on frames whose thumbnail changed by at most this many "
+                             "gray levels per block, e.g. 8 (default: 0, never skip)")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Run object detection in this many worker processes, each with its own model "
+                             "(default: 0, detect in the main process)")
+    parser.add_argument("--streams", action="store_true",
+                        help="Analyze all inputs concurrently, one stream each, sharing one model; "
+                             "inputs made of digits are camera indices")
+    parser.add_argument("--grid-interval", type=float, default=2.0,
+                        help="Seconds between per-stream progress tables on stderr with --streams, 0 for none "
+                             "(default: 2)")
+    parser.add_argument("--segments", type=int, default=1,
+                        help="Split each file into this many frame ranges analyzed in parallel processes "
+                             "(default: 1, sequential)")
+    parser.add_argument("--segment-warmup", type=int, default=200,
+                        help="Frames before each segment used to warm up the background model (default: 200)")
+    parser.add_argument("--cache", default=None, metavar="PATH",
+                        help="Reuse per-frame motion and detection results of earlier runs from this SQLite "
+                             "file, and store new ones in it")
+    parser.add_argument("--cache-size", type=int, default=1024,
+                        help="Megabytes the cache may hold before the least recently used results are "
+                             "evicted (default: 1024)")
+    parser.add_argument("--activity-dir", default=None, metavar="DIR",
+                        help="Write a per-frame activity index of each file (motion score, region count, top "
+                             "classes) into this directory, for event seeking in the UI")
+    parser.add_argument("--track", action="store_true",
+                        help="Track objects between detection frames and report track IDs and dwell times")
+    parser.add_argument("--classes", default=None,
+                        help="Comma-separated class names to keep, e.g. person,car (default: all)")
+    parser.add_argument("--class-threshold", action="append", default=[], metavar="CLASS=THRESHOLD",
+                        help="Confidence threshold for one class, may be repeated")
+    parser.add_argument("--metrics-file", default=None,
+                        help="Append metrics snapshots to this file (.csv for CSV, otherwise JSON lines)")
+    parser.add_argument("--metrics-interval", type=float, default=10.0,
+                        help="Seconds between metrics snapshots (default: 10)")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve Prometheus-format metrics on this local port")
+    parser.add_argument("--model", default=DEFAULT_MODEL_ID,
+                        help=f"Model ID or local SavedModel directory, or a model file for the tflite and opencv "
+                             f"backends (default: {DEFAULT_MODEL_ID})")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default=DEFAULT_BACKEND,
+                        help="Inference backend: tf runs a TF SavedModel, tflite a TFLite model (e.g. int8 "
+                             "quantized), opencv a model file through cv2.dnn (default: tf)")
+    parser.add_argument("--backend-threads", type=int, default=None,
+                        help="Inference threads for the tflite and opencv backends (default: one per core)")
+    parser.add_argument("--offline", action="store_true",
+                        help="Only load models from the local cache, never download")
+    parser.add_argument("--confidence", type=float, default=None,
+                        help="Object detection confidence threshold (default: detector setting)")
+    return parser
+
+def sampled_text(summary):
+    """Analyzed frame count for a summary line, when not every frame was analyzed"""
+    if summary["analyzed_frames"] == summary["frames"]:
+        return ""
+    return f", {summary['analyzed_frames']} analyzed"
+
+def print_activity(summary):
+    """Report where a file's activity index was written and how many events it holds"""
+    if "activity_index" in summary:
+        events = ActivityIndex(summary["activity_index"]).events()
+        print(f"{summary['source']}: activity index {summary['activity_index']} ({len(events)} events)",
+              file=sys.stderr)
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not 0 < args.motion_scale <= 1:
+        parser.error("--motion-scale must be greater than 0 and at most 1")
+    if args.sample_every < 1:
+        parser.error("--sample-every must be at least 1")
+    if args.keyframes and args.sample_every > 1:
+        parser.error("--keyframes cannot be combined with --sample-every")
+    if args.tiles and args.motion_gated:
+        parser.error("--tiles cannot be combined with --motion-gated")
+    if not 0 <= args.tile_overlap < 1:
+        parser.error("--tile-overlap must be at least 0 and less than 1")
+    roi = None
+    if args.roi:
+        try:
+            roi = tuple(int(v) for v in args.roi.split(","))
+        except ValueError:
+            roi = ()
+        if len(roi) != 4 or roi[2] <= 0 or roi[3] <= 0:
+            parser.error("--roi must be X,Y,W,H in pixels, with a positive width and height")
+    args.roi = roi
+    if args.mask:
+        try:
+            args.mask = FrameMask.load(args.mask)
+        except (OSError, ValueError, TypeError) as e:
+            parser.error(f"could not read --mask {args.mask}: {e}")
+    if args.streams and args.workers:
+        parser.error("--streams shares one model between the streams and cannot be combined with --workers")
+    if args.segments > 1 and (args.streams or args.workers or args.track or args.pacing != MAX_THROUGHPUT):
+        parser.error("--segments cannot be combined with --streams, --workers, --track or --pacing")
+
+    allowed_classes = [name.strip() for name in args.classes.split(",")] if args.classes else None
+    class_thresholds = {}
+    for item in args.class_threshold:
+        name, _, threshold = item.rpartition("=")
+        try:
+            threshold = float(threshold)
+        except ValueError:
+            threshold = None
+        if not name.strip() or threshold is None or not 0 <= threshold <= 1:
+            parser.error(f"--class-threshold must be CLASS=THRESHOLD with a threshold from 0 to 1, got {item}")
+        class_thresholds[name.strip()] = threshold
+
+    if args.cache:
+        # Fail early with a clear message; each analyzer (or segment process) opens its own connection
+        try:
+            ResultCache(args.cache).close()
+        except (sqlite3.Error, OSError) as e:
+            print(f"Error opening result cache {args.cache}: {e}", file=sys.stderr)
+            return 1
+
+    if args.segments > 1:
+        return run_segments_main(args, allowed_classes, class_thresholds)
+
+    metrics = Metrics()
+    options = dict(mode=args.mode, skip_frames=args.skip_frames, detection_width=args.detection_width,
+                   motion_gated=args.motion_gated, region_padding=args.region_padding, track=args.track,
+                   pacing=args.pacing, fixed_fps=args.fps, metrics=metrics,
+                   motion_scale=args.motion_scale, motion_color=args.motion_color,
+                   motion_morph=args.motion_morph, static_threshold=args.static_threshold,
+                   sample_every=args.sample_every, keyframes_only=args.keyframes,
+                   cache_path=args.cache, cache_size=args.cache_size, activity_dir=args.activity_dir,
+                   tiles=args.tiles, tile_overlap=args.tile_overlap, roi=args.roi,
+                   backend=args.backend, backend_threads=args.backend_threads, mask=args.mask)
+    try:
+        analyzer = HeadlessAnalyzer(confidence_threshold=args.confidence, batch_size=args.batch_size,
+                                    model_id=args.model, offline=args.offline,
+                                    allowed_classes=allowed_classes, class_thresholds=class_thresholds,
+                                    workers=args.workers, **options)
+    except (KeyError, FileNotFoundError, ValueError, RuntimeError, ImportError) as e:
+        print(f"Error loading model: {e}", file=sys.stderr)
+        return 1
+    detector = analyzer.pool or analyzer.object_detector
+    if detector is not None:
+        workers = f" in {args.workers} worker processes" if analyzer.pool is not None else ""
+        backend = f" ({args.backend})" if args.backend != DEFAULT_BACKEND else ""
+        print(f"Model {detector.model_path}{backend}{workers}: load {detector.load_time:.2f}s, "
+              f"warm-up {detector.warmup_time:.2f}s", file=sys.stderr)
+
+    server = None
+    if args.metrics_port:
+        try:
+            server = MetricsServer(metrics, args.metrics_port).start()
+        except OSError as e:
+            print(f"Error starting metrics endpoint on port {args.metrics_port}: {e}", file=sys.stderr)
+            analyzer.close()
+            return 1
+    dumper = MetricsDumper(metrics, args.metrics_file, args.metrics_interval).start() if args.metrics_file else None
+
+    out = sys.stdout if args.out == "-" else open(args.out, "w")
+    try:
+        if args.streams:
+            return run_streams_main(args, analyzer, options, out)
+        for source in args.inputs:
+            try:
+                summary = analyzer.analyze(source, out)
+            except (IOError, RuntimeError) as e:
+                print(f"Error: {e}", file=sys.stderr)
+                return 1
+            print(f"{summary['source']}: {summary['frames']} frames in {summary['seconds']:.2f}s "
+                  f"({summary['fps']:.1f} fps, {summary['dropped_frames']} dropped{sampled_text(summary)})",
+                  file=sys.stderr)
+            print_activity(summary)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        analyzer.close()
+        if dumper is not None:
+            dumper.stop()
+        if server is not None:
+            server.stop()
+    return 0
+
+def run_segments_main(args, allowed_classes, class_thresholds):
+    """Analyze each input as parallel frame ranges in worker processes"""
+    from segmented import analyze_segmented
+
+    # Everything a worker needs to build its own analyzer and detector
+    options = dict(mode=args.mode, skip_frames=args.skip_frames, detection_width=args.detection_width,
+                   confidence_threshold=args.confidence, batch_size=args.batch_size, model_id=args.model,
+                   offline=args.offline, motion_gated=args.motion_gated, region_padding=args.region_padding,
+                   allowed_classes=allowed_classes, class_thresholds=class_thresholds,
+                   motion_scale=args.motion_scale, motion_color=args.motion_color,
+                   motion_morph=args.motion_morph, static_threshold=args.static_threshold,
+                   sample_every=args.sample_every, keyframes_only=args.keyframes,
+                   cache_path=args.cache, cache_size=args.cache_size, activity_dir=args.activity_dir,
+                   tiles=args.tiles, tile_overlap=args.tile_overlap, roi=args.roi,
+                   backend=args.backend, backend_threads=args.backend_threads, mask=args.mask)
+    processes = min(args.segments, os.cpu_count() or 1)
+
+    out = sys.stdout if args.out == "-" else open(args.out, "w")
+    try:
+        for source in args.inputs:
+            try:
+                summary = analyze_segmented(source, out, options, args.segments, processes, args.segment_warmup)
+            except (IOError, KeyError, FileNotFoundError, ValueError, RuntimeError, ImportError) as e:
+                print(f"Error: {e}", file=sys.stderr)
+                return 1
+            print(f"{summary['source']}: {summary['frames']} frames in {summary['seconds']:.2f}s "
+                  f"({summary['fps']:.1f} fps, {len(summary['segments'])} segments in {processes} processes"
+                  f"{sampled_text(summary)})",
+                  file=sys.stderr)
+            print_activity(summary)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+def run_streams_main(args, analyzer, options, out):
+    """Analyze every input at once, with one shared detector batching frames across the streams"""
+    from multi_stream import DetectionService, ServiceClient, run_streams
+
+    service = None
+    if analyzer.object_detector is not None:
+        service = DetectionService(analyzer.object_detector, args.batch_size, options["metrics"])
+
+    def make_analyzer(stream_id):
+        # Streams send single frames so the service can batch across them
+        client = ServiceClient(service, stream_id) if service is not None else None
+        return HeadlessAnalyzer(batch_size=1, object_detector=client, stream_id=stream_id, **options)
+
+    try:
+        summaries = run_streams(args.inputs, make_analyzer, service, out, args.grid_interval)
+    except (IOError, RuntimeError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    for stream_id, summary in enumerate(summaries):
+        print(f"[{stream_id}] {summary['source']}: {summary['frames']} frames in {summary['seconds']:.2f}s "
+              f"({summary['fps']:.1f} fps, {summary['dropped_frames']} dropped{sampled_text(summary)})",
+              file=sys.stderr)
+        print_activity(summary)
+    if service is not None and service.batches:
+        print(f"Shared detector: {service.images} frames in {service.batches} batches "
+              f"({service.images / service.batches:.1f} per batch)", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
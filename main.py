@@ -1,20 +1,96 @@
 # main.py
+import os
+import sys
 import tkinter as tk
+from tkinter import ttk
 import cv2
 import threading
 import time
 import queue
-from ui import VideoAnalysisUI
-from motion_detector import MotionDetector
-from object_detector import ObjectDetector
+import functools
+from motion_detector import GRAY, MotionDetector, merge_regions
+from model_registry import DEFAULT_MODEL_ID, ModelLoader
+from detection_pool import DetectionPool
+from backends import DEFAULT_BACKEND
+from tracker import ObjectTracker
+from frame_buffer import FrameRef, FrameRingBuffer
+from camera_grabber import CameraGrabber
+from PIL import Image, ImageTk
+from ui import VideoAnalysisUI, activity_strip_image
+from clip_recorder import ClipRecorder, default_clip_dir
+from activity_index import ActivityIndex, default_index_dir, index_path
+from masks import FrameMask, default_mask_dir, mask_path
+from pacing import FramePacer, REALTIME, MAX_THROUGHPUT, FIXED_RATE
+from sampling import FrameSampler, find_keyframes
+from result_cache import ResultCache, detection_config, motion_config, video_key
+from metrics import Metrics, MetricsDumper, MetricsServer
+
+# Pacing policies offered in the UI
+PACING_OPTIONS = {
+    "Real-time": REALTIME,
+    "Max throughput": MAX_THROUGHPUT,
+    "Fixed rate": FIXED_RATE,
+}
+
+# Frame sampling options offered in the UI: analyze every Nth frame, or None for keyframes only
+SAMPLING_OPTIONS = {
+    "Every frame": 1,
+    "Every 2nd frame": 2,
+    "Every 5th frame": 5,
+    "Every 10th frame": 10,
+    "Keyframes only": None,
+}
+
+# Mask drawing tools offered in the UI: whether a drawn polygon is excluded, or None when not drawing
+MASK_TOOLS = {
+    "Mask: off": None,
+    "Mask: draw region": False,
+    "Mask: draw exclusion": True,
+}
+
+def detector_settings():
+    """Model, inference backend and thread count from VIDEO_ANALYSIS_MODEL, _BACKEND and _BACKEND_THREADS"""
+    threads = os.environ.get("VIDEO_ANALYSIS_BACKEND_THREADS")
+    return {
+        "model_id": os.environ.get("VIDEO_ANALYSIS_MODEL", DEFAULT_MODEL_ID),
+        "backend": os.environ.get("VIDEO_ANALYSIS_BACKEND", DEFAULT_BACKEND),
+        "num_threads": int(threads) if threads else None,
+    }
+
+def create_object_detector():
+    """Import TensorFlow and build the detector (kept out of module scope for fast startup).
+
+    With VIDEO_ANALYSIS_DETECTION_WORKERS set, detection runs in that many worker
+    processes instead and a started DetectionPool is returned.
+    """
+    from object_detector import create_detector
+    factory = functools.partial(create_detector, **detector_settings())
+    workers = int(os.environ.get("VIDEO_ANALYSIS_DETECTION_WORKERS", "0"))
+    if workers > 0:
+        return DetectionPool(workers, factory).start()
+    return factory()
 
 class VideoAnalysisApp(VideoAnalysisUI):
     def __init__(self, root):
         super().__init__(root)
         
+        # Per-stage instrumentation, optionally dumped to a file and served for Prometheus
+        self.metrics = Metrics()
+        self.show_hud = tk.BooleanVar(value=False)
+        self.metrics_dumper = None
+        self.metrics_server = None
+        self.start_metrics_exports()
+        
         # Initialize detectors
-        self.motion_detector = MotionDetector()
-        self.object_detector = None  # Will initialize on demand
+        # Motion gating only needs coarse regions: model the background in gray at half resolution,
+        # and skip it entirely while the scene is static
+        self.motion_options = {"process_scale": 0.5, "color_mode": GRAY, "static_threshold": 8}
+        self.motion_detector = MotionDetector(**self.motion_options)
+        self.motion_detector.metrics = self.metrics
+        self.object_detector = None  # Set by the detection thread once the model is loaded
+        
+        # TensorFlow and the model are only loaded once an object recognition mode is chosen
+        self.model_loader = ModelLoader(create_object_detector, on_done=self.on_model_loaded)
         
         # Analysis state
         self.analyzing = False
@@ -31,20 +107,99 @@ class VideoAnalysisApp(VideoAnalysisUI):
         
         # Results tracking
         self.detected_objects = []
+        self.tracker = ObjectTracker()  # Carries boxes between detection frames
         self.motion_detected = False
         
         # Thread communication
+        self.frame_buffer = None  # Ring of decoded frames shared by all threads, sized on first read
+        self.frame_buffer_slots = 8
         self.frame_queue = queue.Queue(maxsize=1)  # For frames to display
-        self.detection_queue = queue.Queue(maxsize=1)  # For frames to detect objects
+        self.pending_display = None  # Newest (ref, overlays, text_lines, captured) waiting for the Tk thread
+        self.display_scheduled = False  # Whether a Tk callback to draw it is queued
+        self.display_lock = threading.Lock()
+        self.detection_batch_size = 4  # Most frames sent to the detector in one forward pass
+        self.detection_batch_timeout = 0.05  # Seconds to wait for a batch to fill up
+        self.detection_queue = queue.Queue(maxsize=self.detection_batch_size)  # For frames to detect objects
         
         # Add observer for dropdown changes
         self.dropdown.bind("<<ComboboxSelected>>", self.on_analysis_type_change)
         
         # Frame processing rate control
-        self.skip_frames = 5  # Process every 6th frame for object detection
+        self.skip_frames = 15  # Detect every 16th frame; the tracker predicts boxes in between
+        self.detection_width = 480  # Frames (or motion crops) are shrunk to this size for detection
+        
+        # Motion gating: only detect objects in padded crops around motion regions
+        self.motion_gated_detection = tk.BooleanVar(value=False)
+        self.region_padding = 32  # Pixels of context added around each motion region
+        
+        # Tiled detection: overlapping full-resolution tiles of detection_width pixels over the region of
+        # interest (VIDEO_ANALYSIS_TILE_ROI=x,y,w,h, the whole frame by default), for small distant objects
+        self.tiled_detection = tk.BooleanVar(value=False)
+        self.tile_overlap = 0.2  # Fraction of a tile shared with its neighbours
+        self.tile_merge_overlap = 0.6  # Overlap above which boxes from different tiles are one object
+        roi = os.environ.get("VIDEO_ANALYSIS_TILE_ROI")
+        self.tile_roi = tuple(int(v) for v in roi.split(",")) if roi else None
+        self.tile_grid = None  # (frame shape, tile regions) of the last frame size seen
+        
+        # Frame pacing: how frames are scheduled and dropped
+        self.pacing_policy = tk.StringVar(value="Real-time")
+        self.fixed_fps = 15.0  # Frame rate used by the fixed-rate policy
+        self.pacer = None
+        
+        # Frame sampling: frames that are not analyzed are stepped over without converting them
+        self.sampling = tk.StringVar(value="Every frame")
+        self.sampler = None
+        
+        # Results cache (VIDEO_ANALYSIS_CACHE): looping playback and repeated reviews of a file reuse
+        # the motion and detection results of earlier passes
+        self.result_cache = None
+        cache_path = os.environ.get("VIDEO_ANALYSIS_CACHE")
+        if cache_path:
+            cache_size = int(os.environ.get("VIDEO_ANALYSIS_CACHE_SIZE_MB", "1024"))
+            self.result_cache = ResultCache(cache_path, cache_size * 1024 * 1024)
+            self.result_cache.metrics = self.metrics
+        self.video_key = None  # Content hash of the file being analyzed, None when not caching
+        self.motion_config = None
+        self.motion_cached = False  # Whether motion comes from a complete pass in the cache
+        
+        # Activity timeline of the loaded file, drawn as a strip under the video for event seeking
+        self.activity_dir = default_index_dir()
+        self.activity_index = None
+        self.activity_width = self.display_width
+        self.activity_height = 16
+        self.activity_image = None
+        self.skip_quiet = tk.BooleanVar(value=False)  # Jump over stretches an earlier pass found quiet
+        self.seek_request = None  # Frame to jump to, set from the Tk thread
+        
+        # Event clips: only the footage around motion and tracked objects (of VIDEO_ANALYSIS_CLIP_CLASSES,
+        # if set) is saved to VIDEO_ANALYSIS_CLIP_DIR
+        self.record_clips = tk.BooleanVar(value=False)
+        self.clip_dir = default_clip_dir()
+        self.clip_classes = {name.strip() for name in os.environ.get("VIDEO_ANALYSIS_CLIP_CLASSES", "").split(",")
+                             if name.strip()}
+        self.clip_pre_roll = 3.0  # Seconds kept before a trigger
+        self.clip_post_roll = 3.0  # Seconds recorded after the last trigger
+        self.clip_recorder = None
+        self.finishing_clip_recorders = []  # Closed recorders whose writer threads are still encoding
+        
+        # Polygon mask of each source (saved in VIDEO_ANALYSIS_MASK_DIR): only the region of interest, minus
+        # exclusions, reaches motion and object detection. Edits replace the mask rather than change it
+        self.mask_dir = default_mask_dir()
+        self.frame_mask = FrameMask()
+        self.mask_key = None  # Name the mask is saved under: the file's content hash or the camera
+        self.mask_tool = tk.StringVar(value="Mask: off")
+        self.mask_points = []  # Polygon being drawn, in frame coordinates
         
         # Update UI to include camera option
         self.add_camera_button()
+        self.add_gating_option()
+        self.add_tiling_option()
+        self.add_pacing_option()
+        self.add_sampling_option()
+        self.add_hud_option()
+        self.add_clip_option()
+        self.add_mask_controls()
+        self.add_activity_strip()
         
     def add_camera_button(self):
         """Add a button to use webcam instead of video file"""
@@ -55,6 +210,177 @@ class VideoAnalysisApp(VideoAnalysisUI):
                                   command=self.use_camera, **button_style)
         self.btn_camera.pack(side=tk.LEFT, padx=5)
         
+    def add_gating_option(self):
+        """Add a checkbox to run object detection only where motion is found"""
+        self.chk_gating = tk.Checkbutton(self.top_frame, text="Motion-gated detection",
+                                         variable=self.motion_gated_detection,
+                                         font=("Arial", 10), bg=self.bg_color, fg=self.text_color)
+        self.chk_gating.pack(side=tk.LEFT, padx=5)
+        
+    def add_tiling_option(self):
+        """Add a checkbox to detect objects in full-resolution tiles instead of a shrunk frame"""
+        self.chk_tiling = tk.Checkbutton(self.top_frame, text="Tiled detection", variable=self.tiled_detection,
+                                         font=("Arial", 10), bg=self.bg_color, fg=self.text_color)
+        self.chk_tiling.pack(side=tk.LEFT, padx=5)
+        
+    def add_pacing_option(self):
+        """Add a dropdown for the frame pacing policy and a dropped-frame counter"""
+        self.pacing_dropdown = ttk.Combobox(self.top_frame, textvariable=self.pacing_policy,
+                                            values=list(PACING_OPTIONS), width=14, state="readonly")
+        self.pacing_dropdown.pack(side=tk.LEFT, padx=5)
+        
+        self.dropped_label = tk.Label(self.top_frame, text="Dropped: 0", font=("Arial", 10),
+                                      bg=self.bg_color, fg=self.text_color)
+        self.dropped_label.pack(side=tk.LEFT, padx=5)
+        
+    def add_sampling_option(self):
+        """Add a dropdown for which frames are analyzed, applied when analysis starts"""
+        self.sampling_dropdown = ttk.Combobox(self.top_frame, textvariable=self.sampling,
+                                              values=list(SAMPLING_OPTIONS), width=15, state="readonly")
+        self.sampling_dropdown.pack(side=tk.LEFT, padx=5)
+        
+    def add_hud_option(self):
+        """Add a checkbox for the on-frame metrics HUD"""
+        self.chk_hud = tk.Checkbutton(self.top_frame, text="Show metrics", variable=self.show_hud,
+                                      font=("Arial", 10), bg=self.bg_color, fg=self.text_color)
+        self.chk_hud.pack(side=tk.LEFT, padx=5)
+    
+    def add_clip_option(self):
+        """Add a checkbox to save clips around detected events"""
+        self.chk_clips = tk.Checkbutton(self.top_frame, text="Record clips", variable=self.record_clips,
+                                        font=("Arial", 10), bg=self.bg_color, fg=self.text_color)
+        self.chk_clips.pack(side=tk.LEFT, padx=5)
+    
+    def add_mask_controls(self):
+        """Add the mask drawing tool and a button to clear the mask; polygons are drawn on the video"""
+        self.btn_clear_mask = tk.Button(self.bottom_frame, text="Clear mask", command=self.clear_mask,
+                                        font=("Arial", 9))
+        self.btn_clear_mask.pack(side=tk.RIGHT, padx=5)
+        
+        self.mask_dropdown = ttk.Combobox(self.bottom_frame, textvariable=self.mask_tool,
+                                          values=list(MASK_TOOLS), width=18, state="readonly")
+        self.mask_dropdown.pack(side=tk.RIGHT, padx=5)
+        self.mask_dropdown.bind("<<ComboboxSelected>>", self.on_mask_tool_change)
+        
+        # Left click adds a point, right click closes the polygon
+        self.canvas.bind("<Button-1>", self.on_canvas_click)
+        self.canvas.bind("<Button-3>", self.finish_mask_polygon)
+    
+    def add_activity_strip(self):
+        """Add the activity strip under the video, with event navigation and quiet skipping"""
+        strip_frame = tk.Frame(self.main_frame, bg=self.bg_color)
+        strip_frame.pack(side=tk.BOTTOM, fill=tk.X, after=self.bottom_frame)
+        
+        self.btn_previous_event = tk.Button(strip_frame, text="◀ Event", command=self.previous_event,
+                                            font=("Arial", 9))
+        self.btn_previous_event.pack(side=tk.LEFT, padx=5)
+        
+        # Click anywhere on the strip to jump there
+        self.activity_canvas = tk.Canvas(strip_frame, width=self.activity_width, height=self.activity_height,
+                                         bg="#d0d0d0", highlightthickness=0)
+        self.activity_canvas.pack(side=tk.LEFT, padx=5)
+        self.activity_canvas.bind("<Button-1>", self.on_activity_click)
+        
+        self.btn_next_event = tk.Button(strip_frame, text="Event ▶", command=self.next_event, font=("Arial", 9))
+        self.btn_next_event.pack(side=tk.LEFT, padx=5)
+        
+        self.chk_skip_quiet = tk.Checkbutton(strip_frame, text="Skip quiet stretches", variable=self.skip_quiet,
+                                             font=("Arial", 10), bg=self.bg_color, fg=self.text_color)
+        self.chk_skip_quiet.pack(side=tk.LEFT, padx=5)
+    
+    def on_mask_tool_change(self, event=None):
+        """Drop a half-drawn polygon when the tool changes"""
+        self.mask_points = []
+        self.draw_mask_overlay()
+    
+    def on_canvas_click(self, event):
+        """Add a point to the polygon being drawn"""
+        if MASK_TOOLS[self.mask_tool.get()] is None:
+            return
+        point = self.canvas_to_frame(event.x, event.y)
+        if point is not None:
+            self.mask_points.append(point)
+            self.draw_mask_overlay()
+    
+    def finish_mask_polygon(self, event=None):
+        """Close the polygon being drawn and add it to the mask"""
+        exclude = MASK_TOOLS[self.mask_tool.get()]
+        if exclude is None or len(self.mask_points) < 3:
+            return
+        points, self.mask_points = self.mask_points, []
+        self.set_frame_mask(self.frame_mask.with_polygon(points, exclude))
+    
+    def clear_mask(self):
+        self.mask_points = []
+        self.set_frame_mask(FrameMask())
+    
+    def set_frame_mask(self, mask):
+        """Use a new mask for the current source and save it; analysis picks it up on its next frame"""
+        self.frame_mask = mask
+        if self.mask_key is not None:
+            path = mask_path(self.mask_dir, self.mask_key)
+            try:
+                if mask:
+                    mask.save(path)
+                elif os.path.exists(path):
+                    os.remove(path)
+            except OSError as e:
+                self.status_label.config(text=f"Could not save mask: {e}")
+        self.draw_mask_overlay()
+    
+    def load_mask(self, key):
+        """Switch to the saved mask of a source, if it has one"""
+        self.mask_key = key
+        self.mask_points = []
+        self.frame_mask = FrameMask()
+        path = mask_path(self.mask_dir, key)
+        if os.path.exists(path):
+            try:
+                self.frame_mask = FrameMask.load(path)
+            except (OSError, ValueError, TypeError) as e:
+                self.status_label.config(text=f"Could not read mask: {e}")
+        self.draw_mask_overlay()
+    
+    def on_display_geometry_change(self):
+        self.draw_mask_overlay()
+    
+    def draw_mask_overlay(self):
+        """Draw the mask's polygons over the video: regions in green, exclusions hatched in red"""
+        self.canvas.delete("mask")
+        if self.display_geometry is None:
+            return
+        
+        def canvas_points(polygon):
+            return [value for x, y in polygon for value in self.frame_to_canvas(x, y)]
+        
+        for polygon in self.frame_mask.include:
+            self.canvas.create_polygon(canvas_points(polygon), outline="#2ecc71", fill="", width=2, tags="mask")
+        for polygon in self.frame_mask.exclude:
+            self.canvas.create_polygon(canvas_points(polygon), outline="#e74c3c", fill="#e74c3c", stipple="gray25",
+                                       width=2, tags="mask")
+        
+        # The polygon being drawn, with a dot on each point
+        if len(self.mask_points) > 1:
+            self.canvas.create_line(canvas_points(self.mask_points), fill="yellow", dash=(4, 2), tags="mask")
+        for x, y in self.mask_points:
+            x, y = self.frame_to_canvas(x, y)
+            self.canvas.create_oval(x - 3, y - 3, x + 3, y + 3, fill="yellow", outline="", tags="mask")
+    
+    def start_metrics_exports(self):
+        """Start the metrics file dump and Prometheus endpoint if configured in the environment"""
+        dump_path = os.environ.get("VIDEO_ANALYSIS_METRICS_FILE")
+        if dump_path:
+            interval = float(os.environ.get("VIDEO_ANALYSIS_METRICS_INTERVAL", "10"))
+            self.metrics_dumper = MetricsDumper(self.metrics, dump_path, interval).start()
+        
+        port = os.environ.get("VIDEO_ANALYSIS_METRICS_PORT")
+        if port:
+            try:
+                self.metrics_server = MetricsServer(self.metrics, int(port)).start()
+            except OSError as e:
+                self.root.after(0, lambda err=str(e): self.status_label.config(
+                    text=f"Could not start metrics endpoint on port {port}: {err}"))
+        
 # Add this method to your VideoAnalysisApp class in main.py
     def use_camera(self):
         """Switch to using the webcam as input source"""
@@ -75,14 +401,14 @@ class VideoAnalysisApp(VideoAnalysisUI):
         
         # Try to open the camera
         try:
-            # Set camera properties for faster opening
-            self.vid = cv2.VideoCapture(self.camera_id)
-            self.vid.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Use minimal buffer
-            
-            if not self.vid.isOpened():
+            # A grabber thread drains the device so analysis always gets the newest frame
+            grabber = CameraGrabber(self.camera_id)
+            grabber.metrics = self.metrics
+            if not grabber.open():
                 self.root.after(0, lambda: self.status_label.config(text="Error: Could not open camera"))
                 self.root.after(0, lambda: self.btn_camera.config(state=tk.NORMAL, text="Use Camera"))
                 return
+            self.vid = grabber.start()
                 
             # Update state
             self.using_camera = True
@@ -98,6 +424,7 @@ class VideoAnalysisApp(VideoAnalysisUI):
             ret, frame = self.vid.read()
             if ret:
                 self.root.after(0, lambda f=frame: self.display_frame(f))
+            self.root.after(0, lambda: self.load_mask(f"camera{self.camera_id}"))
                 
         except Exception as e:
             self.root.after(0, lambda err=str(e): self.status_label.config(text=f"Camera error: {err}"))
@@ -115,32 +442,54 @@ class VideoAnalysisApp(VideoAnalysisUI):
         # Continue with normal video loading
         super().load_video()
         
+        # Show what earlier passes found in this file
+        self.activity_index = None
+        self.seek_request = None
+        if self.video_source:
+            video = video_key(self.video_source)
+            self.open_activity_index(video)
+            self.load_mask(video)
+        self.draw_activity_strip()
+        
         # Re-enable camera button if video is loaded
         if self.video_source:
             self.btn_camera.config(state=tk.NORMAL)
     
     def on_analysis_type_change(self, event):
         """Handle changes to analysis type dropdown while running"""
+        # Start loading the model in the background as soon as it is first needed
+        if self.analysis_type.get() in ["Object Recognition", "Both"]:
+            self.model_loader.start()
+        
         if self.analyzing:
             # Update the analysis type without restarting
             new_type = self.analysis_type.get()
             
-            # Initialize object detector if needed
-            if new_type in ["Object Recognition", "Both"] and self.object_detector is None:
-                try:
-                    self.status_label.config(text="Loading object detection model...")
-                    self.root.update()
-                    self.object_detector = ObjectDetector()
-                    self.status_label.config(text="Model loaded successfully")
-                except Exception as e:
-                    self.status_label.config(text=f"Error loading model: {str(e)}")
-                    return
+            # Start object detection if the new mode needs it
+            if new_type in ["Object Recognition", "Both"]:
+                self.start_detection_thread()
                     
             # Clear results if changing modes
             if self.current_analysis_type != new_type:
                 self.objects_listbox.delete(0, tk.END)
                 self.current_analysis_type = new_type
     
+    def on_model_loaded(self, loader):
+        """Report model load and warm-up time (called from the loader thread)"""
+        if loader.error is not None:
+            text = f"Error loading model: {str(loader.error)}"
+        else:
+            text = (f"Model ready (load {loader.detector.load_time:.1f}s, "
+                    f"warm-up {loader.detector.warmup_time:.1f}s)")
+        self.root.after(0, lambda: self.status_label.config(text=text))
+    
+    def start_detection_thread(self):
+        """Start the object detection thread unless it is already running"""
+        if self.detection_thread is None or not self.detection_thread.is_alive():
+            self.detection_thread = threading.Thread(target=self.detect_objects)
+            self.detection_thread.daemon = True
+            self.detection_thread.start()
+    
     def start_analysis(self):
         if not self.analyzing:
             # Make sure we have a video source
@@ -160,23 +509,19 @@ class VideoAnalysisApp(VideoAnalysisUI):
             
             # Clear previous results
             self.objects_listbox.delete(0, tk.END)
+            self.tracker.reset()
             
             # Save current analysis type
             self.current_analysis_type = self.analysis_type.get()
             
-            # Initialize object detector if needed
+            # Make sure the object detection model is loading and did not fail
             if self.current_analysis_type in ["Object Recognition", "Both"]:
-                try:
-                    if self.object_detector is None:
-                        self.status_label.config(text="Loading object detection model...")
-                        self.root.update()
-                        self.object_detector = ObjectDetector()
-                        self.status_label.config(text="Model loaded successfully")
-                except Exception as e:
-                    self.status_label.config(text=f"Error loading model: {str(e)}")
-                    self.analyzing = False
-                    self.btn_start.config(text="Start Analysis")
-                    return
+                self.model_loader.start()
+            if self.current_analysis_type in ["Object Recognition", "Both"] and self.model_loader.error:
+                self.status_label.config(text=f"Error loading model: {str(self.model_loader.error)}")
+                self.analyzing = False
+                self.btn_start.config(text="Start Analysis")
+                return
             
             # Start threads for video processing, display, and object detection
             self.display_thread = threading.Thread(target=self.display_frames)
@@ -188,9 +533,7 @@ class VideoAnalysisApp(VideoAnalysisUI):
             self.analysis_thread.start()
             
             if self.current_analysis_type in ["Object Recognition", "Both"]:
-                self.detection_thread = threading.Thread(target=self.detect_objects)
-                self.detection_thread.daemon = True
-                self.detection_thread.start()
+                self.start_detection_thread()
                 
             # Disable source switching while analyzing
             self.btn_load.config(state=tk.DISABLED)
@@ -204,18 +547,260 @@ class VideoAnalysisApp(VideoAnalysisUI):
             self.btn_load.config(state=tk.NORMAL)
             self.btn_camera.config(state=tk.NORMAL)
             
-            # Clear queues to avoid deadlocks
+            if self.activity_index is not None:
+                self.activity_index.flush()
+            
+            # Clear queues to avoid deadlocks, handing their frame slots back
             try:
                 while True:
-                    self.frame_queue.get_nowait()
+                    self.frame_queue.get_nowait()[0].release()
             except queue.Empty:
                 pass
                 
             try:
                 while True:
-                    self.detection_queue.get_nowait()
+                    ref = self.detection_queue.get_nowait()[4]
+                    if ref is not None:
+                        ref.release()
             except queue.Empty:
                 pass
+            
+            # And the frame waiting to be drawn, if the Tk thread has not got to it
+            with self.display_lock:
+                pending, self.pending_display = self.pending_display, None
+            if pending is not None:
+                pending[0].release()
+    
+    def read_frame(self):
+        """Decode the next frame into the shared ring buffer, returning a FrameRef or None"""
+        if self.frame_buffer is None:
+            # Size the ring from the first frame
+            ret, frame = self.sampler.read()
+            if not ret:
+                return None
+            self.frame_buffer = FrameRingBuffer(self.frame_buffer_slots, frame.shape)
+            return FrameRef(self.frame_buffer, None, frame)
+        
+        ref = self.frame_buffer.read(self.sampler)
+        if ref is not None and ref.frame.shape != self.frame_buffer.shape:
+            # The source changed resolution; start a new ring
+            self.frame_buffer = FrameRingBuffer(self.frame_buffer_slots, ref.frame.shape)
+        return ref
+    
+    def offer(self, target_queue, item, ref, name):
+        """Put an item on a queue without blocking, holding a reference to its frame slot.
+
+        Returns False (and drops the reference again) if the queue is full;
+        drops are counted as "<name>_drops".
+        """
+        if ref is not None:
+            ref.retain()
+        try:
+            target_queue.put(item, block=False)
+            return True
+        except queue.Full:
+            if ref is not None:
+                ref.release()
+            self.metrics.increment(f"{name}_drops")
+            return False
+    
+    def create_sampler(self):
+        """Build the FrameSampler for the chosen sampling option (called from the analysis thread)"""
+        every = SAMPLING_OPTIONS[self.sampling.get()]
+        keyframes = None
+        if every is None:
+            every = 1
+            if self.using_camera:
+                self.root.after(0, lambda: self.status_label.config(
+                    text="Keyframe sampling needs a video file, analyzing every frame"))
+            else:
+                try:
+                    keyframes = find_keyframes(self.video_source)
+                except IOError as e:
+                    self.root.after(0, lambda err=str(e): self.status_label.config(
+                        text=f"{err}, analyzing every frame"))
+        
+        sampler = FrameSampler(self.vid, every, keyframes, seekable=not self.using_camera)
+        sampler.metrics = self.metrics
+        return sampler
+    
+    def open_activity_index(self, video):
+        """Open (or create) the activity index of the loaded file, by its content hash"""
+        total_frames = int(self.vid.get(cv2.CAP_PROP_FRAME_COUNT)) if self.vid is not None else 0
+        if video is None or total_frames <= 0:
+            return
+        try:
+            self.activity_index = ActivityIndex(index_path(self.activity_dir, video), total_frames)
+        except (OSError, ValueError) as e:
+            self.root.after(0, lambda err=str(e): self.status_label.config(text=f"No activity index: {err}"))
+    
+    def current_frame(self):
+        """Index in the file of the frame being shown, or about to be"""
+        if self.seek_request is not None:
+            return self.seek_request
+        if self.sampler is not None and self.sampler.frame_index is not None:
+            return self.sampler.frame_index
+        return 0
+    
+    def seek_to(self, frame_index):
+        """Jump to a frame of the loaded file: taken up by the analysis thread, or previewed when stopped"""
+        if self.using_camera or self.vid is None:
+            return
+        self.seek_request = frame_index
+        if not self.analyzing:
+            self.vid.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+            ret, frame = self.vid.read()
+            if ret:
+                self.display_frame(frame)
+        self.draw_activity_strip()
+    
+    def next_event(self):
+        if self.activity_index is None:
+            return
+        start = self.activity_index.next_event(self.current_frame())
+        if start is None:
+            self.status_label.config(text="No later event")
+        else:
+            self.seek_to(start)
+    
+    def previous_event(self):
+        if self.activity_index is None:
+            return
+        start = self.activity_index.previous_event(self.current_frame())
+        if start is None:
+            self.status_label.config(text="No earlier event")
+        else:
+            self.seek_to(start)
+    
+    def on_activity_click(self, event):
+        if self.activity_index is not None:
+            fraction = min(max(event.x / self.activity_width, 0.0), 1.0)
+            self.seek_to(min(int(fraction * len(self.activity_index)), len(self.activity_index) - 1))
+    
+    def draw_activity_strip(self):
+        """Draw the activity index under the video, with a marker at the current frame (Tk thread)"""
+        self.activity_canvas.delete("all")
+        index = self.activity_index
+        if index is None or not len(index):
+            return
+        image = activity_strip_image(*index.strip(self.activity_width), self.activity_height)
+        self.activity_image = ImageTk.PhotoImage(image=Image.fromarray(image))
+        self.activity_canvas.create_image(0, 0, anchor=tk.NW, image=self.activity_image)
+        x = int(self.current_frame() / len(index) * self.activity_width)
+        self.activity_canvas.create_line(x, 0, x, self.activity_height, fill="black", width=2)
+    
+    def apply_seeks(self):
+        """Move the sampler for a pending seek, or past a stretch known to be quiet (analysis thread).
+
+        Returns whether it moved.
+        """
+        target = self.seek_request
+        self.seek_request = None
+        index = self.activity_index
+        if target is None and index is not None and self.skip_quiet.get():
+            position = self.sampler.next_target()
+            if position is not None and position < len(index):
+                resume = index.skip_quiet(position)
+                if resume is None:
+                    # Only quiet frames left: loop back to the first event
+                    resume = index.skip_quiet(0)
+                if resume is not None and resume != position:
+                    target = resume
+        if target is not None:
+            self.sampler.rewind(target)
+            self.pacer.start()
+            if self.clip_recorder is not None:
+                self.clip_recorder.reset()  # The pre-roll is no longer just before the next frame
+        return target is not None
+    
+    def start_motion_pass(self):
+        """Begin a pass over the file (analysis thread), returning whether it can be cached as complete.
+
+        Motion is served from the cache only once a complete pass is stored. Until
+        then each pass starts from a fresh background model and computes every
+        frame, so its results match any other run over the file.
+        """
+        self.motion_cached = (self.video_key is not None
+                              and self.result_cache.is_complete(self.video_key, "motion", self.motion_config))
+        if self.video_key is None or self.motion_cached:
+            return False
+        mask = self.motion_detector.mask
+        self.motion_detector = MotionDetector(**self.motion_options)
+        self.motion_detector.metrics = self.metrics
+        self.motion_detector.set_mask(mask)
+        return True
+    
+    def detection_config(self, gated, tiled=False):
+        """Cache configuration of the detections made in the UI"""
+        tiling = None
+        if tiled:
+            tiling = {"tile_size": self.detection_width, "overlap": self.tile_overlap,
+                      "roi": list(self.tile_roi) if self.tile_roi is not None else None}
+        settings = detector_settings()
+        return detection_config(settings["model_id"], self.detection_width,
+                                gating_motion_config=self.motion_config if gated else None,
+                                region_padding=self.region_padding, tiling=tiling, backend=settings["backend"],
+                                mask=self.motion_detector.mask)
+    
+    def tile_regions(self, frame_shape, offset=(0, 0)):
+        """Tiles covering the region of interest of frames of this shape, cut from the frame at offset"""
+        if self.tile_grid is None or self.tile_grid[0] != (frame_shape, offset):
+            from object_detector import tile_regions  # Only needed once detection runs
+            roi = self.tile_roi
+            if roi is not None:
+                roi = (roi[0] - offset[0], roi[1] - offset[1], roi[2], roi[3])
+            self.tile_grid = ((frame_shape, offset),
+                              tile_regions(frame_shape, self.detection_width, self.tile_overlap, roi))
+        return self.tile_grid[1]
+    
+    def store_detections(self, source_index, detections, gated=False, tiled=False):
+        """Store a frame's detections (in frame coordinates) for later passes over the file"""
+        if self.activity_index is not None:
+            self.activity_index.record_objects(source_index, detections)
+        if self.video_key is not None:
+            self.result_cache.put_detections(self.video_key, self.detection_config(gated, tiled), source_index,
+                                             detections)
+    
+    def create_clip_recorder(self):
+        """Build and start the ClipRecorder for the current source (called from the analysis thread)"""
+        fps = self.vid.get(cv2.CAP_PROP_FPS) or 30.0
+        if self.sampler.keyframes is not None:
+            # Roughly the rate at which keyframes come by
+            total_frames = self.vid.get(cv2.CAP_PROP_FRAME_COUNT)
+            fps = fps * len(self.sampler.keyframes) / total_frames if total_frames > 0 else fps
+        else:
+            fps /= self.sampler.every
+        
+        if self.using_camera:
+            prefix = f"camera{self.camera_id}"
+        else:
+            prefix = os.path.splitext(os.path.basename(self.video_source))[0]
+        recorder = ClipRecorder(self.clip_dir, fps, self.clip_pre_roll, self.clip_post_roll, prefix=prefix,
+                                on_clip=lambda path, frames: self.on_clip_saved(recorder, path, frames))
+        recorder.metrics = self.metrics
+        return recorder.start()
+    
+    def finish_clip_recorder(self):
+        """Close the clip recorder without waiting: its writer thread finishes the queued clips"""
+        recorder, self.clip_recorder = self.clip_recorder, None
+        recorder.close()
+        self.finishing_clip_recorders = [r for r in self.finishing_clip_recorders if not r.join(0)] + [recorder]
+    
+    def on_clip_saved(self, recorder, path, frames):
+        """Report a finished clip (called from the clip writer thread, after the recorder may be closed)"""
+        text = (f"Saved clip {os.path.basename(path)} ({frames} frames), "
+                f"{recorder.savings() * 100:.0f}% of frames not recorded")
+        if recorder.dropped_frames:
+            text += f", {recorder.dropped_frames} dropped by the clip writer"
+        self.root.after(0, lambda: self.status_label.config(text=text))
+    
+    def clip_triggered(self, motion_checked):
+        """Whether the current frame should start or extend a clip"""
+        if motion_checked and self.motion_detected:
+            return True
+        # Tracks matched by the latest detection round, of the chosen classes if any
+        return any(track.misses == 0 and (not self.clip_classes or track.class_name in self.clip_classes)
+                   for track in list(self.tracker.tracks))
     
     def process_video(self):
         """Thread for video processing and motion detection"""
@@ -229,36 +814,110 @@ class VideoAnalysisApp(VideoAnalysisUI):
         if not self.using_camera and self.video_source:
             self.vid.set(cv2.CAP_PROP_POS_FRAMES, 0)
         
-        # For camera, set smaller buffer to reduce latency
-        if self.using_camera:
-            self.vid.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-        
         frame_count = 0
+        self.frame_buffer = None
+        self.sampler = self.create_sampler()
+        
+        # Cache keys for this file and sampling
+        video = video_key(self.video_source) if not self.using_camera and self.video_source else None
+        if self.activity_index is None:
+            self.open_activity_index(video)
+        self.video_key = None
+        if self.result_cache is not None and video is not None:
+            self.video_key = video
+        self.motion_config = motion_config(self.motion_options, self.sampler.every,
+                                           self.sampler.keyframes is not None, self.motion_detector.mask)
+        # A pass is stored as complete only if every frame of it went through motion detection
+        pass_complete = self.start_motion_pass()
+        pass_frames = 0
+        
+        # Pace against the source's own frame rate
+        self.pacer = FramePacer(PACING_OPTIONS[self.pacing_policy.get()],
+                                source_fps=self.vid.get(cv2.CAP_PROP_FPS),
+                                fixed_fps=self.fixed_fps, live=self.using_camera)
+        source_fps = self.vid.get(cv2.CAP_PROP_FPS) or 30.0
+        self.clip_recorder = None
+        camera_lost = False
         
         # Process video frames
         while self.analyzing:
             # Get current analysis type (may have changed)
             analysis_type = self.analysis_type.get()
             
-            ret, frame = self.vid.read()
+            # Mask edits take effect from the next frame (the cache keys include the mask)
+            mask = self.frame_mask if self.frame_mask else None
+            if mask is not self.motion_detector.mask:
+                self.motion_detector.set_mask(mask)
+                self.motion_config = motion_config(self.motion_options, self.sampler.every,
+                                                   self.sampler.keyframes is not None, mask)
+                self.motion_cached = (self.video_key is not None
+                                      and self.result_cache.is_complete(self.video_key, "motion", self.motion_config))
+                pass_complete = False
             
-            if not ret:
+            # Jumps requested from the activity strip, and over quiet stretches
+            if not self.using_camera and self.apply_seeks():
+                pass_complete = False
+            
+            capture_start = time.perf_counter()
+            ref = self.read_frame()
+            
+            if ref is None:
                 if self.using_camera:
-                    # For camera, try to reconnect or wait
-                    time.sleep(0.1)
+                    # No new frame within the grabber's timeout; it reconnects on its own
+                    if not camera_lost and not self.vid.connected:
+                        camera_lost = True
+                        self.root.after(0, lambda: self.status_label.config(text="Camera lost, reconnecting..."))
                     continue
                 else:
-                    # For video file, loop back
-                    self.vid.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    # For video file, loop back and restart the pacing clock
+                    if pass_complete:
+                        self.result_cache.mark_complete(self.video_key, "motion", self.motion_config, pass_frames)
+                    self.sampler.rewind(0)
+                    self.pacer.start()
+                    pass_complete = self.start_motion_pass()
+                    pass_frames = 0
                     continue
+            self.metrics.observe("capture", time.perf_counter() - capture_start)
+            self.metrics.tick("capture")
+            if camera_lost:
+                camera_lost = False
+                self.root.after(0, lambda: self.status_label.config(text="Camera reconnected"))
+            
+            # When the frame arrived from the device (decoded, for files), for motion-to-screen latency
+            captured = self.vid.timestamp if self.using_camera else time.perf_counter()
             
-            result_frame = frame.copy()
+            # The frame lives in a shared slot: it is only read from here on
+            frame = ref.frame
             frame_count += 1
+            source_index = self.sampler.frame_index  # Position in the file, the same on every loop
             
-            # Apply motion detection if selected
-            if analysis_type in ["Motion Detection", "Both"]:
-                self.motion_detected, motion_frame, _ = self.motion_detector.detect(frame)
-                result_frame = motion_frame
+            # Counted in source samples, so every loop detects on the same frames
+            detect_this_frame = (analysis_type in ["Object Recognition", "Both"]
+                                 and self.sampler.sample_number(source_index) % (self.skip_frames + 1) == 0)
+            gated = detect_this_frame and self.motion_gated_detection.get()
+            tiled = detect_this_frame and not gated and self.tiled_detection.get()
+            
+            # Apply motion detection if selected (gating needs it in every mode)
+            shown_regions = None
+            motion_checked = analysis_type in ["Motion Detection", "Both"] or gated
+            if not motion_checked:
+                pass_complete = False
+            if motion_checked:
+                cached = None
+                if self.motion_cached:
+                    cached = self.result_cache.get_motion(self.video_key, self.motion_config, source_index)
+                if cached is not None:
+                    self.motion_detected, motion_regions = cached
+                else:
+                    self.motion_detected, _, motion_regions = self.motion_detector.detect(frame)
+                    pass_frames += 1
+                    if self.video_key is not None:
+                        self.result_cache.put_motion(self.video_key, self.motion_config, source_index,
+                                                     self.motion_detected, motion_regions)
+                if self.activity_index is not None:
+                    self.activity_index.record_motion(source_index, motion_regions, frame.shape[0] * frame.shape[1])
+                if analysis_type in ["Motion Detection", "Both"]:
+                    shown_regions = motion_regions
                 
                 # Update motion status
                 status_text = "Detected" if self.motion_detected else "Not Detected"
@@ -266,56 +925,165 @@ class VideoAnalysisApp(VideoAnalysisUI):
                 self.root.after(0, lambda t=status_text, c=status_color: 
                             self.motion_status.config(text=t, fg=c))
             
-            # Send frame for display
-            try:
-                self.frame_queue.put(result_frame, block=False)
-            except queue.Full:
-                # Skip frame if queue is full (display is slower than processing)
-                pass
+            # Send frame for display (skipped if display is slower than processing)
+            self.offer(self.frame_queue, (ref, frame_count, shown_regions, captured), ref, "frame_queue")
                 
-            # Send frame for object detection (only every few frames)
-            if analysis_type in ["Object Recognition", "Both"] and frame_count % (self.skip_frames + 1) == 0:
-                try:
+            # Detections cached by an earlier pass skip the detection thread altogether
+            if detect_this_frame and not (gated and not motion_regions) and self.video_key is not None:
+                cached = self.result_cache.get_detections(self.video_key, self.detection_config(gated, tiled),
+                                                          source_index)
+                if cached is not None:
+                    if self.activity_index is not None:
+                        self.activity_index.record_objects(source_index, cached)
+                    self.detected_objects = cached
+                    self.tracker.update(cached.to_list(), frame_count)
+                    self.root.after(0, self.update_objects_list)
+                    detect_this_frame = False
+            
+            # Send frame for object detection (only every few frames, skipped if the queue is full)
+            if detect_this_frame:
+                # Only the masked area is detected in; a copy (with exclusions blacked out) holds no frame slot
+                area, offset, area_ref = frame, (0, 0), ref
+                if mask is not None:
+                    area, offset = mask.apply(frame)
+                    if area is not None and area.base is None:
+                        area_ref = None
+                
+                # The source index goes along so the results can be cached and indexed; then the overlap at
+                # which objects are merged across crops, set for tiles only, and the area's offset in the frame
+                if area is None:
+                    pass  # Nothing of the frame is inside the mask
+                elif gated:
+                    # Nothing moving, nothing to detect; keep the previous results
+                    if motion_regions:
+                        regions = merge_regions([(x - offset[0], y - offset[1], w, h) for x, y, w, h in motion_regions],
+                                                self.region_padding, area.shape)
+                        self.offer(self.detection_queue,
+                                   (area, 1.0, regions, frame_count, area_ref, source_index, None, offset),
+                                   area_ref, "detection_queue")
+                elif tiled:
+                    # Full-resolution tiles, cropped (not copied) by the detection thread
+                    self.offer(self.detection_queue, (area, 1.0, self.tile_regions(area.shape, offset), frame_count,
+                                                      area_ref, source_index, self.tile_merge_overlap, offset),
+                               area_ref, "detection_queue")
+                else:
                     # Resize for faster processing
-                    h, w = result_frame.shape[:2]
-                    scale = 480.0 / w if w > 480 else 1.0
-                    small_frame = cv2.resize(result_frame, (0, 0), fx=scale, fy=scale)
-                    
-                    # Add scale information along with the frame
-                    self.detection_queue.put((small_frame, scale, result_frame.shape[:2]), block=False)
-                except queue.Full:
-                    # Skip detection if queue is full
-                    pass
+                    h, w = area.shape[:2]
+                    scale = self.detection_width / w if w > self.detection_width else 1.0
+                    if scale != 1.0:
+                        with self.metrics.time("resize"):
+                            small_frame = cv2.resize(area, (0, 0), fx=scale, fy=scale)
+                        self.offer(self.detection_queue,
+                                   (small_frame, scale, None, frame_count, None, source_index, None, offset), None,
+                                   "detection_queue")
+                    else:
+                        self.offer(self.detection_queue,
+                                   (area, scale, None, frame_count, area_ref, source_index, None, offset),
+                                   area_ref, "detection_queue")
+            
+            # Keep the frame for clips around events; the writer thread gets its own copy
+            if self.record_clips.get():
+                if self.clip_recorder is None:
+                    self.clip_recorder = self.create_clip_recorder()
+                # Source time for files, so clips stay in step whatever the pacing
+                timestamp = captured if self.using_camera else source_index / source_fps
+                with self.metrics.time("clip_buffer"):
+                    self.clip_recorder.add(frame, timestamp, self.clip_triggered(motion_checked))
+            elif self.clip_recorder is not None:
+                self.finish_clip_recorder()
+            
+            # Done with this frame here; consumers hold their own references
+            ref.release()
             
-            # Control frame rate - slower for camera to prevent lag
-            time.sleep(0.03 if self.using_camera else 0.01)
+            # Wait or drop frames as the pacing policy requires; dropped frames are never converted
+            self.pacer.policy = PACING_OPTIONS[self.pacing_policy.get()]
+            dropped = self.pacer.frame_done(self.sampler.step)
+            if dropped:
+                self.metrics.increment("pacing_dropped_frames", dropped)
+                self.sampler.drop(dropped)
+                pass_complete = False
+            
+            # Report dropped frames and redraw the activity strip now and then
+            if frame_count % 30 == 0:
+                self.root.after(0, self.draw_activity_strip)
+                clip_drops = self.clip_recorder.dropped_frames if self.clip_recorder is not None else 0
+                text = f"Dropped: {self.pacer.dropped_frames}" + (f" (clips: {clip_drops})" if clip_drops else "")
+                self.root.after(0, lambda t=text: self.dropped_label.config(text=t))
+        
+        # Finish the clip in progress; the writer thread drains its queue
+        if self.clip_recorder is not None:
+            self.finish_clip_recorder()
+    
+    def collect_detection_batch(self):
+        """Collect frames for detection until the batch is full or the deadline passes"""
+        # Block briefly for the first frame, then gather more until the deadline
+        batch = [self.detection_queue.get(timeout=0.1)]
+        deadline = time.time() + self.detection_batch_timeout
+        
+        while len(batch) < self.detection_batch_size:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.detection_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        
+        return batch
     
     def detect_objects(self):
         """Thread dedicated to object detection"""
-        last_objects = []
+        # Wait for the background model load without blocking the UI
+        if self.object_detector is None:
+            if not self.model_loader.done():
+                self.root.after(0, lambda: self.status_label.config(text="Loading object detection model..."))
+            try:
+                self.object_detector = self.model_loader.get()
+            except Exception as e:
+                self.root.after(0, lambda err=str(e): self.status_label.config(text=f"Error loading model: {err}"))
+                return
+        
+        if isinstance(self.object_detector, DetectionPool):
+            self.detect_with_pool(self.object_detector)
+            return
         
         while self.analyzing:
             try:
-                # Get a frame for detection
-                frame, scale, original_shape = self.detection_queue.get(timeout=0.1)
+                # Get a batch of frames for detection
+                batch = self.collect_detection_batch()
                 
-                # Perform detection
-                detected_objects, _ = self.object_detector.detect(frame)
+                inference_start = time.perf_counter()
+                results = []
+                try:
+                    # Whole frames are detected in one pass, then every frame is handled in order
+                    items = [item for item in batch if item[2] is None]
+                    whole = iter(self.object_detector.detect_batch([item[0] for item in items]) if items else [])
+                    for frame, scale, regions, frame_index, _, source_index, merge_overlap, offset in batch:
+                        if regions is not None:
+                            # Motion-gated or tiled: detect in crops of the frame only
+                            detected_objects = self.object_detector.detect_regions(
+                                frame, regions, self.detection_width, merge_overlap).scaled(1.0, *offset)
+                            tiled = merge_overlap is not None
+                            self.store_detections(source_index, detected_objects, gated=not tiled, tiled=tiled)
+                        else:
+                            detected_objects = next(whole).scaled(scale, *offset)
+                            self.store_detections(source_index, detected_objects)
+                        results.append((frame_index, detected_objects))
+                finally:
+                    # Hand the frame slots back to the ring
+                    for item in batch:
+                        if item[4] is not None:
+                            item[4].release()
                 
-                # Scale back bounding boxes to original size if needed
-                if scale != 1.0:
-                    for obj in detected_objects:
-                        x, y, width, height = obj['box']
-                        obj['box'] = (
-                            int(x / scale),
-                            int(y / scale),
-                            int(width / scale),
-                            int(height / scale)
-                        )
+                self.metrics.observe("inference", time.perf_counter() - inference_start)
+                for _ in batch:
+                    self.metrics.tick("detection")
                 
-                # Update results
+                # Every frame's detections feed the tracks in frame order (boxes are in frame coordinates
+                # by now); the newest are shown
+                for frame_index, detected_objects in results:
+                    self.tracker.update(detected_objects.to_list(), frame_index)
                 self.detected_objects = detected_objects
-                last_objects = detected_objects
                 
                 # Update objects list
                 self.root.after(0, self.update_objects_list)
@@ -325,50 +1093,158 @@ class VideoAnalysisApp(VideoAnalysisUI):
             except Exception as e:
                 self.status_label.config(text=f"Detection error: {str(e)}")
     
+    def detect_with_pool(self, pool):
+        """Detection thread loop when inference runs in worker processes"""
+        pool.metrics = self.metrics
+        while self.analyzing:
+            try:
+                try:
+                    item = self.detection_queue.get(timeout=0.02)
+                except queue.Empty:
+                    pass
+                else:
+                    frame, scale, regions, frame_index, ref, source_index, merge_overlap, offset = item
+                    try:
+                        # Skip the frame if every worker is busy, like a full queue
+                        context = (scale, offset, regions, source_index, merge_overlap)
+                        if not pool.submit(frame, frame_index, regions, context=context, merge_overlap=merge_overlap):
+                            self.metrics.increment("detection_pool_drops")
+                    finally:
+                        # The pool copied the frame, so its slot can go straight back to the ring
+                        if ref is not None:
+                            ref.release()
+                
+                # Results come back in frame order; ones overtaken by a newer frame are dropped
+                for frame_index, detected_objects, (scale, offset, regions, source_index, merge_overlap) in pool.poll():
+                    detected_objects = detected_objects.scaled(scale, *offset)
+                    tiled = merge_overlap is not None
+                    self.store_detections(source_index, detected_objects, gated=regions is not None and not tiled,
+                                          tiled=tiled)
+                    self.detected_objects = detected_objects
+                    self.tracker.update(detected_objects.to_list(), frame_index)
+                    self.root.after(0, self.update_objects_list)
+            except Exception as e:
+                self.root.after(0, lambda err=str(e): self.status_label.config(text=f"Detection error: {err}"))
+    
     def display_frames(self):
         """Thread dedicated to displaying frames"""
-        last_objects = []
-        
         while self.analyzing:
             try:
                 # Get the next frame to display
-                frame = self.frame_queue.get(timeout=0.1)
+                ref, frame_index, motion_regions, captured = self.frame_queue.get(timeout=0.1)
                 
                 # Get current analysis type
                 analysis_type = self.analysis_type.get()
                 
-                # Draw detected objects on the frame if applicable
+                overlay_start = time.perf_counter()
+                
+                # Annotations are drawn as an overlay at display time, not into the frame
+                overlays = [(x, y, w, h, (0, 255, 0), None) for x, y, w, h in motion_regions or []]
+                
+                # Add tracked objects if applicable
                 if analysis_type in ["Object Recognition", "Both"]:
-                    # Use the latest detection results
-                    for obj in self.detected_objects:
-                        x, y, width, height = obj['box']
-                        cv2.rectangle(frame, (x, y), (x + width, y + height), (0, 0, 255), 2)
-                        label = f"{obj['class']}: {int(obj['confidence'] * 100)}%"
-                        cv2.putText(frame, label, (x, y - 10),
-                                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
+                    # Track boxes predicted for this frame
+                    for obj in self.tracker.predict(frame_index):
+                        label = f"{obj['class']} #{obj['track_id']}: {int(obj['confidence'] * 100)}%"
+                        overlays.append(obj['box'] + ((0, 0, 255), label))
+                self.metrics.observe("overlay", time.perf_counter() - overlay_start)
                 
-                # Display the frame
-                self.root.after(0, lambda f=frame: self.display_frame(f))
+                # Optional metrics HUD in the corner of the frame
+                text_lines = self.metrics.hud_lines() if self.show_hud.get() else None
+                
+                # Hand the frame to the Tk thread; the slot is released once Tk has drawn it
+                self.schedule_display((ref, overlays, text_lines, captured))
             except queue.Empty:
                 # No frame available to display, wait a bit
                 time.sleep(0.01)
             except Exception as e:
                 print(f"Display error: {e}")
     
+    def schedule_display(self, item):
+        """Make item the next frame for the Tk thread to draw, replacing one it has not drawn yet.
+
+        At most one callback is queued at a time, so when Tk falls behind,
+        frames are skipped rather than drawn late one after another.
+        """
+        with self.display_lock:
+            replaced, self.pending_display = self.pending_display, item
+            schedule = not self.display_scheduled
+            self.display_scheduled = True
+        if replaced is not None:
+            replaced[0].release()
+            self.metrics.increment("display_coalesced")
+        if schedule:
+            self.root.after(0, self.show_pending_frame)
+    
+    def show_pending_frame(self):
+        """Draw the newest frame handed over by schedule_display (on the Tk thread)"""
+        with self.display_lock:
+            pending, self.pending_display = self.pending_display, None
+            self.display_scheduled = False
+        if pending is not None:
+            self.show_frame(*pending)
+    
+    def show_frame(self, ref, overlays, text_lines=None, captured=None):
+        """Draw a frame slot with its overlays (on the Tk thread), then release the slot.
+
+        captured is the perf_counter() time the frame arrived, from which its
+        motion-to-screen latency is measured.
+        """
+        try:
+            with self.metrics.time("render"):
+                self.display_frame(ref.frame, overlays, text_lines)
+            self.metrics.tick("display")
+            if captured is not None:
+                self.metrics.observe("motion_to_screen", time.perf_counter() - captured)
+        finally:
+            ref.release()
+    
     def update_objects_list(self):
         self.objects_listbox.delete(0, tk.END)
-        for obj in self.detected_objects:
-            confidence = int(obj['confidence'] * 100)
-            self.objects_listbox.insert(tk.END, f"{obj['class']}: {confidence}%")
+        
+        # Currently tracked objects with how long they have been in view
+        for track in sorted(self.tracker.tracks, key=lambda t: t.track_id):
+            if track.misses == 0:
+                confidence = int(track.confidence * 100)
+                self.objects_listbox.insert(
+                    tk.END, f"{track.class_name} #{track.track_id}: {confidence}% ({track.dwell_time:.1f}s)")
+        
+        # Objects seen so far, counted by track
+        counts = self.tracker.summary()['counts']
+        if counts:
+            self.objects_listbox.insert(tk.END, "")
+            for class_name, count in sorted(counts.items()):
+                self.objects_listbox.insert(tk.END, f"{class_name}: {count} seen")
             
     def on_closing(self):
         """Clean up resources when the application is closed"""
         self.analyzing = False
+        if self.metrics_dumper:
+            self.metrics_dumper.stop()
+        if self.metrics_server:
+            self.metrics_server.stop()
+        if isinstance(self.object_detector, DetectionPool):
+            self.object_detector.close()
+        if self.result_cache is not None:
+            self.result_cache.close()
+        if self.activity_index is not None:
+            self.activity_index.flush()
+        # Give the clips still being encoded a few seconds in all
+        if self.clip_recorder is not None:
+            self.finish_clip_recorder()
+        deadline = time.time() + 5.0
+        for recorder in self.finishing_clip_recorders:
+            recorder.join(max(deadline - time.time(), 0))
         if self.vid:
             self.vid.release()
         self.root.destroy()
 
 if __name__ == "__main__":
+    # Headless batch mode: python main.py analyze input.mp4 --mode both --out results.jsonl
+    if len(sys.argv) > 1 and sys.argv[1] == "analyze":
+        from headless import main as headless_main
+        sys.exit(headless_main(sys.argv[2:]))
+
     root = tk.Tk()
     app = VideoAnalysisApp(root)
     root.protocol("WM_DELETE_WINDOW", app.on_closing)
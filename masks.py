@@ -0,0 +1,96 @@
+# masks.py
+import json
+import os
+import cv2
+import numpy as np
+
+def default_mask_dir():
+    """Directory of the masks drawn in the UI, overridable with VIDEO_ANALYSIS_MASK_DIR"""
+    return os.environ.get("VIDEO_ANALYSIS_MASK_DIR",
+                          os.path.join(os.path.expanduser("~"), ".cache", "video-analysis-tool", "masks"))
+
+def mask_path(directory, source_key):
+    """Mask file of a source: a file's content hash (see result_cache.video_key) or e.g. "camera0" """
+    return os.path.join(directory, f"{source_key}.json")
+
+class FrameMask:
+    """Polygons limiting analysis to a region of interest, minus excluded areas.
+
+    include polygons are the areas to analyze (the whole frame when there
+    are none), and exclude polygons are cut out of them, e.g. trees, a road
+    or a burnt-in timestamp. Points are (x, y) in source pixels. For each
+    frame size, the polygons are rasterized once into a bitmask cropped to
+    their bounding rectangle. apply() then hands out only that rectangle,
+    with excluded pixels black, so the rest of the frame costs nothing
+    downstream and never shows motion. Masks are not modified once made:
+    with_polygon() returns a new one, so a mask can be swapped while other
+    threads use the old one.
+    """
+    def __init__(self, include=(), exclude=()):
+        self.include = [[(int(x), int(y)) for x, y in polygon] for polygon in include]
+        self.exclude = [[(int(x), int(y)) for x, y in polygon] for polygon in exclude]
+        self._prepared = None  # (frame shape, rect, cropped bitmask or None if all set), set at once
+
+    def __bool__(self):
+        return bool(self.include or self.exclude)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data.get("include", []), data.get("exclude", []))
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.key(), f)
+
+    def key(self):
+        """The polygons as plain lists, for saving and for cache configurations"""
+        return {"include": [[list(point) for point in polygon] for polygon in self.include],
+                "exclude": [[list(point) for point in polygon] for polygon in self.exclude]}
+
+    def with_polygon(self, polygon, exclude=False):
+        """A copy of the mask with one more polygon to include or exclude"""
+        if exclude:
+            return FrameMask(self.include, self.exclude + [polygon])
+        return FrameMask(self.include + [polygon], self.exclude)
+
+    def prepare(self, frame_shape):
+        """The (x, y, w, h) bounding rectangle of the analyzed area in frames of this shape, and its
+        bitmask cropped to it (None when the whole rectangle is analyzed); computed once per shape"""
+        shape = tuple(frame_shape[:2])
+        prepared = self._prepared
+        if prepared is None or prepared[0] != shape:
+            mask = np.zeros(shape, dtype=np.uint8)
+            if self.include:
+                cv2.fillPoly(mask, [np.array(polygon, dtype=np.int32) for polygon in self.include], 255)
+            else:
+                mask[:] = 255
+            if self.exclude:
+                cv2.fillPoly(mask, [np.array(polygon, dtype=np.int32) for polygon in self.exclude], 0)
+            points = cv2.findNonZero(mask)
+            x, y, w, h = cv2.boundingRect(points) if points is not None else (0, 0, 0, 0)
+            bitmask = mask[y:y + h, x:x + w].copy()
+            prepared = self._prepared = (shape, (x, y, w, h), None if bitmask.all() else bitmask)
+        return prepared[1], prepared[2]
+
+    def apply(self, frame, out=None):
+        """The analyzed part of a frame and its (x, y) offset in the frame.
+
+        A plain rectangle is returned as a view of the frame. Otherwise the
+        result is a copy with the excluded pixels black; out, a copy returned
+        earlier by this same mask, is reused when the size matches. Returns
+        None for the image when nothing of the frame is analyzed.
+        """
+        (x, y, w, h), bitmask = self.prepare(frame.shape)
+        if w == 0 or h == 0:
+            return None, (x, y)
+        crop = frame[y:y + h, x:x + w]
+        if bitmask is None:
+            return crop, (x, y)
+        if out is None or out.shape != crop.shape or out.dtype != crop.dtype:
+            out = np.zeros_like(crop)
+        # Only pixels under the mask are written, so excluded ones stay black from the first use on
+        cv2.bitwise_and(crop, crop, dst=out, mask=bitmask)
+        return out, (x, y)
@@ -0,0 +1,223 @@
+# metrics.py
+import bisect
+import csv
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram"""
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last bucket is +Inf
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of observations"""
+        if self.count == 0:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+class RateMeter:
+    """Events per second, recomputed about once a second"""
+    def __init__(self, window=1.0):
+        self.window = window
+        self.window_start = time.perf_counter()
+        self.events = 0
+        self.rate = 0.0
+
+    def tick(self):
+        self.events += 1
+        now = time.perf_counter()
+        elapsed = now - self.window_start
+        if elapsed >= self.window:
+            self.rate = self.events / elapsed
+            self.window_start = now
+            self.events = 0
+
+class Metrics:
+    """Per-stage latency histograms, per-thread frame rates and drop counters"""
+    def __init__(self):
+        self.histograms = {}
+        self.rates = {}
+        self.counters = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = LatencyHistogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def time(self, stage):
+        """Time the body of a with-block as one observation of a stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def tick(self, thread_name):
+        """Count one frame handled by a thread, for its effective FPS"""
+        with self._lock:
+            meter = self.rates.get(thread_name)
+            if meter is None:
+                meter = self.rates[thread_name] = RateMeter()
+            meter.tick()
+
+    def increment(self, counter, amount=1):
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def snapshot(self):
+        """Current metrics as a plain dict"""
+        with self._lock:
+            return {
+                "timestamp": time.time(),
+                "uptime": time.time() - self.started,
+                "stages": {
+                    stage: {
+                        "count": h.count,
+                        "mean_ms": 1000.0 * h.total / h.count if h.count else 0.0,
+                        "p50_ms": 1000.0 * h.percentile(0.5),
+                        "p95_ms": 1000.0 * h.percentile(0.95),
+                    }
+                    for stage, h in self.histograms.items()
+                },
+                "fps": {name: meter.rate for name, meter in self.rates.items()},
+                "counters": dict(self.counters),
+            }
+
+    def hud_lines(self):
+        """Short text lines for an on-frame display"""
+        snapshot = self.snapshot()
+        lines = [" ".join(f"{name} {rate:.0f}fps" for name, rate in sorted(snapshot["fps"].items()))]
+        for stage, stats in sorted(snapshot["stages"].items()):
+            lines.append(f"{stage}: {stats['mean_ms']:.1f}ms (p95 {stats['p95_ms']:.1f})")
+        if snapshot["counters"]:
+            lines.append(" ".join(f"{name} {value}" for name, value in sorted(snapshot["counters"].items())))
+        return lines
+
+    def to_prometheus(self, prefix="video_analysis"):
+        """Metrics in the Prometheus text exposition format"""
+        with self._lock:
+            lines = [f"# TYPE {prefix}_stage_latency_seconds histogram"]
+            for stage, h in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(h.buckets + (float("inf"),), h.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{prefix}_stage_latency_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'{prefix}_stage_latency_seconds_sum{{stage="{stage}"}} {h.total}')
+                lines.append(f'{prefix}_stage_latency_seconds_count{{stage="{stage}"}} {h.count}')
+
+            lines.append(f"# TYPE {prefix}_fps gauge")
+            for name, meter in sorted(self.rates.items()):
+                lines.append(f'{prefix}_fps{{thread="{name}"}} {meter.rate}')
+
+            lines.append(f"# TYPE {prefix}_events_total counter")
+            for name, value in sorted(self.counters.items()):
+                lines.append(f'{prefix}_events_total{{event="{name}"}} {value}')
+            return "\n".join(lines) + "\n"
+
+class MetricsDumper:
+    """Appends a metrics snapshot to a file every few seconds.
+
+    Files ending in .csv get long-format rows (timestamp, kind, name, stat,
+    value); anything else gets one JSON object per line.
+    """
+    def __init__(self, metrics, path, interval=10.0):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the thread and write a final snapshot"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.dump()
+        self.dump()
+
+    def dump(self):
+        snapshot = self.metrics.snapshot()
+        if self.path.endswith(".csv"):
+            new_file = not os.path.exists(self.path)
+            with open(self.path, "a", newline="") as f:
+                writer = csv.writer(f)
+                if new_file:
+                    writer.writerow(["timestamp", "kind", "name", "stat", "value"])
+                timestamp = round(snapshot["timestamp"], 3)
+                for stage, stats in snapshot["stages"].items():
+                    for stat, value in stats.items():
+                        writer.writerow([timestamp, "stage", stage, stat, value])
+                for name, rate in snapshot["fps"].items():
+                    writer.writerow([timestamp, "fps", name, "rate", rate])
+                for name, value in snapshot["counters"].items():
+                    writer.writerow([timestamp, "counter", name, "total", value])
+        else:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(snapshot) + "\n")
+
+class MetricsServer:
+    """Serves metrics in Prometheus text format on a local port"""
+    def __init__(self, metrics, port, host="127.0.0.1"):
+        registry = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Keep scrapes out of the console
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
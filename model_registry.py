@@ -0,0 +1,212 @@
+# model_registry.py
+import hashlib
+import os
+import shutil
+import sys
+import tarfile
+import threading
+import time
+import urllib.request
+
+DEFAULT_MODEL_ID = "ssd_mobilenet_v2"
+
+# Known models by ID. "archive_sha256" pins the SHA-256 of the compressed
+# SavedModel archive TF Hub serves for the handle; downloads are checked
+# against it before anything is unpacked. A model without a pin is only
+# downloaded when VIDEO_ANALYSIS_ALLOW_UNPINNED=1 says to trust it as-is.
+MODELS = {
+    "ssd_mobilenet_v2": {
+        "handle": "https://tfhub.dev/tensorflow/ssd_mobilenet_v2/2",
+        "archive_sha256": None,
+    },
+}
+
+LEGACY_CHECKSUM_FILE = "checksum.sha256"  # Checksums used to be kept inside the model directory
+
+def default_cache_dir():
+    """Model cache directory, overridable with VIDEO_ANALYSIS_MODEL_DIR"""
+    return os.environ.get("VIDEO_ANALYSIS_MODEL_DIR",
+                          os.path.join(os.path.expanduser("~"), ".cache", "video-analysis-tool", "models"))
+
+def directory_checksum(path):
+    """SHA-256 over the relative paths and contents of every file in a model directory"""
+    digest = hashlib.sha256()
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if dirpath == path and filename == LEGACY_CHECKSUM_FILE:
+                continue
+            file_path = os.path.join(dirpath, filename)
+            digest.update(os.path.relpath(file_path, path).replace(os.sep, "/").encode())
+            with open(file_path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+    return digest.hexdigest()
+
+def download(url, path):
+    """Download url to path, returning the SHA-256 of what was written"""
+    digest = hashlib.sha256()
+    with urllib.request.urlopen(url, timeout=60) as response, open(path, "wb") as f:
+        for chunk in iter(lambda: response.read(1 << 20), b""):
+            digest.update(chunk)
+            f.write(chunk)
+    return digest.hexdigest()
+
+def extract_archive(archive_path, path):
+    """Unpack a .tar.gz into path, refusing links and members that would land outside it"""
+    root = os.path.realpath(path)
+    with tarfile.open(archive_path, "r:gz") as archive:
+        members = archive.getmembers()
+        for member in members:
+            target = os.path.realpath(os.path.join(root, member.name))
+            if not (member.isfile() or member.isdir()) or os.path.commonpath([root, target]) != root:
+                raise ValueError(f"Unsafe entry in model archive: {member.name}")
+        archive.extractall(root, members)
+
+class ModelRegistry:
+    """Resolves models to verified local SavedModel directories"""
+    def __init__(self, cache_dir=None, allow_download=None, allow_unpinned=None):
+        self.cache_dir = cache_dir or default_cache_dir()
+
+        # Air-gapped boxes set VIDEO_ANALYSIS_OFFLINE=1 to never touch the network
+        if allow_download is None:
+            allow_download = os.environ.get("VIDEO_ANALYSIS_OFFLINE", "") not in ("1", "true", "yes")
+        self.allow_download = allow_download
+
+        # Downloading a model without a pinned archive checksum has to be asked for
+        if allow_unpinned is None:
+            allow_unpinned = os.environ.get("VIDEO_ANALYSIS_ALLOW_UNPINNED", "") in ("1", "true", "yes")
+        self.allow_unpinned = allow_unpinned
+
+    def model_dir(self, model_id):
+        return os.path.join(self.cache_dir, model_id)
+
+    def resolve(self, model_id=DEFAULT_MODEL_ID):
+        """Return the local directory for a model ID or path, fetching it into the cache if allowed"""
+        # A path to a SavedModel directory is used as-is
+        if os.path.isdir(model_id):
+            self.verify(model_id, self.path_checksum_path(model_id))
+            return model_id
+
+        if model_id not in MODELS:
+            raise KeyError(f"Unknown model: {model_id}")
+
+        path = self.model_dir(model_id)
+        if not os.path.exists(os.path.join(path, "saved_model.pb")):
+            if not self.allow_download:
+                raise FileNotFoundError(f"Model {model_id} is not cached in {path} and downloads are disabled")
+            self.fetch(model_id)
+
+        self.verify(path, self.checksum_path(model_id))
+        return path
+
+    def checksum_path(self, model_id):
+        """Where the checksum of a cached model directory is recorded, outside the directory itself"""
+        return os.path.join(self.cache_dir, f"{model_id}.sha256")
+
+    def path_checksum_path(self, path):
+        """Where the checksum of a model directory given by path is recorded, keyed by its real path"""
+        key = hashlib.sha256(os.path.realpath(path).encode()).hexdigest()[:16]
+        return os.path.join(self.cache_dir, "paths", f"{key}.sha256")
+
+    def fetch(self, model_id):
+        """Download a model's archive from TF Hub, check it against its pinned checksum and unpack it"""
+        model = MODELS[model_id]
+        expected = model["archive_sha256"]
+        if expected is None and not self.allow_unpinned:
+            raise ValueError(f"Model {model_id} has no pinned archive checksum, so its download cannot be "
+                             f"verified; set VIDEO_ANALYSIS_ALLOW_UNPINNED=1 to download it anyway")
+        path = self.model_dir(model_id)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # Unpack to a temporary directory first so an interrupted fetch never looks cached
+        tmp_path = path + ".partial"
+        archive_path = tmp_path + ".tar.gz"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        try:
+            actual = download(model["handle"] + "?tf-hub-format=compressed", archive_path)
+            if expected is None:
+                print(f"Warning: no pinned checksum for model {model_id}, its download (SHA-256 {actual}) "
+                      f"is trusted as asked", file=sys.stderr)
+            elif actual != expected:
+                raise ValueError(f"Checksum mismatch for the {model_id} download: expected {expected}, got {actual}")
+            extract_archive(archive_path, tmp_path)
+        finally:
+            if os.path.exists(archive_path):
+                os.remove(archive_path)
+
+        # The directory checksum is recorded afresh from the verified download on first use
+        if os.path.exists(self.checksum_path(model_id)):
+            os.remove(self.checksum_path(model_id))
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+
+    def verify(self, path, checksum_path):
+        """Check a model directory against the checksum recorded at checksum_path on first use.
+
+        Catches models that were changed or damaged after they were fetched
+        or first used. Checksums are kept in the cache directory, never in the
+        model directory itself.
+        """
+        expected = None
+        if os.path.exists(checksum_path):
+            with open(checksum_path) as f:
+                expected = f.read().strip()
+
+        actual = directory_checksum(path)
+        if expected is None:
+            # First use of this directory: record the checksum for later launches
+            try:
+                os.makedirs(os.path.dirname(checksum_path), exist_ok=True)
+                with open(checksum_path, "w") as f:
+                    f.write(actual + "\n")
+            except OSError:
+                pass
+        elif actual != expected:
+            raise ValueError(f"Checksum mismatch for model in {path}: expected {expected}, got {actual}")
+
+class ModelLoader:
+    """Creates an object detector on a background thread"""
+    def __init__(self, factory, on_done=None):
+        self.factory = factory
+        self.on_done = on_done  # Called from the loader thread with the loader when loading finishes
+        self.detector = None
+        self.error = None
+        self.load_seconds = None
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Start loading, or start over if the last attempt failed (e.g. while offline)"""
+        with self._lock:
+            if self._thread is None or (self._done.is_set() and self.error is not None):
+                self.error = None
+                self.load_seconds = None
+                self._done.clear()
+                self._thread = threading.Thread(target=self._load, daemon=True)
+                self._thread.start()
+        return self
+
+    def _load(self):
+        start_time = time.perf_counter()
+        try:
+            self.detector = self.factory()
+        except Exception as e:
+            self.error = e
+        self.load_seconds = time.perf_counter() - start_time
+        self._done.set()
+        if self.on_done is not None:
+            self.on_done(self)
+
+    def done(self):
+        return self._done.is_set()
+
+    def get(self, timeout=None):
+        """Wait for the detector, raising the loading error if there was one (a failed load is retried)"""
+        self.start()
+        if not self._done.wait(timeout):
+            raise TimeoutError("Model is still loading")
+        if self.error is not None:
+            raise self.error
+        return self.detector
@@ -1,38 +1,228 @@
 # motion_detector.py
+import time
 import cv2
 import numpy as np
 
+# Color modes for background modelling
+COLOR = "color"
+GRAY = "gray"
+
 class MotionDetector:
-    def __init__(self, sensitivity=20):
-        self.background_subtractor = cv2.createBackgroundSubtractorMOG2(history=100, varThreshold=50)
+    """MOG2 background subtraction, optionally on a downscaled or grayscale copy of each frame.
+
+    process_scale shrinks frames before modelling (0.25 works at a quarter of the
+    resolution) and regions are mapped back to source coordinates; min_contour_area
+    is always in source pixels. morph_kernel > 0 applies a morphological opening of
+    that size to the foreground mask to remove speckle.
+
+    With static_threshold > 0, quiet scenes take a fast path: each frame is shrunk
+    to a small gray thumbnail and compared with the one from the last full pass,
+    and if no thumbnail cell changed by more than static_threshold gray levels on
+    average, "no motion" is reported without running MOG2. Every refresh_interval
+    consecutive static frames still take the full pass so the background model
+    keeps up with slow changes such as lighting.
+
+    With a FrameMask set (see set_mask), only the masked area of each frame is
+    modelled, ahead of every other step; regions are still in frame coordinates.
+    """
+    def __init__(self, sensitivity=20, process_scale=1.0, color_mode=COLOR, morph_kernel=0,
+                 static_threshold=0, refresh_interval=10, thumbnail_size=(64, 36)):
+        if color_mode not in (COLOR, GRAY):
+            raise ValueError(f"Unknown color mode: {color_mode}")
+        if not 0 < process_scale <= 1.0:
+            raise ValueError(f"Processing scale must be in (0, 1]: {process_scale}")
+        # The variance threshold sums over channels, so one gray channel needs about a third of it.
+        # Shadow detection compares chromaticity, so in gray it would mark anything darker as shadow.
+        color = color_mode == COLOR
+        self.background_subtractor = cv2.createBackgroundSubtractorMOG2(history=100, varThreshold=50 if color else 16,
+                                                                        detectShadows=color)
         self.sensitivity = sensitivity
         self.min_contour_area = 500  # Minimum area to be considered motion
+        self.process_scale = process_scale
+        self.color_mode = color_mode
+        self.kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (morph_kernel, morph_kernel)) if morph_kernel > 0 else None
+        self.metrics = None  # Optional Metrics for per-stage timing
+        self.mask = None  # Optional FrameMask of the area to analyze
+        
+        # Static-scene fast path
+        self.static_threshold = static_threshold
+        self.refresh_interval = refresh_interval
+        self.thumbnail_size = thumbnail_size
+        self.static_frames = 0  # Frames answered by the fast path
+        self._reference = None  # Thumbnail from the last full pass
+        self._static_run = 0  # Consecutive fast-path frames since the last full pass
+        self._frames_seen = 0  # All frames, including the fast-path ones
+        self._last_motion = True  # Never take the fast path right after motion
+        
+        # Reused buffers for the masked, downscaled and grayscale frames
+        self._masked = None
+        self._small = None
+        self._gray = None
+    
+    def set_mask(self, mask):
+        """Analyze only the area of a FrameMask from the next frame on (None or an empty mask for all)"""
+        self.mask = mask if mask else None
+        self._masked = None
+        # The model and thumbnail change size with the area; MOG2 starts over by itself
+        self._reference = None
+        self._last_motion = True
     
-    def detect(self, frame):
+    def thumbnail(self, frame):
+        """Small gray copy of a frame, each pixel the mean of one block of the frame"""
+        thumb = cv2.resize(frame, self.thumbnail_size, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY) if thumb.ndim == 3 else thumb
+    
+    def is_static(self, thumb):
+        """True if no block differs from the reference thumbnail by more than the threshold"""
+        if self._reference is None or self._last_motion:
+            return False
+        if self._frames_seen <= self.background_subtractor.getHistory():
+            return False  # Let the background model settle first
+        if self._static_run + 1 >= self.refresh_interval:
+            return False  # Time to refresh the background model
+        return cv2.absdiff(thumb, self._reference).max() <= self.static_threshold
+    
+    def preprocess(self, frame):
+        """Downscale and convert a frame as configured, reusing buffers between frames"""
+        if self.process_scale != 1.0:
+            h, w = frame.shape[:2]
+            shape = (max(round(h * self.process_scale), 1), max(round(w * self.process_scale), 1)) + frame.shape[2:]
+            if self._small is None or self._small.shape != shape:
+                self._small = np.empty(shape, dtype=frame.dtype)
+            frame = cv2.resize(frame, (shape[1], shape[0]), dst=self._small, interpolation=cv2.INTER_AREA)
+        
+        if self.color_mode == GRAY and frame.ndim == 3:
+            if self._gray is None or self._gray.shape != frame.shape[:2]:
+                self._gray = np.empty(frame.shape[:2], dtype=frame.dtype)
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self._gray)
+        
+        return frame
+    
+    def detect(self, frame, draw=False):
+        """Return (motion_detected, frame_with_motion, motion_regions).
+
+        The frame is only copied and annotated when draw is True; otherwise
+        frame_with_motion is None.
+        """
+        start_time = time.perf_counter()
+        self._frames_seen += 1
+        learning_rate = -1  # MOG2's automatic rate
+        
+        # Everything below only sees the masked area; regions are offset back into the frame
+        source = frame
+        offset_x = offset_y = 0
+        if self.mask is not None:
+            frame, (offset_x, offset_y) = self.mask.apply(source, self._masked)
+            if frame is None:
+                return False, source.copy() if draw else None, []
+            if frame.base is None:
+                self._masked = frame  # A copy, not a view of the source: reused for the next frame
+            if self.metrics is not None:
+                self.metrics.observe("mask", time.perf_counter() - start_time)
+            start_time = time.perf_counter()
+        
+        # Quiet scene: skip background subtraction entirely
+        if self.static_threshold > 0:
+            thumb = self.thumbnail(frame)
+            static = self.is_static(thumb)
+            if self.metrics is not None:
+                self.metrics.observe("static_check", time.perf_counter() - start_time)
+            if static:
+                self._static_run += 1
+                self.static_frames += 1
+                if self.metrics is not None:
+                    self.metrics.increment("static_frames")
+                return False, source.copy() if draw else None, []
+            # MOG2's automatic rate assumes it saw every frame; weight this one for the frames
+            # skipped since the last full pass, which were (nearly) identical to it
+            history = self.background_subtractor.getHistory()
+            learning_rate = min((self._static_run + 1) / min(2 * self._frames_seen, history), 1.0)
+            self._reference = thumb
+            self._static_run = 0
+            start_time = time.perf_counter()
+        
+        # Model a smaller, single-channel frame when configured to
+        small = self.preprocess(frame)
+        
         # Apply background subtraction
-        fg_mask = self.background_subtractor.apply(frame)
+        fg_mask = self.background_subtractor.apply(small, learningRate=learning_rate)
+        
+        if self.metrics is not None:
+            mog2_done = time.perf_counter()
+            self.metrics.observe("mog2", mog2_done - start_time)
         
         # Apply threshold to remove shadows
         _, thresh = cv2.threshold(fg_mask, 200, 255, cv2.THRESH_BINARY)
         
+        # Remove isolated noise pixels
+        if self.kernel is not None:
+            thresh = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, self.kernel)
+        
         # Find contours in the thresholded image
         contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         
-        # Create a copy of the frame to draw on
-        frame_with_motion = frame.copy()
+        # Create a copy of the frame to draw on if requested
+        frame_with_motion = source.copy() if draw else None
         
         motion_detected = False
         motion_regions = []
         
+        # Contour areas shrink with the square of the processing scale
+        frame_h, frame_w = frame.shape[:2]
+        scale_x, scale_y = small.shape[1] / frame_w, small.shape[0] / frame_h
+        min_area = self.min_contour_area * scale_x * scale_y
+        
         # Process each contour
         for contour in contours:
             area = cv2.contourArea(contour)
             
             # Filter small contours
-            if area > self.min_contour_area:
+            if area > min_area:
                 motion_detected = True
                 x, y, w, h = cv2.boundingRect(contour)
+                if small is not frame:
+                    # Map the box back to source coordinates, rounding outwards
+                    x1, y1 = int(x / scale_x), int(y / scale_y)
+                    x2 = min(int(np.ceil((x + w) / scale_x)), frame_w)
+                    y2 = min(int(np.ceil((y + h) / scale_y)), frame_h)
+                    x, y, w, h = x1, y1, x2 - x1, y2 - y1
+                x, y = x + offset_x, y + offset_y
                 motion_regions.append((x, y, w, h))
-                cv2.rectangle(frame_with_motion, (x, y), (x + w, y + h), (0, 255, 0), 2)
+                if draw:
+                    cv2.rectangle(frame_with_motion, (x, y), (x + w, y + h), (0, 255, 0), 2)
         
-        return motion_detected, frame_with_motion, motion_regions
\ No newline at end of file
+        if self.metrics is not None:
+            self.metrics.observe("contours", time.perf_counter() - mog2_done)
+        
+        self._last_motion = motion_detected
+        return motion_detected, frame_with_motion, motion_regions
+
+def merge_regions(regions, padding, frame_shape):
+    """Pad motion regions and merge any that overlap into single rectangles.
+
+    Returns (x, y, w, h) rectangles clipped to the frame, none of which overlap.
+    """
+    frame_h, frame_w = frame_shape[:2]
+    
+    # Pad each region and clip it to the frame, as (x1, y1, x2, y2)
+    rects = [[max(x - padding, 0), max(y - padding, 0),
+              min(x + w + padding, frame_w), min(y + h + padding, frame_h)]
+             for x, y, w, h in regions]
+    
+    # Keep merging until no two rectangles overlap
+    merged = True
+    while merged:
+        merged = False
+        result = []
+        for rect in rects:
+            for other in result:
+                if rect[0] < other[2] and other[0] < rect[2] and rect[1] < other[3] and other[1] < rect[3]:
+                    other[0], other[1] = min(other[0], rect[0]), min(other[1], rect[1])
+                    other[2], other[3] = max(other[2], rect[2]), max(other[3], rect[3])
+                    merged = True
+                    break
+            else:
+                result.append(rect)
+        rects = result
+    
+    return [(x1, y1, x2 - x1, y2 - y1) for x1, y1, x2, y2 in rects]
\ No newline at end of file
@@ -0,0 +1,234 @@
+# multi_stream.py
+import queue
+import sys
+import threading
+import time
+from object_detector import Detections, crop_regions, merge_tiles
+
+class DetectionService:
+    """One object detector shared by many streams.
+
+    Each stream has a single-slot request queue. The service thread takes at
+    most one request per stream per batch, visiting the streams round-robin
+    from where the previous batch stopped, so a busy stream cannot starve the
+    others, and runs every image of the batch through one detect_batch() call.
+    """
+    def __init__(self, detector, batch_size=8, metrics=None):
+        self.detector = detector
+        self.batch_size = batch_size  # Images per forward pass, across all streams
+        self.metrics = metrics
+        self.batches = 0
+        self.images = 0
+        self._queues = {}  # Stream ID -> Queue of (images, done event, result holder)
+        self._order = []  # Stream IDs in round-robin order
+        self._next = 0
+        self._wakeup = threading.Event()
+        self._running = False
+        self._thread = None
+
+    def register(self, stream_id):
+        self._queues[stream_id] = queue.Queue(maxsize=1)
+        self._order.append(stream_id)
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def detect(self, stream_id, images):
+        """Detect objects in a stream's images, waiting for the batch they end up in"""
+        if not images:
+            return []
+        request = (images, threading.Event(), {})
+        self._queues[stream_id].put(request)
+        self._wakeup.set()
+        request[1].wait()
+        if "error" in request[2]:
+            raise request[2]["error"]
+        return request[2]["detections"]
+
+    def next_batch(self):
+        """Take up to one request per stream, round-robin, until the batch is full"""
+        batch = []
+        images = 0
+        count = len(self._order)
+        for i in range(count):
+            position = (self._next + i) % count
+            try:
+                request = self._queues[self._order[position]].get_nowait()
+            except queue.Empty:
+                continue
+            batch.append(request)
+            images += len(request[0])
+            if images >= self.batch_size:
+                # The next batch starts with the streams this one did not reach
+                self._next = (position + 1) % count
+                break
+        return batch
+
+    def _run(self):
+        while self._running:
+            batch = self.next_batch()
+            if not batch:
+                self._wakeup.wait(0.1)
+                self._wakeup.clear()
+                continue
+
+            images = [image for request in batch for image in request[0]]
+            try:
+                start_time = time.perf_counter()
+                results = self.detector.detect_batch(images)
+                if self.metrics is not None:
+                    self.metrics.observe("inference", time.perf_counter() - start_time)
+                    for _ in images:
+                        self.metrics.tick("detection")
+            except Exception as e:
+                for _, done, holder in batch:
+                    holder["error"] = e
+                    done.set()
+                continue
+
+            self.batches += 1
+            self.images += len(images)
+            offset = 0
+            for request_images, done, holder in batch:
+                holder["detections"] = results[offset:offset + len(request_images)]
+                offset += len(request_images)
+                done.set()
+
+class ServiceClient:
+    """A stream's view of the shared service, with the detect methods of an ObjectDetector"""
+    def __init__(self, service, stream_id):
+        self.service = service
+        self.stream_id = stream_id
+        service.register(stream_id)
+
+    def detect_batch(self, frames):
+        return self.service.detect(self.stream_id, frames)
+
+    def detect_regions(self, frame, regions, max_size=480, merge_overlap=None):
+        crops, transforms = crop_regions(frame, regions, max_size)
+        detections_list = [
+            detections.scaled(scale, offset_x, offset_y)
+            for detections, (offset_x, offset_y, scale) in zip(self.detect_batch(crops), transforms)
+        ]
+        if merge_overlap is not None:
+            return merge_tiles(detections_list, merge_overlap)
+        return Detections.concatenate(detections_list)
+
+class SharedOutput:
+    """Line-oriented output shared by several stream threads"""
+    def __init__(self, out):
+        self.out = out
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        with self._lock:
+            self.out.write(text)
+
+class StreamGrid:
+    """Prints a table of per-stream progress to a terminal every few seconds"""
+    def __init__(self, streams, interval=2.0, out=sys.stderr):
+        self.streams = streams  # (source, HeadlessAnalyzer) pairs
+        self.interval = interval
+        self.out = out
+        self._lines = 0
+        self._last = {}  # Stream ID -> (frames, time) at the previous render
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.render()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.render()
+
+    def render(self):
+        rows = [f"{'stream':<7}{'source':<28}{'frames':>8}{'fps':>8}  {'motion':<7}{'objects':>8}{'tracks':>7}"]
+        now = time.perf_counter()
+        for stream_id, (source, analyzer) in enumerate(self.streams):
+            record = analyzer.last_record or {}
+            frames = analyzer.records_written
+            # Rate since the previous render
+            previous_frames, previous_time = self._last.get(stream_id, (frames, now))
+            fps = (frames - previous_frames) / (now - previous_time) if now > previous_time else 0.0
+            self._last[stream_id] = (frames, now)
+            motion = {True: "yes", False: "no"}.get(record.get("motion"), "-")
+            rows.append(f"{stream_id:<7}{source[-27:]:<28}{frames:>8}{fps:>8.1f}  {motion:<7}"
+                        f"{len(record.get('objects', [])):>8}{len(record.get('tracks', [])):>7}")
+
+        # Redraw in place on a terminal, otherwise append
+        if self._lines and self.out.isatty():
+            self.out.write(f"\x1b[{self._lines}F")
+        self.out.write("\n".join(rows) + "\n")
+        self.out.flush()
+        self._lines = len(rows)
+
+def run_streams(sources, make_analyzer, service, out, grid_interval=2.0):
+    """Analyze several sources concurrently, one thread per source.
+
+    make_analyzer(stream_id) returns the HeadlessAnalyzer for one stream. Every
+    stream's records go to out, in frame order within each stream. Returns the
+    per-stream summaries, or raises the first stream's error. The stream
+    analyzers are closed and the service stopped before returning.
+    """
+    shared_out = SharedOutput(out)
+    streams = []
+    summaries = [None] * len(sources)
+    errors = []
+    threads = []
+    grid = None
+
+    def run(stream_id, source, analyzer):
+        try:
+            summaries[stream_id] = analyzer.analyze(source, shared_out)
+        except Exception as e:
+            errors.append(e)
+
+    try:
+        for stream_id, source in enumerate(sources):
+            streams.append((source, make_analyzer(stream_id)))
+        threads = [threading.Thread(target=run, args=(stream_id, source, analyzer), daemon=True)
+                   for stream_id, (source, analyzer) in enumerate(streams)]
+        if service is not None:
+            service.start()
+        grid = StreamGrid(streams, grid_interval).start() if grid_interval else None
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(0.5)
+    except KeyboardInterrupt:
+        # Camera streams run until interrupted
+        for _, analyzer in streams:
+            analyzer.running = False
+        for thread in threads:
+            thread.join()
+    finally:
+        if grid is not None:
+            grid.stop()
+        if service is not None:
+            service.stop()
+        # Commits each stream's cache writes
+        for _, analyzer in streams:
+            analyzer.close()
+
+    if errors:
+        raise errors[0]
+    return summaries
@@ -1,84 +1,349 @@
 # object_detector.py
+import time
 import cv2
 import numpy as np
-import tensorflow as tf
-import tensorflow_hub as hub
+from backends import DEFAULT_BACKEND, load_backend
+from model_registry import DEFAULT_MODEL_ID, ModelRegistry
+
+# COCO class labels
+COCO_LABELS = {
+    1: 'person', 2: 'bicycle', 3: 'car', 4: 'motorcycle', 5: 'airplane',
+    6: 'bus', 7: 'train', 8: 'truck', 9: 'boat', 10: 'traffic light',
+    11: 'fire hydrant', 13: 'stop sign', 14: 'parking meter', 15: 'bench',
+    16: 'bird', 17: 'cat', 18: 'dog', 19: 'horse', 20: 'sheep',
+    21: 'cow', 22: 'elephant', 23: 'bear', 24: 'zebra', 25: 'giraffe',
+    27: 'backpack', 28: 'umbrella', 31: 'handbag', 32: 'tie', 33: 'suitcase',
+    34: 'frisbee', 35: 'skis', 36: 'snowboard', 37: 'sports ball', 38: 'kite',
+    39: 'baseball bat', 40: 'baseball glove', 41: 'skateboard', 42: 'surfboard',
+    43: 'tennis racket', 44: 'bottle', 46: 'wine glass', 47: 'cup', 48: 'fork',
+    49: 'knife', 50: 'spoon', 51: 'bowl', 52: 'banana', 53: 'apple',
+    54: 'sandwich', 55: 'orange', 56: 'broccoli', 57: 'carrot', 58: 'hot dog',
+    59: 'pizza', 60: 'donut', 61: 'cake', 62: 'chair', 63: 'couch',
+    64: 'potted plant', 65: 'bed', 67: 'dining table', 70: 'toilet', 72: 'tv',
+    73: 'laptop', 74: 'mouse', 75: 'remote', 76: 'keyboard', 77: 'cell phone',
+    78: 'microwave', 79: 'oven', 80: 'toaster', 81: 'sink', 82: 'refrigerator',
+    84: 'book', 85: 'clock', 86: 'vase', 87: 'scissors', 88: 'teddy bear',
+    89: 'hair drier', 90: 'toothbrush'
+}
+
+class Detections:
+    """Array-backed detection results for one frame.
+
+    boxes is an (N, 4) int32 array of (x, y, w, h) rows in pixel coordinates,
+    scores an (N,) float32 array and class_ids an (N,) int32 array of COCO IDs.
+    """
+    __slots__ = ("boxes", "scores", "class_ids")
+    
+    def __init__(self, boxes, scores, class_ids):
+        self.boxes = boxes
+        self.scores = scores
+        self.class_ids = class_ids
+    
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros((0, 4), dtype=np.int32), np.zeros(0, dtype=np.float32),
+                   np.zeros(0, dtype=np.int32))
+    
+    @classmethod
+    def concatenate(cls, detections_list):
+        if not detections_list:
+            return cls.empty()
+        return cls(np.concatenate([d.boxes for d in detections_list]),
+                   np.concatenate([d.scores for d in detections_list]),
+                   np.concatenate([d.class_ids for d in detections_list]))
+    
+    def __len__(self):
+        return len(self.scores)
+    
+    def scaled(self, scale, offset_x=0, offset_y=0):
+        """Boxes divided by scale, then shifted by the offset (e.g. back from a shrunk crop)"""
+        if scale == 1.0 and offset_x == 0 and offset_y == 0:
+            return self
+        boxes = (self.boxes / scale).astype(np.int32)
+        boxes[:, 0] += offset_x
+        boxes[:, 1] += offset_y
+        return Detections(boxes, self.scores, self.class_ids)
+    
+    def labels(self):
+        return [COCO_LABELS.get(class_id, 'unknown') for class_id in self.class_ids.tolist()]
+    
+    def to_list(self):
+        """Detections as a list of {'class', 'confidence', 'box'} dicts"""
+        return [
+            {'class': label, 'confidence': score, 'box': tuple(box)}
+            for label, score, box in zip(self.labels(), self.scores.tolist(), self.boxes.tolist())
+        ]
+
+def draw_detections(frame, detections, color=(0, 0, 255)):
+    """Draw detection boxes and labels onto a frame in place"""
+    for label, score, (x, y, w, h) in zip(detections.labels(), detections.scores.tolist(),
+                                          detections.boxes.tolist()):
+        cv2.rectangle(frame, (x, y), (x + w, y + h), color, 2)
+        cv2.putText(frame, f"{label}: {int(score * 100)}%", (x, y - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+    return frame
+
+def crop_regions(frame, regions, max_size=480):
+    """Crop (x, y, w, h) regions from a frame, shrinking each so its longest side is at most max_size.
+
+    Returns the crops and, for each, the (offset_x, offset_y, scale) that maps
+    its boxes back to frame coordinates with Detections.scaled().
+    """
+    crops = []
+    transforms = []
+    for x, y, w, h in regions:
+        crop = frame[y:y + h, x:x + w]
+        scale = max_size / max(w, h) if max(w, h) > max_size else 1.0
+        if scale != 1.0:
+            crop = cv2.resize(crop, (0, 0), fx=scale, fy=scale)
+        crops.append(crop)
+        transforms.append((x, y, scale))
+    return crops, transforms
+
+def tile_regions(frame_shape, tile_size=480, overlap=0.2, roi=None, full_frame=True):
+    """Cover a region of interest of a frame with overlapping square tiles for detection at full resolution.
+
+    Tiles are tile_size pixels on a side (less where the ROI is smaller),
+    spread evenly so that neighbours overlap by at least overlap of a tile;
+    an object smaller than the overlap always lies whole inside some tile.
+    roi is an (x, y, w, h) rectangle, the whole frame by default. With
+    full_frame, the whole frame is added as a last region (shrunk to tile
+    size by crop_regions) so objects larger than a tile are still found.
+    """
+    frame_h, frame_w = frame_shape[:2]
+    x, y, w, h = roi if roi is not None else (0, 0, frame_w, frame_h)
+    # Clip the ROI to the frame; one entirely outside it covers the whole frame
+    x1, y1, x2, y2 = max(x, 0), max(y, 0), min(x + w, frame_w), min(y + h, frame_h)
+    if x2 <= x1 or y2 <= y1:
+        x1, y1, x2, y2 = 0, 0, frame_w, frame_h
+    x, y, w, h = x1, y1, x2 - x1, y2 - y1
+    
+    def starts(origin, length):
+        size = min(tile_size, length)
+        stride = max(int(size * (1 - overlap)), 1)
+        count = max(-(-(length - size) // stride) + 1, 1)
+        return size, np.linspace(origin, origin + length - size, count).astype(int).tolist()
+    
+    tile_w, xs = starts(x, w)
+    tile_h, ys = starts(y, h)
+    regions = [(tx, ty, tile_w, tile_h) for ty in ys for tx in xs]
+    if full_frame and (len(regions) > 1 or (tile_w, tile_h) != (frame_w, frame_h)):
+        regions.append((0, 0, frame_w, frame_h))
+    return regions
+
+def merge_tiles(detections_list, overlap_threshold=0.6):
+    """Merge the detections of overlapping tiles into one Detections.
+
+    Boxes are taken in order of confidence; a box of the same class from a
+    different tile that overlaps a kept box by more than overlap_threshold of
+    its own (smaller) area is the same object seen across a seam, so it is
+    dropped and the kept box grows to cover both. Boxes from the same tile
+    are left to the model's own non-maximum suppression.
+    """
+    merged = Detections.concatenate(detections_list)
+    if len(merged) < 2:
+        return merged
+    tiles = np.repeat(np.arange(len(detections_list)), [len(d) for d in detections_list])
+    order = np.argsort(-merged.scores, kind="stable")
+    boxes = merged.boxes[order].astype(np.int64)
+    classes = merged.class_ids[order]
+    tiles = tiles[order]
+    
+    # Pairwise intersection over the smaller box
+    x1, y1 = boxes[:, 0], boxes[:, 1]
+    x2, y2 = x1 + boxes[:, 2], y1 + boxes[:, 3]
+    inter_w = np.clip(np.minimum(x2[:, None], x2[None]) - np.maximum(x1[:, None], x1[None]), 0, None)
+    inter_h = np.clip(np.minimum(y2[:, None], y2[None]) - np.maximum(y1[:, None], y1[None]), 0, None)
+    areas = boxes[:, 2] * boxes[:, 3]
+    smaller = np.maximum(np.minimum(areas[:, None], areas[None]), 1)
+    same = ((inter_w * inter_h / smaller > overlap_threshold)
+            & (classes[:, None] == classes[None]) & (tiles[:, None] != tiles[None]))
+    
+    keep = []
+    suppressed = np.zeros(len(boxes), dtype=bool)
+    for i in range(len(boxes)):
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        duplicates = np.flatnonzero(same[i] & ~suppressed)
+        duplicates = duplicates[duplicates > i]
+        if len(duplicates):
+            suppressed[duplicates] = True
+            group = np.append(duplicates, i)
+            x1[i], y1[i] = x1[group].min(), y1[group].min()
+            x2[i], y2[i] = x2[group].max(), y2[group].max()
+    keep = np.array(keep)
+    result_boxes = np.stack([x1[keep], y1[keep], x2[keep] - x1[keep], y2[keep] - y1[keep]], axis=1)
+    return Detections(result_boxes.astype(np.int32), merged.scores[order][keep], classes[keep])
 
 class ObjectDetector:
-    def __init__(self):
-        # Load model from TensorFlow Hub
-        self.detector = hub.load("https://tfhub.dev/tensorflow/ssd_mobilenet_v2/2")
+    def __init__(self, model_id=DEFAULT_MODEL_ID, registry=None, warmup=True, model=None, backend=DEFAULT_BACKEND,
+                 num_threads=None):
+        start_time = time.perf_counter()
+        self.model_id = model_id
+        self.backend = backend  # Inference backend, see backends.BACKENDS
+        if model is None:
+            if backend == DEFAULT_BACKEND:
+                # Load the model from a verified local directory (fetched into the cache on first use)
+                registry = registry or ModelRegistry()
+                self.model_path = registry.resolve(model_id)
+            else:
+                # TFLite and OpenCV models are local files
+                self.model_path = model_id
+            self.detector = load_backend(backend, self.model_path, num_threads)
+        else:
+            # Any callable mapping an RGB uint8 batch to the SSD output arrays (e.g. a stub)
+            self.model_path = None
+            self.detector = model
+        self.load_time = time.perf_counter() - start_time
+        self.warmup_time = 0.0
         
-        # COCO class labels
-        self.category_index = {
-            1: 'person', 2: 'bicycle', 3: 'car', 4: 'motorcycle', 5: 'airplane',
-            6: 'bus', 7: 'train', 8: 'truck', 9: 'boat', 10: 'traffic light',
-            11: 'fire hydrant', 13: 'stop sign', 14: 'parking meter', 15: 'bench',
-            16: 'bird', 17: 'cat', 18: 'dog', 19: 'horse', 20: 'sheep',
-            21: 'cow', 22: 'elephant', 23: 'bear', 24: 'zebra', 25: 'giraffe',
-            27: 'backpack', 28: 'umbrella', 31: 'handbag', 32: 'tie', 33: 'suitcase',
-            34: 'frisbee', 35: 'skis', 36: 'snowboard', 37: 'sports ball', 38: 'kite',
-            39: 'baseball bat', 40: 'baseball glove', 41: 'skateboard', 42: 'surfboard',
-            43: 'tennis racket', 44: 'bottle', 46: 'wine glass', 47: 'cup', 48: 'fork',
-            49: 'knife', 50: 'spoon', 51: 'bowl', 52: 'banana', 53: 'apple',
-            54: 'sandwich', 55: 'orange', 56: 'broccoli', 57: 'carrot', 58: 'hot dog',
-            59: 'pizza', 60: 'donut', 61: 'cake', 62: 'chair', 63: 'couch',
-            64: 'potted plant', 65: 'bed', 67: 'dining table', 70: 'toilet', 72: 'tv',
-            73: 'laptop', 74: 'mouse', 75: 'remote', 76: 'keyboard', 77: 'cell phone',
-            78: 'microwave', 79: 'oven', 80: 'toaster', 81: 'sink', 82: 'refrigerator',
-            84: 'book', 85: 'clock', 86: 'vase', 87: 'scissors', 88: 'teddy bear',
-            89: 'hair drier', 90: 'toothbrush'
-        }
+        self.category_index = COCO_LABELS
         
+        # Detections must beat the threshold of their class; classes outside
+        # allowed_classes (names, None for all) are dropped
+        self.class_thresholds = {}
+        self.allowed_classes = None
         self.confidence_threshold = 0.5
+        
+        # Trace the graph now so the first real frame is not slow
+        if warmup:
+            self.warmup()
+    
+    def warmup(self, width=480, height=270):
+        """Run a dummy inference at a typical detection size"""
+        start_time = time.perf_counter()
+        self.detect_batch([np.zeros((height, width, 3), dtype=np.uint8)])
+        self.warmup_time = time.perf_counter() - start_time
+    
+    @property
+    def confidence_threshold(self):
+        return self._confidence_threshold
+    
+    @confidence_threshold.setter
+    def confidence_threshold(self, value):
+        self._confidence_threshold = value
+        self._update_threshold_table()
+    
+    def set_class_filter(self, class_thresholds=None, allowed_classes=None):
+        """Set per-class confidence thresholds and the allow-list, both keyed by class name"""
+        self.class_thresholds = dict(class_thresholds or {})
+        self.allowed_classes = set(allowed_classes) if allowed_classes is not None else None
+        self._update_threshold_table()
+    
+    def _update_threshold_table(self):
+        """Precompute a threshold per class ID so filtering is one array lookup"""
+        table = np.full(max(COCO_LABELS) + 1, self._confidence_threshold, dtype=np.float32)
+        ids_by_name = {name: class_id for class_id, name in COCO_LABELS.items()}
+        for name, threshold in self.class_thresholds.items():
+            if name in ids_by_name:
+                table[ids_by_name[name]] = threshold
+        if self.allowed_classes is not None:
+            allowed_ids = [ids_by_name[name] for name in self.allowed_classes if name in ids_by_name]
+            mask = np.ones(len(table), dtype=bool)
+            mask[allowed_ids] = False
+            table[mask] = np.inf
+        self._threshold_table = table
     
-    def detect(self, frame):
-        # Convert to RGB (TensorFlow models expect RGB)
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    def detect(self, frame, draw=False):
+        """Detect objects in one frame. The annotated copy is only made when draw is True."""
+        detections = self.detect_batch([frame])[0]
+        frame_with_objects = draw_detections(frame.copy(), detections) if draw else None
+        return detections, frame_with_objects
+    
+    def detect_batch(self, frames):
+        """Detect objects in several frames with one call to the model backend.
+
+        Backends that take batches run them in a single forward pass, and frames
+        of different sizes are zero-padded at the bottom and right to the largest
+        height and width in the batch. Backends that run one image at a time
+        (batched = False, such as the TF Hub SavedModel) get each frame at its
+        own size, so a small crop is not shrunk along with a padded canvas.
+        Returns one Detections per frame, with boxes in that frame's pixel
+        coordinates.
+        """
+        if not frames:
+            return []
         
-        # Convert to tensor, add batch dimension
-        input_tensor = tf.convert_to_tensor(rgb_frame)
-        input_tensor = input_tensor[tf.newaxis, ...]
+        if getattr(self.detector, "batched", True):
+            batch_h = max(frame.shape[0] for frame in frames)
+            batch_w = max(frame.shape[1] for frame in frames)
+            
+            # Build the padded RGB batch (TensorFlow models expect RGB): plain copies, then one
+            # in-place conversion of the whole batch, much faster than copying reversed channels
+            batch = np.zeros((len(frames), batch_h, batch_w, 3), dtype=np.uint8)
+            for i, frame in enumerate(frames):
+                h, w = frame.shape[:2]
+                batch[i, :h, :w] = frame
+            rows = batch.reshape(-1, batch_w, 3)
+            cv2.cvtColor(rows, cv2.COLOR_BGR2RGB, dst=rows)
+            batch_shapes = [(batch_h, batch_w)] * len(frames)
+        else:
+            batch = [cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) for frame in frames]
+            batch_shapes = [frame.shape[:2] for frame in frames]
         
         # Run inference
-        detections = self.detector(input_tensor)
+        detections = self.detector(batch)
         
         # Get detection results
-        boxes = detections['detection_boxes'][0].numpy()
-        classes = detections['detection_classes'][0].numpy().astype(np.int32)
-        scores = detections['detection_scores'][0].numpy()
+        boxes = detections['detection_boxes']
+        classes = detections['detection_classes'].astype(np.int32)
+        scores = detections['detection_scores']
+        
+        return [self._postprocess(boxes[i], classes[i], scores[i], frame.shape[:2], batch_shapes[i])
+                for i, frame in enumerate(frames)]
+    
+    def _postprocess(self, boxes, classes, scores, frame_shape, batch_shape):
+        """Filter and convert one frame's raw model output with array operations"""
+        table = self._threshold_table
         
-        # Create a copy of the frame to draw on
-        frame_with_objects = frame.copy()
-        h, w, _ = frame.shape
+        # Unknown class IDs use the default threshold (or are dropped by an allow-list)
+        known = classes < len(table)
+        thresholds = np.where(known, table[np.where(known, classes, 0)],
+                              np.inf if self.allowed_classes is not None else self._confidence_threshold)
+        keep = scores > thresholds
         
-        # Store detected objects
-        detected_objects = []
+        # Boxes are normalized (y_min, x_min, y_max, x_max) of the padded size, clip them to the frame
+        h, w = frame_shape
+        batch_h, batch_w = batch_shape
+        corners = (boxes[keep] * np.array([batch_h, batch_w, batch_h, batch_w], dtype=np.float32)).astype(np.int32)
+        np.minimum(corners[:, 2], h, out=corners[:, 2])
+        np.minimum(corners[:, 3], w, out=corners[:, 3])
         
-        # Process detected objects
-        for i in range(len(scores)):
-            if scores[i] > self.confidence_threshold:
-                # Get coordinates
-                box = boxes[i]
-                y_min, x_min, y_max, x_max = box
-                x_min, x_max = int(x_min * w), int(x_max * w)
-                y_min, y_max = int(y_min * h), int(y_max * h)
-                
-                # Get class name
-                class_id = classes[i]
-                class_name = self.category_index.get(class_id, 'unknown')
-                
-                # Add to detected objects
-                detected_objects.append({
-                    'class': class_name,
-                    'confidence': float(scores[i]),
-                    'box': (x_min, y_min, x_max - x_min, y_max - y_min)
-                })
-                
-                # Draw rectangle and label
-                cv2.rectangle(frame_with_objects, (x_min, y_min), (x_max, y_max), (0, 0, 255), 2)
-                label = f"{class_name}: {int(scores[i] * 100)}%"
-                cv2.putText(frame_with_objects, label, (x_min, y_min - 10),
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
+        xywh = np.stack([corners[:, 1], corners[:, 0],
+                         corners[:, 3] - corners[:, 1], corners[:, 2] - corners[:, 0]], axis=1)
+        valid = (xywh[:, 2] > 0) & (xywh[:, 3] > 0)
         
-        return detected_objects, frame_with_objects
\ No newline at end of file
+        return Detections(xywh[valid], scores[keep][valid].astype(np.float32), classes[keep][valid])
+    
+    def detect_regions(self, frame, regions, max_size=480, merge_overlap=None):
+        """Detect objects only inside the given (x, y, w, h) regions of a frame.
+
+        Each region is cropped, shrunk so its longest side is at most max_size,
+        and all crops run as one batch. Boxes are mapped back to frame coordinates.
+        For overlapping regions such as tiles, pass merge_overlap to merge
+        objects found in several of them (see merge_tiles).
+        """
+        crops, transforms = crop_regions(frame, regions, max_size)
+        detections_list = [
+            detections.scaled(scale, offset_x, offset_y)
+            for detections, (offset_x, offset_y, scale) in zip(self.detect_batch(crops), transforms)
+        ]
+        if merge_overlap is not None:
+            return merge_tiles(detections_list, merge_overlap)
+        return Detections.concatenate(detections_list)
+    
+    def detect_tiles(self, frame, tile_size=480, overlap=0.2, roi=None, full_frame=True, merge_overlap=0.6):
+        """Detect objects at full resolution in overlapping tiles of a frame (see tile_regions)"""
+        regions = tile_regions(frame.shape, tile_size, overlap, roi, full_frame)
+        return self.detect_regions(frame, regions, tile_size, merge_overlap)
+
+def create_detector(model_id=DEFAULT_MODEL_ID, offline=False, confidence_threshold=None,
+                    class_thresholds=None, allowed_classes=None, backend=DEFAULT_BACKEND, num_threads=None):
+    """Build a configured ObjectDetector (module-level so worker processes can be given it)"""
+    registry = ModelRegistry(allow_download=False) if offline else None
+    detector = ObjectDetector(model_id=model_id, registry=registry, backend=backend, num_threads=num_threads)
+    if confidence_threshold is not None:
+        detector.confidence_threshold = confidence_threshold
+    detector.set_class_filter(class_thresholds, allowed_classes)
+    return detector
\ No newline at end of file
@@ -0,0 +1,74 @@
+# pacing.py
+import math
+import time
+
+# Pacing policies
+REALTIME = "realtime"  # Keep wall-clock sync with the source, dropping frames when behind
+MAX_THROUGHPUT = "max"  # Never sleep, process frames as fast as possible
+FIXED_RATE = "fixed"  # Process at a fixed frame rate
+
+POLICIES = (REALTIME, MAX_THROUGHPUT, FIXED_RATE)
+
+class FramePacer:
+    """Decides how long to wait before the next frame and how many frames to drop.
+
+    Call start() before the first frame and frame_done() after each processed
+    frame; frame_done() sleeps as the policy requires and returns how many
+    source frames to skip to stay in sync. When only every few source frames
+    are processed, frame_done() is told how many source frames each one
+    stands for.
+    """
+    def __init__(self, policy=REALTIME, source_fps=0.0, fixed_fps=15.0, live=False):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown pacing policy: {policy}")
+        self.policy = policy
+        self.live = live  # Live sources (cameras) are paced by the device
+        self.fixed_fps = fixed_fps
+
+        # Fall back to 30 fps when the container does not report a usable rate
+        if not source_fps or math.isnan(source_fps) or source_fps <= 0 or source_fps > 1000:
+            source_fps = 30.0
+        self.source_fps = source_fps
+
+        self.dropped_frames = 0
+        self.start()
+
+    def start(self):
+        """Reset the clock, e.g. when playback starts or loops back to the beginning"""
+        self.start_time = time.perf_counter()
+        self.frames = 0  # Source frames consumed (processed, sampled out or dropped) since start
+        self.processed = 0  # Frames processed since start
+
+    def frame_done(self, source_frames=1):
+        """Wait as the policy requires after a frame, returning the number of frames to drop"""
+        self.frames += source_frames
+        self.processed += 1
+
+        if self.policy == MAX_THROUGHPUT:
+            return 0
+
+        if self.policy == FIXED_RATE:
+            target = self.start_time + self.processed / self.fixed_fps
+            delay = target - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -1.0:
+                # Far behind; don't try to catch up with a burst
+                self.start()
+            return 0
+
+        # Real-time: a camera already delivers frames at wall-clock rate
+        if self.live:
+            return 0
+
+        target = self.start_time + self.frames / self.source_fps
+        delay = target - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+            return 0
+
+        # Behind the source: drop whole frames to get back in sync
+        drop = int(-delay * self.source_fps)
+        self.frames += drop
+        self.dropped_frames += drop
+        return drop
@@ -0,0 +1,239 @@
+# result_cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+from backends import DEFAULT_BACKEND
+
+ROW_OVERHEAD = 64  # Bytes counted per entry on top of its value, for the key and index
+SAMPLE_BYTES = 1 << 20  # Bytes hashed from the start, middle and end of a video file
+
+def default_cache_path():
+    """Result cache file, next to the model cache"""
+    return os.path.join(os.path.expanduser("~"), ".cache", "video-analysis-tool", "results.sqlite")
+
+def video_key(path):
+    """Content hash identifying a video file, or None for a camera or a missing file.
+
+    Hashes the size and 1 MiB from the start, middle and end of the file rather
+    than all of it, so a multi-gigabyte recording is identified in milliseconds;
+    copies and renames of a file share its cached results.
+    """
+    if not os.path.isfile(path):
+        return None
+    size = os.path.getsize(path)
+    digest = hashlib.sha256(str(size).encode())
+    with open(path, "rb") as f:
+        for offset in (0, max(size // 2 - SAMPLE_BYTES // 2, 0), max(size - SAMPLE_BYTES, 0)):
+            f.seek(offset)
+            digest.update(f.read(SAMPLE_BYTES))
+    return digest.hexdigest()
+
+def config_key(**options):
+    """Canonical string for the options a result depends on"""
+    return json.dumps(options, sort_keys=True, default=str)
+
+def motion_config(motion_options, sample_every=1, keyframes_only=False, mask=None):
+    """Cache configuration of motion results: the MotionDetector options, its mask and which frames it saw"""
+    options = dict(sample_every=sample_every, keyframes_only=keyframes_only, **motion_options)
+    # Only added when set, so results of earlier unmasked runs stay valid
+    if mask:
+        options["mask"] = mask.key()
+    return config_key(**options)
+
+def detection_config(model_id, detection_width, confidence_threshold=None, allowed_classes=None,
+                     class_thresholds=None, gating_motion_config=None, region_padding=None, tiling=None,
+                     backend=DEFAULT_BACKEND, mask=None):
+    """Cache configuration of detection results; motion-gated detection also depends on the motion config.
+
+    tiling describes the tile grid (a dict of its settings) of tiled detection, None for whole frames.
+    backend is the inference backend, since quantized models give slightly different results.
+    mask is the FrameMask frames are cropped and blanked with before detection, if any.
+    """
+    options = dict(model=model_id, detection_width=detection_width, confidence_threshold=confidence_threshold,
+                   allowed_classes=allowed_classes or None, class_thresholds=class_thresholds or None,
+                   motion=gating_motion_config, region_padding=region_padding if gating_motion_config else None)
+    # Only added when set, so results of earlier whole-frame TF runs stay valid
+    if tiling is not None:
+        options["tiling"] = tiling
+    if backend != DEFAULT_BACKEND:
+        options["backend"] = backend
+    if mask:
+        options["mask"] = mask.key()
+    return config_key(**options)
+
+class ResultCache:
+    """Per-frame motion and detection results stored in SQLite, with LRU eviction.
+
+    Entries are keyed by video content hash, kind ("motion" or "objects"),
+    configuration string (see config_key) and frame index. Once the stored
+    values exceed max_bytes, the least recently used groups of entries (all
+    frames of one video, kind and configuration) are deleted together.
+    A run that stored every frame of a video marks its group complete; motion
+    results are only valid from complete groups, since a background model
+    that skips the cached frames is not warmed up for the missing ones.
+    Writes and recency updates are committed in batches, every commit_every
+    changes and on flush() or close(). Safe to share between threads, and
+    several processes may open the same file.
+    """
+    def __init__(self, path=None, max_bytes=1 << 30, commit_every=500):
+        self.path = path or default_cache_path()
+        self.max_bytes = max_bytes
+        self.commit_every = commit_every
+        self.hits = 0
+        self.misses = 0
+        self.metrics = None  # Optional Metrics for hit and miss counters
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, timeout=30.0, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS results (
+                                video TEXT NOT NULL, kind TEXT NOT NULL, config TEXT NOT NULL,
+                                frame INTEGER NOT NULL, value BLOB NOT NULL, size INTEGER NOT NULL,
+                                last_used REAL NOT NULL,
+                                PRIMARY KEY (video, kind, config, frame))""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS complete (
+                                video TEXT NOT NULL, kind TEXT NOT NULL, config TEXT NOT NULL,
+                                frames INTEGER NOT NULL,
+                                PRIMARY KEY (video, kind, config))""")
+        self._db.commit()
+        self._size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        self._touched = {}  # Key -> last use time, written at the next commit
+        self._changes = 0
+
+    def size(self):
+        """Bytes counted against max_bytes"""
+        return self._size
+
+    def get(self, video, kind, config, frame):
+        """Return the stored bytes for a key, or None"""
+        key = (video, kind, config, frame)
+        with self._lock:
+            row = self._db.execute("SELECT value FROM results WHERE video=? AND kind=? AND config=? AND frame=?",
+                                   key).fetchone()
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._touched[key] = time.time()
+                self._changed()
+        if self.metrics is not None:
+            self.metrics.increment("cache_hits" if row is not None else "cache_misses")
+        return row[0] if row is not None else None
+
+    def put(self, video, kind, config, frame, value):
+        size = len(value) + ROW_OVERHEAD
+        with self._lock:
+            old = self._db.execute("SELECT size FROM results WHERE video=? AND kind=? AND config=? AND frame=?",
+                                   (video, kind, config, frame)).fetchone()
+            self._db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (video, kind, config, frame, value, size, time.time()))
+            self._size += size - (old[0] if old is not None else 0)
+            self._changed()
+
+    def mark_complete(self, video, kind, config, frames):
+        """Record that a run stored all frames of a video, frames entries in all, and commit"""
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO complete VALUES (?, ?, ?, ?)", (video, kind, config, frames))
+            self._commit()
+    
+    def is_complete(self, video, kind, config):
+        """Whether a complete run is stored, with none of its entries deleted since"""
+        key = (video, kind, config)
+        with self._lock:
+            row = self._db.execute("SELECT frames FROM complete WHERE video=? AND kind=? AND config=?",
+                                   key).fetchone()
+            if row is None:
+                return False
+            count = self._db.execute("SELECT COUNT(*) FROM results WHERE video=? AND kind=? AND config=?",
+                                     key).fetchone()[0]
+        return count == row[0]
+    
+    def get_motion(self, video, config, frame):
+        """Return a cached (motion_detected, regions) pair, or None"""
+        value = self.get(video, "motion", config, frame)
+        if value is None:
+            return None
+        values = np.frombuffer(value, dtype=np.int32)
+        regions = [tuple(region) for region in values[1:].reshape(-1, 4).tolist()]
+        return bool(values[0]), regions
+
+    def put_motion(self, video, config, frame, motion_detected, regions):
+        values = np.array([int(motion_detected)] + [v for region in regions for v in region], dtype=np.int32)
+        self.put(video, "motion", config, frame, values.tobytes())
+
+    def get_detections(self, video, config, frame):
+        """Return cached Detections (in frame coordinates), or None"""
+        from object_detector import Detections
+        value = self.get(video, "objects", config, frame)
+        if value is None:
+            return None
+        n = len(value) // 24  # Four box ints, a float score and an int class ID per detection
+        return Detections(np.frombuffer(value, dtype=np.int32, count=4 * n).reshape(n, 4),
+                          np.frombuffer(value, dtype=np.float32, count=n, offset=16 * n),
+                          np.frombuffer(value, dtype=np.int32, count=n, offset=20 * n))
+
+    def put_detections(self, video, config, frame, detections):
+        value = (detections.boxes.astype(np.int32).tobytes() + detections.scores.astype(np.float32).tobytes()
+                 + detections.class_ids.astype(np.int32).tobytes())
+        self.put(video, "objects", config, frame, value)
+
+    def _changed(self):
+        """Count a change, committing once enough have accumulated. Needs _lock."""
+        self._changes += 1
+        if self._changes >= self.commit_every:
+            self._commit()
+
+    def _commit(self):
+        """Write recency updates, evict down to max_bytes and commit. Needs _lock."""
+        if self._touched:
+            self._db.executemany("UPDATE results SET last_used=? WHERE video=? AND kind=? AND config=? AND frame=?",
+                                 [(used,) + key for key, used in self._touched.items()])
+            self._touched.clear()
+        if self._size > self.max_bytes:
+            self._evict()
+        self._db.commit()
+        self._changes = 0
+
+    def _evict(self):
+        """Delete the least recently used groups until the cache is 10% under max_bytes. Needs _lock.
+
+        A group goes as a whole, so no run is left with gaps in the middle.
+        """
+        target = self.max_bytes * 0.9
+        groups = self._db.execute("SELECT video, kind, config, SUM(size) FROM results "
+                                  "GROUP BY video, kind, config ORDER BY MAX(last_used)").fetchall()
+        for video, kind, config, size in groups:
+            if self._size <= target:
+                break
+            key = (video, kind, config)
+            self._db.execute("DELETE FROM results WHERE video=? AND kind=? AND config=?", key)
+            self._db.execute("DELETE FROM complete WHERE video=? AND kind=? AND config=?", key)
+            self._size -= size
+        if not groups:
+            self._size = 0
+
+    def flush(self):
+        with self._lock:
+            self._commit()
+
+    def clear(self):
+        """Delete every entry"""
+        with self._lock:
+            self._db.execute("DELETE FROM results")
+            self._db.execute("DELETE FROM complete")
+            self._touched.clear()
+            self._size = 0
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._commit()
+            self._db.close()
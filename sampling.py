@@ -0,0 +1,162 @@
+# sampling.py
+import bisect
+import time
+import cv2
+
+def find_keyframes(source):
+    """List the frame indices of a video file's keyframes.
+
+    The file is read as raw packets, which are never decoded, so this costs
+    little more than reading the file. Indices count packets, which match
+    frame indices unless the stream reorders B-frames across keyframes, so
+    they can be off by a frame or two in that case. Needs OpenCV's FFmpeg
+    backend; raises IOError if the file cannot be read that way.
+    """
+    if not hasattr(cv2, "CAP_PROP_LRF_HAS_KEY_FRAME"):
+        raise IOError("Keyframe sampling needs OpenCV 4.6 or later")
+    vid = cv2.VideoCapture(source, cv2.CAP_FFMPEG, [cv2.CAP_PROP_FORMAT, -1])
+    if not vid.isOpened():
+        raise IOError(f"Could not read the packets of {source}, keyframe sampling needs the FFmpeg backend")
+
+    keyframes = []
+    index = 0
+    try:
+        while vid.grab():
+            if vid.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME):
+                keyframes.append(index)
+            index += 1
+    finally:
+        vid.release()
+    if not keyframes:
+        raise IOError(f"No keyframes found in {source}")
+    return keyframes
+
+class FrameSampler:
+    """Reads only the frames that will be analyzed from a VideoCapture.
+
+    Samples every Nth frame (every), or only the listed keyframes. Frames in
+    between are stepped over with grab(), which skips the conversion to BGR
+    and the copy out of the decoder, and gaps of at least min_seek frames are
+    crossed by seeking once a seek has proven cheaper than grabbing through
+    them. read() has the same signature as VideoCapture.read(), so a sampler
+    can stand in for the capture; frame_index is the index of the last frame
+    it returned.
+    """
+    def __init__(self, vid, every=1, keyframes=None, position=0, seekable=True, min_seek=32):
+        self.vid = vid
+        self.every = max(every, 1)
+        self.keyframes = keyframes  # Sorted frame indices, or None to sample every Nth frame
+        self.position = position  # Index of the frame the capture returns next
+        self.seekable = seekable  # Cameras cannot seek
+        self.min_seek = min_seek
+        self.metrics = None  # Optional Metrics for skipped frames and seeks
+
+        self.frame_index = None  # Index of the last frame returned by read() or passed by grab()
+        self.step = 0  # Source frames read() consumed for that frame, not counting drop()
+        self.skipped_frames = 0
+        self.seeks = 0
+
+        self._min_target = position  # drop() moves this past the dropped frames
+        self._dropped = 0  # Frames passed over by drop() since the last read()
+        self._grab_time = None  # Moving averages, in seconds per grab() and per seek
+        self._seek_time = None
+
+    def next_target(self):
+        """Index of the next frame to analyze, or None after the last keyframe"""
+        start = max(self.position, self._min_target)
+        if self.keyframes is not None:
+            i = bisect.bisect_left(self.keyframes, start)
+            return self.keyframes[i] if i < len(self.keyframes) else None
+        return -(-start // self.every) * self.every
+
+    def sample_number(self, frame_index):
+        """Position of a sampled frame in the sequence of all samples of the source"""
+        if self.keyframes is not None:
+            return bisect.bisect_left(self.keyframes, frame_index)
+        return frame_index // self.every
+
+    def drop(self, count):
+        """Skip the sample(s) falling in the next count source frames, e.g. to keep up with pacing"""
+        self._min_target = max(self._min_target, self.position) + count
+        self._dropped += count
+
+    def rewind(self, position=0):
+        """Seek the capture back, e.g. to loop a file"""
+        self.vid.set(cv2.CAP_PROP_POS_FRAMES, position)
+        self.position = self._min_target = position
+        self._dropped = 0
+
+    def read(self, image=None):
+        start_position = self.position
+        target = self._advance()
+        if target is None:
+            return False, None
+        ret, frame = self.vid.read(image) if image is not None else self.vid.read()
+        if not ret:
+            return False, None
+        self._sampled(target, start_position)
+        return True, frame
+
+    def grab(self):
+        """Move past the next sampled frame without converting it, e.g. when its results are cached.
+
+        Returns False at the end of the stream; frame_index and step are set as by read().
+        """
+        start_position = self.position
+        target = self._advance()
+        if target is None or not self.vid.grab():
+            return False
+        self._sampled(target, start_position)
+        return True
+
+    def _advance(self):
+        """Step over the frames before the next sample, returning its index or None at the end"""
+        target = self.next_target()
+        while target is not None and self.position < target:
+            if not self._skip_to(target):
+                return None
+            # A seek may land past the target; go for the next sample from there
+            target = self.next_target()
+        return target
+
+    def _sampled(self, target, start_position):
+        self.frame_index = target
+        self.position = target + 1
+        self.step = max(self.position - start_position - self._dropped, 1)
+        self._dropped = 0
+
+    def _skip_to(self, target):
+        """Move the capture forward to target, returning False at the end of the stream"""
+        gap = target - self.position
+        seek = (self.seekable and gap >= self.min_seek and self._grab_time is not None
+                and (self._seek_time is None or self._seek_time < gap * self._grab_time))
+
+        start_time = time.perf_counter()
+        if seek:
+            self.vid.set(cv2.CAP_PROP_POS_FRAMES, target)
+            position = int(self.vid.get(cv2.CAP_PROP_POS_FRAMES))
+            self._seek_time = self._average(self._seek_time, time.perf_counter() - start_time)
+            self.seeks += 1
+            if self.metrics is not None:
+                self.metrics.increment("sampling_seeks")
+            if position != target:
+                # Inexact seeking (some backends stop at a keyframe): grab from here on
+                self.seekable = False
+            skipped = max(position - self.position, 0)
+            self.position = position
+        else:
+            skipped = 0
+            while self.position < target:
+                if not self.vid.grab():
+                    return False
+                self.position += 1
+                skipped += 1
+            self._grab_time = self._average(self._grab_time, (time.perf_counter() - start_time) / skipped)
+
+        self.skipped_frames += skipped
+        if self.metrics is not None and skipped:
+            self.metrics.increment("sampling_skipped_frames", skipped)
+        return True
+
+    def _average(self, average, sample):
+        return sample if average is None else 0.8 * average + 0.2 * sample
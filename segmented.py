@@ -0,0 +1,89 @@
+# segmented.py
+import multiprocessing as mp
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+from activity_index import ActivityIndex, index_path
+from result_cache import video_key
+
+def plan_segments(total_frames, num_segments):
+    """Split [0, total_frames) into num_segments contiguous (start, end) frame ranges"""
+    num_segments = max(min(num_segments, total_frames), 1)
+    bounds = [total_frames * i // num_segments for i in range(num_segments + 1)]
+    return [(bounds[i], bounds[i + 1]) for i in range(num_segments)]
+
+def _analyze_segment(options, source, start, end, warmup_frames, path):
+    """Worker process: analyze one frame range of a file into its own JSONL file"""
+    from headless import HeadlessAnalyzer
+    analyzer = HeadlessAnalyzer(**options)
+    try:
+        with open(path, "w") as out:
+            return analyzer.analyze(source, out, start_frame=start, end_frame=end, warmup_frames=warmup_frames)
+    finally:
+        analyzer.close()
+
+def analyze_segmented(source, out, options, num_segments, processes=None, warmup_frames=200):
+    """Analyze a video file as num_segments frame ranges in parallel worker processes.
+
+    Each worker seeks to its range and first runs the background model over
+    the warmup_frames frames before it, so motion at the segment boundaries
+    closely matches a sequential run. The segments' records are copied to out in
+    frame order as soon as every earlier segment is done. options are the
+    HeadlessAnalyzer keyword arguments (they must be picklable; each worker
+    loads its own detector).
+
+    Returns a summary dict like HeadlessAnalyzer.analyze(), with the segments.
+    """
+    vid = cv2.VideoCapture(source)
+    if not vid.isOpened():
+        raise IOError(f"Could not open video source: {source}")
+    total_frames = int(vid.get(cv2.CAP_PROP_FRAME_COUNT))
+    vid.release()
+    if total_frames <= 0:
+        raise IOError(f"Frame count of {source} is unknown, it cannot be split into segments")
+
+    segments = plan_segments(total_frames, num_segments)
+
+    # The workers write disjoint ranges of one activity index, so it is created before they start
+    activity_path = None
+    if options.get("activity_dir"):
+        activity_path = index_path(options["activity_dir"], video_key(source))
+        ActivityIndex(activity_path, total_frames).flush()
+
+    start_time = time.perf_counter()
+    temp_dir = tempfile.mkdtemp(prefix="video-analysis-segments-")
+    try:
+        paths = [os.path.join(temp_dir, f"segment_{i:04d}.jsonl") for i in range(len(segments))]
+        # Spawned workers, since the parent may hold TensorFlow or OpenCV threads
+        with ProcessPoolExecutor(processes or len(segments), mp_context=mp.get_context("spawn")) as executor:
+            futures = [executor.submit(_analyze_segment, options, source, start, end, warmup_frames, path)
+                       for (start, end), path in zip(segments, paths)]
+
+            # Merge in order: segment i is written once it and all before it are done
+            summaries = []
+            for future, path in zip(futures, paths):
+                summaries.append(future.result())
+                with open(path) as segment_out:
+                    shutil.copyfileobj(segment_out, out)
+                os.remove(path)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    elapsed = time.perf_counter() - start_time
+    frames = sum(summary["frames"] for summary in summaries)
+    result = {
+        "source": source,
+        "frames": frames,
+        "analyzed_frames": sum(summary["analyzed_frames"] for summary in summaries),
+        "dropped_frames": 0,
+        "seconds": elapsed,
+        "fps": frames / elapsed if elapsed > 0 else 0.0,
+        "segments": [{"start": start, "end": end, "seconds": summary["seconds"]}
+                     for (start, end), summary in zip(segments, summaries)],
+    }
+    if activity_path is not None:
+        result["activity_index"] = activity_path
+    return result
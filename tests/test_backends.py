@@ -0,0 +1,54 @@
+# tests/test_backends.py
+import sys
+import types
+
+import numpy as np
+import pytest
+
+from backends import SavedModel
+from model_registry import DEFAULT_MODEL_ID, ModelRegistry
+from object_detector import ObjectDetector
+
+class Output:
+    def __init__(self, value):
+        self.value = value
+
+    def numpy(self):
+        return self.value
+
+def single_image_model(batch):
+    """Stands in for the TF Hub SSD MobileNet v2 signature: [1, None, None, 3] uint8 only"""
+    if batch.ndim != 4 or batch.shape[0] != 1 or batch.shape[3] != 3 or batch.dtype != np.uint8:
+        raise ValueError(f"Expected a [1, H, W, 3] uint8 tensor, got {batch.shape} {batch.dtype}")
+    return {
+        "detection_boxes": Output(np.array([[[0.1, 0.1, 0.5, 0.5], [0.2, 0.2, 0.4, 0.4]]], dtype=np.float32)),
+        "detection_classes": Output(np.array([[1.0, 3.0]], dtype=np.float32)),
+        "detection_scores": Output(np.array([[0.9, 0.2]], dtype=np.float32)),
+        "num_detections": Output(np.array([2.0], dtype=np.float32)),
+    }
+
+@pytest.fixture
+def fake_tensorflow(monkeypatch):
+    monkeypatch.setitem(sys.modules, "tensorflow", types.SimpleNamespace(convert_to_tensor=np.asarray))
+    monkeypatch.setitem(sys.modules, "tensorflow_hub", types.SimpleNamespace(load=lambda path: single_image_model))
+
+def test_saved_model_runs_batches_one_image_at_a_time(fake_tensorflow):
+    detector = ObjectDetector(model=SavedModel("model"), warmup=False)
+    frames = [np.zeros((270, 480, 3), dtype=np.uint8), np.zeros((300, 400, 3), dtype=np.uint8),
+              np.zeros((100, 100, 3), dtype=np.uint8)]
+    results = detector.detect_batch(frames)
+    assert len(results) == 3
+    # Each frame goes to the model at its own size, not padded to the largest in the batch
+    assert [detections.boxes.tolist() for detections in results] == [
+        [[48, 27, 192, 108]], [[40, 30, 160, 120]], [[10, 10, 40, 40]]]
+    assert [detections.labels() for detections in results] == [["person"]] * 3
+
+def test_saved_model_batches_with_real_signature():
+    pytest.importorskip("tensorflow_hub")
+    try:
+        path = ModelRegistry(allow_download=False).resolve(DEFAULT_MODEL_ID)
+    except (FileNotFoundError, IOError) as e:
+        pytest.skip(f"Model not cached: {e}")
+    detector = ObjectDetector(model=SavedModel(path), warmup=False)
+    frames = [np.zeros((270, 480, 3), dtype=np.uint8) for _ in range(4)]
+    assert len(detector.detect_batch(frames)) == 4
@@ -0,0 +1,101 @@
+# tests/test_model_registry.py
+import hashlib
+import io
+import shutil
+import tarfile
+
+import pytest
+
+import model_registry
+from model_registry import ModelLoader, ModelRegistry
+
+def make_archive(path, files):
+    with tarfile.open(path, "w:gz") as archive:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+@pytest.fixture
+def served_archive(tmp_path, monkeypatch):
+    """A model archive served in place of TF Hub, returning its path and checksum"""
+    path = str(tmp_path / "model.tar.gz")
+    checksum = make_archive(path, {"saved_model.pb": b"graph", "variables/variables.index": b"index"})
+
+    def download(url, target):
+        shutil.copyfile(path, target)
+        with open(target, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    monkeypatch.setattr(model_registry, "download", download)
+    return path, checksum
+
+def test_fetch_checks_the_pinned_checksum_before_unpacking(tmp_path, served_archive, monkeypatch):
+    _, checksum = served_archive
+    monkeypatch.setitem(model_registry.MODELS, "test",
+                        {"handle": "https://example.invalid/test", "archive_sha256": "0" * 64})
+    registry = ModelRegistry(cache_dir=str(tmp_path / "cache"))
+    with pytest.raises(ValueError, match="Checksum mismatch"):
+        registry.resolve("test")
+    assert not (tmp_path / "cache" / "test").exists()
+    assert not (tmp_path / "cache" / "test.partial").exists()
+
+    model_registry.MODELS["test"]["archive_sha256"] = checksum
+    registry.resolve("test")
+    assert (tmp_path / "cache" / "test" / "saved_model.pb").read_bytes() == b"graph"
+    # The directory checksum is kept outside the directory it protects
+    assert (tmp_path / "cache" / "test.sha256").exists()
+
+    (tmp_path / "cache" / "test" / "saved_model.pb").write_bytes(b"swapped")
+    with pytest.raises(ValueError, match="Checksum mismatch"):
+        registry.resolve("test")
+
+def test_unpinned_download_needs_opting_in(tmp_path, served_archive, monkeypatch):
+    monkeypatch.setitem(model_registry.MODELS, "test", {"handle": "https://example.invalid/test", "archive_sha256": None})
+    monkeypatch.delenv("VIDEO_ANALYSIS_ALLOW_UNPINNED", raising=False)
+    with pytest.raises(ValueError, match="no pinned archive checksum"):
+        ModelRegistry(cache_dir=str(tmp_path / "cache")).resolve("test")
+    assert not (tmp_path / "cache" / "test").exists()
+
+    monkeypatch.setenv("VIDEO_ANALYSIS_ALLOW_UNPINNED", "1")
+    ModelRegistry(cache_dir=str(tmp_path / "cache")).resolve("test")
+    assert (tmp_path / "cache" / "test" / "saved_model.pb").read_bytes() == b"graph"
+
+def test_model_directory_checksum_is_kept_in_the_cache(tmp_path):
+    model_dir = tmp_path / "my-model"
+    model_dir.mkdir()
+    (model_dir / "saved_model.pb").write_bytes(b"graph")
+    registry = ModelRegistry(cache_dir=str(tmp_path / "cache"))
+    assert registry.resolve(str(model_dir)) == str(model_dir)
+    # Nothing is written into the user's own directory
+    assert [path.name for path in model_dir.iterdir()] == ["saved_model.pb"]
+    assert (tmp_path / "cache" / "paths").exists()
+
+    (model_dir / "saved_model.pb").write_bytes(b"swapped")
+    with pytest.raises(ValueError, match="Checksum mismatch"):
+        registry.resolve(str(model_dir))
+
+def test_archive_entries_outside_the_model_directory_are_refused(tmp_path, monkeypatch):
+    path = str(tmp_path / "model.tar.gz")
+    checksum = make_archive(path, {"../escaped.pb": b"graph"})
+    monkeypatch.setattr(model_registry, "download", lambda url, target: shutil.copyfile(path, target) and checksum)
+    monkeypatch.setitem(model_registry.MODELS, "test",
+                        {"handle": "https://example.invalid/test", "archive_sha256": checksum})
+    with pytest.raises(ValueError, match="Unsafe entry"):
+        ModelRegistry(cache_dir=str(tmp_path / "cache")).resolve("test")
+    assert not (tmp_path / "cache" / "escaped.pb").exists()
+
+def test_failed_load_is_retried():
+    attempts = []
+
+    def factory():
+        attempts.append(None)
+        if len(attempts) == 1:
+            raise IOError("offline")
+        return "detector"
+    loader = ModelLoader(factory)
+    with pytest.raises(IOError):
+        loader.get(timeout=5)
+    assert loader.get(timeout=5) == "detector"
+    assert len(attempts) == 2
@@ -0,0 +1,89 @@
+# tests/test_result_cache.py
+import io
+import json
+
+import cv2
+import numpy as np
+
+from benchmarks.stub_model import make_stub_detector
+from benchmarks.synthetic import write_clip
+from headless import HeadlessAnalyzer
+from result_cache import ResultCache
+
+def analyze(clip, cache_path=None, **options):
+    """Records of a headless run over a clip, motion only unless options say otherwise"""
+    options.setdefault("mode", "motion")
+    analyzer = HeadlessAnalyzer(cache_path=cache_path, **options)
+    out = io.StringIO()
+    try:
+        analyzer.analyze(clip, out)
+    finally:
+        analyzer.close()
+    return [json.loads(line) for line in out.getvalue().splitlines()]
+
+def test_rerun_with_gaps_matches_uncached_run(tmp_path):
+    clip = write_clip(str(tmp_path / "clip.avi"), 320, 240, 200)
+    cache_path = str(tmp_path / "results.sqlite")
+    expected = analyze(clip)
+    assert analyze(clip, cache_path) == expected
+
+    # Drop a few frames from the middle of the cached run, as eviction or an interrupted run would
+    cache = ResultCache(cache_path)
+    cache._db.execute("DELETE FROM results WHERE kind='motion' AND frame BETWEEN 150 AND 155")
+    cache._db.commit()
+    cache.close()
+
+    assert analyze(clip, cache_path) == expected
+    assert analyze(clip, cache_path) == expected
+
+def test_complete_run_is_served_from_cache(tmp_path):
+    clip = write_clip(str(tmp_path / "clip.avi"), 320, 240, 60)
+    cache_path = str(tmp_path / "results.sqlite")
+    expected = analyze(clip, cache_path)
+
+    analyzer = HeadlessAnalyzer(mode="motion", cache_path=cache_path)
+    try:
+        analyzer.analyze(clip, io.StringIO())
+        assert analyzer.cache.hits == len(expected)
+        assert analyzer.motion_detector._frames_seen == 0  # Never ran
+    finally:
+        analyzer.close()
+
+def write_still_clip(path, num_frames, moving):
+    """A static scene with a square moving across it only during the frames in moving"""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 30, (320, 240))
+    for i in range(num_frames):
+        frame = np.full((240, 320, 3), 90, dtype=np.uint8)
+        if i in moving:
+            x = 10 + 8 * (i - moving.start)
+            frame[100:140, x:x + 40] = 230
+        writer.write(frame)
+    writer.release()
+    return path
+
+def test_gated_rerun_matches_uncached_run(tmp_path):
+    clip = write_still_clip(str(tmp_path / "clip.avi"), 90, range(40, 70))
+    cache_path = str(tmp_path / "results.sqlite")
+    options = dict(mode="both", motion_gated=True, track=True)
+    expected = analyze(clip, object_detector=make_stub_detector(), **options)
+    # Some detection frames have nothing moving, and report no objects
+    assert any(record.get("objects") == [] for record in expected)
+
+    assert analyze(clip, cache_path, object_detector=make_stub_detector(), **options) == expected
+    assert analyze(clip, cache_path, object_detector=make_stub_detector(), **options) == expected
+
+def test_eviction_removes_whole_groups(tmp_path):
+    cache = ResultCache(str(tmp_path / "results.sqlite"), max_bytes=10 * (100 + 64), commit_every=1)
+    try:
+        for frame in range(6):
+            cache.put("a", "motion", "config", frame, b"x" * 100)
+        cache.mark_complete("a", "motion", "config", 6)
+        assert cache.is_complete("a", "motion", "config")
+        # The second group pushes the cache over its limit: the older group goes as a whole
+        for frame in range(6):
+            cache.put("b", "motion", "config", frame, b"x" * 100)
+        assert not cache.is_complete("a", "motion", "config")
+        assert cache.get("a", "motion", "config", 0) is None
+        assert cache.get("b", "motion", "config", 5) is not None
+    finally:
+        cache.close()
@@ -0,0 +1,165 @@
+# tracker.py
+import itertools
+import threading
+import time
+
+def iou(box_a, box_b):
+    """Intersection over union of two (x, y, w, h) boxes"""
+    ax, ay, aw, ah = box_a
+    bx, by, bw, bh = box_b
+    inter_w = min(ax + aw, bx + bw) - max(ax, bx)
+    inter_h = min(ay + ah, by + bh) - max(ay, by)
+    if inter_w <= 0 or inter_h <= 0:
+        return 0.0
+    inter = inter_w * inter_h
+    return inter / float(aw * ah + bw * bh - inter)
+
+def center_distance(box_a, box_b):
+    """Distance between box centers, relative to the larger side of box_a"""
+    ax, ay, aw, ah = box_a
+    bx, by, bw, bh = box_b
+    dx = (ax + aw / 2.0) - (bx + bw / 2.0)
+    dy = (ay + ah / 2.0) - (by + bh / 2.0)
+    return (dx * dx + dy * dy) ** 0.5 / max(aw, ah, 1)
+
+class Track:
+    """One tracked object with a constant-velocity motion model"""
+    def __init__(self, track_id, obj, frame_index, timestamp):
+        self.track_id = track_id
+        self.class_name = obj['class']
+        self.confidence = obj['confidence']
+        self.box = [float(v) for v in obj['box']]  # x, y, w, h at last_frame
+        self.velocity = [0.0, 0.0, 0.0, 0.0]  # Change of x, y, w, h per frame
+        self.last_frame = frame_index
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.hits = 1
+        self.misses = 0
+
+    def predict(self, frame_index, max_frames=None):
+        """Box extrapolated to a frame index, at most max_frames past the last update"""
+        dt = frame_index - self.last_frame
+        if max_frames is not None:
+            dt = min(dt, max_frames)
+        return tuple(v + dv * dt for v, dv in zip(self.box, self.velocity))
+
+    def update(self, obj, frame_index, timestamp, alpha, beta):
+        """Blend a matched detection into the track (alpha-beta filter)"""
+        dt = max(frame_index - self.last_frame, 1)
+        predicted = self.predict(frame_index)
+        residual = [m - p for m, p in zip(obj['box'], predicted)]
+        self.box = [p + alpha * r for p, r in zip(predicted, residual)]
+        self.velocity = [v + beta * r / dt for v, r in zip(self.velocity, residual)]
+        self.last_frame = frame_index
+        self.confidence = obj['confidence']
+        self.last_seen = timestamp
+        self.hits += 1
+        self.misses = 0
+
+    @property
+    def dwell_time(self):
+        return self.last_seen - self.first_seen
+
+class ObjectTracker:
+    """SORT-style tracker: greedy IoU matching of detections to constant-velocity tracks.
+
+    update() is called with each set of detections; predict() returns the
+    tracked boxes for any frame in between, so boxes keep moving when
+    detection only runs every few frames.
+    """
+    def __init__(self, iou_threshold=0.3, max_distance=1.0, max_missed=3, alpha=0.6, beta=0.3,
+                 max_prediction_frames=30):
+        self.iou_threshold = iou_threshold  # Minimum overlap to match a detection to a track
+        self.max_distance = max_distance  # Fallback match by center distance (in box sizes) for fast objects
+        self.max_missed = max_missed  # Detection rounds a track survives without a match
+        self.alpha = alpha  # Weight of a new measurement in the box position
+        self.beta = beta  # Weight of a new measurement in the velocity
+        self.max_prediction_frames = max_prediction_frames  # Boxes stop moving this long after an update
+        self.tracks = []
+        self.finished = []  # Tracks that were dropped, kept for the summary
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.tracks = []
+            self.finished = []
+            self._ids = itertools.count(1)
+
+    def update(self, detected_objects, frame_index, timestamp=None):
+        """Match detections from a frame to the tracks, creating and retiring tracks"""
+        if timestamp is None:
+            timestamp = time.time()
+
+        with self._lock:
+            # Score every same-class track/detection pair at this frame
+            pairs = []
+            for t, track in enumerate(self.tracks):
+                predicted = track.predict(frame_index)
+                for d, obj in enumerate(detected_objects):
+                    if obj['class'] == track.class_name:
+                        overlap = iou(predicted, obj['box'])
+                        distance = center_distance(predicted, obj['box'])
+                        if overlap >= self.iou_threshold or distance <= self.max_distance:
+                            pairs.append(((overlap, -distance), t, d))
+
+            # Greedy assignment, best overlap (then nearest) first
+            matched_tracks = set()
+            matched_detections = set()
+            for _, t, d in sorted(pairs, reverse=True):
+                if t in matched_tracks or d in matched_detections:
+                    continue
+                self.tracks[t].update(detected_objects[d], frame_index, timestamp, self.alpha, self.beta)
+                matched_tracks.add(t)
+                matched_detections.add(d)
+
+            # Age unmatched tracks and retire the ones missed too often
+            active = []
+            for t, track in enumerate(self.tracks):
+                if t not in matched_tracks:
+                    track.misses += 1
+                if track.misses > self.max_missed:
+                    self.finished.append(track)
+                else:
+                    active.append(track)
+
+            # Unmatched detections start new tracks
+            for d, obj in enumerate(detected_objects):
+                if d not in matched_detections:
+                    active.append(Track(next(self._ids), obj, frame_index, timestamp))
+
+            self.tracks = active
+
+    def predict(self, frame_index):
+        """Tracked objects with their boxes predicted for a frame index"""
+        with self._lock:
+            objects = []
+            for track in self.tracks:
+                # Only show tracks confirmed by the latest detection round
+                if track.misses > 0:
+                    continue
+                x, y, w, h = track.predict(frame_index, self.max_prediction_frames)
+                objects.append({
+                    'track_id': track.track_id,
+                    'class': track.class_name,
+                    'confidence': track.confidence,
+                    'box': (int(x), int(y), int(w), int(h)),
+                    'dwell_time': track.dwell_time,
+                })
+            return objects
+
+    def summary(self):
+        """Per-class track counts and per-track dwell times for all tracks seen so far"""
+        with self._lock:
+            tracks = self.finished + self.tracks
+            counts = {}
+            for track in tracks:
+                counts[track.class_name] = counts.get(track.class_name, 0) + 1
+            return {
+                'counts': counts,
+                'tracks': [
+                    {'track_id': track.track_id, 'class': track.class_name,
+                     'dwell_time': round(track.dwell_time, 3), 'hits': track.hits}
+                    for track in sorted(tracks, key=lambda track: track.track_id)
+                ],
+            }
@@ -2,8 +2,66 @@
 import tkinter as tk
 from tkinter import filedialog, ttk
 import cv2
+import numpy as np
 from PIL import Image, ImageTk
 
+def fit_size(width, height, display_width, display_height):
+    """Size of a width x height frame scaled to fit the display, keeping its aspect ratio"""
+    aspect_ratio = width / height
+    
+    if aspect_ratio > (display_width / display_height):  # Width limited
+        new_width = display_width
+        new_height = int(new_width / aspect_ratio)
+    else:  # Height limited
+        new_height = display_height
+        new_width = int(new_height * aspect_ratio)
+    return new_width, new_height
+
+def prepare_display_image(frame, display_width, display_height, overlays=None, text_lines=None, size=None,
+                          out=None):
+    """Fit a BGR frame into the display size and return it as an annotated RGB array.
+
+    size is the fitted size if already known (see fit_size), and out an
+    array of that size to draw into instead of allocating a new one.
+    """
+    h, w = frame.shape[:2]
+    new_width, new_height = size or fit_size(w, h, display_width, display_height)
+    
+    # Resize the frame (the only copy), then convert to RGB in place
+    if out is not None:
+        display = cv2.resize(frame, (new_width, new_height), dst=out)
+    else:
+        display = cv2.resize(frame, (new_width, new_height))
+    cv2.cvtColor(display, cv2.COLOR_BGR2RGB, dst=display)
+    
+    # Draw annotations at display scale
+    scale = new_width / w
+    for x, y, box_w, box_h, color, label in overlays or []:
+        x1, y1 = int(x * scale), int(y * scale)
+        x2, y2 = int((x + box_w) * scale), int((y + box_h) * scale)
+        rgb = color[::-1]
+        cv2.rectangle(display, (x1, y1), (x2, y2), rgb, 2)
+        if label:
+            cv2.putText(display, label, (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, rgb, 2)
+    
+    for i, line in enumerate(text_lines or []):
+        cv2.putText(display, line, (8, 18 + 16 * i), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (255, 255, 0), 1)
+    
+    return display
+
+def activity_strip_image(motion, objects, analyzed, height, full_motion=0.05):
+    """Render binned activity (see ActivityIndex.strip) as an RGB strip.
+
+    Columns never analyzed are light gray, analyzed ones shade from dark gray
+    to green as motion approaches full_motion of the frame, and columns with
+    detected objects are red.
+    """
+    level = np.clip(motion / full_motion, 0.0, 1.0)[:, None]
+    colors = (1 - level) * np.array([70, 70, 70]) + level * np.array([46, 204, 113])
+    colors[~analyzed] = (208, 208, 208)
+    colors[objects] = (231, 76, 60)
+    return np.repeat(colors.astype(np.uint8)[None], height, axis=0)
+
 class VideoAnalysisUI:
     def __init__(self, root):
         self.root = root
@@ -22,6 +80,10 @@ class VideoAnalysisUI:
         self.vid = None
         self.display_width = 800  # Control display width
         self.display_height = 500  # Control display height
+        self.display_geometry = None  # (source and display size, fitted size, offset, draw buffer) of the last frame
+        self.display_image = None  # PIL image of the fitted size, refilled from the draw buffer every frame
+        self.photo = None  # PhotoImage shown on the canvas, updated in place while the size stays the same
+        self.canvas_image = None  # Its canvas item
         
         # Create UI elements
         self.create_widgets()
@@ -31,6 +93,7 @@ class VideoAnalysisUI:
     # Main frame to hold everything
         main_frame = tk.Frame(self.root, bg=self.bg_color)
         main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        self.main_frame = main_frame
         
         # Top frame for controls
         self.top_frame = tk.Frame(main_frame, bg=self.bg_color)  # Use self.top_frame instead of top_frame
@@ -120,6 +183,7 @@ class VideoAnalysisUI:
         # Bottom frame for status
         bottom_frame = tk.Frame(main_frame, bg=self.bg_color)
         bottom_frame.pack(side=tk.BOTTOM, fill=tk.X, pady=5)
+        self.bottom_frame = bottom_frame
         
         # Status label
         self.status_label = tk.Label(bottom_frame, text="Ready", font=("Arial", 10), 
@@ -138,36 +202,63 @@ class VideoAnalysisUI:
             if ret:
                 self.display_frame(frame)
     
-    def display_frame(self, frame):
-        # Convert frame to PhotoImage format for Tkinter
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        
-        # Resize while maintaining aspect ratio
+    def display_frame(self, frame, overlays=None, text_lines=None):
+        """Show a BGR frame on the canvas, drawing overlays on the scaled copy.
+
+        overlays is a list of (x, y, w, h, color, label) tuples in frame
+        coordinates with BGR colors; label may be None. text_lines are drawn
+        in the top-left corner. The source frame is only read, never modified.
+        """
+        # The fitted size, position, draw buffer and PIL image only change with the source or display size
         h, w = frame.shape[:2]
-        aspect_ratio = w / h
-        
-        if aspect_ratio > (self.display_width / self.display_height):  # Width limited
-            new_width = self.display_width
-            new_height = int(new_width / aspect_ratio)
-        else:  # Height limited
-            new_height = self.display_height
-            new_width = int(new_height * aspect_ratio)
-        
-        # Resize the frame
-        frame = cv2.resize(frame, (new_width, new_height))
-        
-        # Create image and display
-        img = Image.fromarray(frame)
-        imgtk = ImageTk.PhotoImage(image=img)
-        
-        # Calculate center position
-        x_center = (self.display_width - new_width) // 2
-        y_center = (self.display_height - new_height) // 2
-        
-        # Clear canvas and update with new image
-        self.canvas.delete("all")
-        self.canvas.create_image(x_center, y_center, anchor=tk.NW, image=imgtk)
-        self.canvas.image = imgtk  # Keep reference to prevent garbage collection
+        key = (w, h, self.display_width, self.display_height)
+        if self.display_geometry is None or self.display_geometry[0] != key:
+            new_width, new_height = fit_size(w, h, self.display_width, self.display_height)
+            offset = ((self.display_width - new_width) // 2, (self.display_height - new_height) // 2)
+            buffer = np.empty((new_height, new_width, 3), dtype=np.uint8)
+            self.display_geometry = (key, (new_width, new_height), offset, buffer)
+            self.display_image = Image.new("RGB", (new_width, new_height))
+            self.on_display_geometry_change()
+        _, size, offset, buffer = self.display_geometry
+        
+        display = prepare_display_image(frame, self.display_width, self.display_height, overlays, text_lines,
+                                        size=size, out=buffer)
+        img = self.display_image
+        img.frombytes(display)  # Decoded into the existing image, no new one per frame
+        
+        if self.photo is not None and (self.photo.width(), self.photo.height()) == size:
+            # Same size: copy the pixels into the image already on the canvas
+            self.photo.paste(img)
+            return
+        
+        # First frame or a new size: one image and one canvas item, kept from then on
+        self.photo = ImageTk.PhotoImage(image=img)
+        if self.canvas_image is None:
+            self.canvas_image = self.canvas.create_image(offset[0], offset[1], anchor=tk.NW, image=self.photo)
+            self.canvas.tag_lower(self.canvas_image)  # Below anything drawn over the video
+        else:
+            self.canvas.coords(self.canvas_image, offset[0], offset[1])
+            self.canvas.itemconfig(self.canvas_image, image=self.photo)
+        self.canvas.image = self.photo  # Keep reference to prevent garbage collection
+    
+    def on_display_geometry_change(self):
+        """Called when the shown frame changes size or position; the app redraws its canvas shapes"""
+        pass
+    
+    def frame_to_canvas(self, x, y):
+        """Canvas position of a point in frame coordinates, for the frames being shown"""
+        (w, _, _, _), (new_width, _), (offset_x, offset_y), _ = self.display_geometry
+        scale = new_width / w
+        return offset_x + x * scale, offset_y + y * scale
+    
+    def canvas_to_frame(self, x, y):
+        """Frame coordinates of a canvas position, clamped to the frame; None before any frame is shown"""
+        if self.display_geometry is None:
+            return None
+        (w, h, _, _), (new_width, _), (offset_x, offset_y), _ = self.display_geometry
+        scale = new_width / w
+        return (min(max(int(round((x - offset_x) / scale)), 0), w),
+                min(max(int(round((y - offset_y) / scale)), 0), h))
     
     def start_analysis(self):
         # This will be implemented in the main application class